@@ -0,0 +1,146 @@
+"""
+Масштабирование BM25: инвертированный индекс (BM25Index) против
+rank_bm25.BM25Okapi на синтетических корпусах от 1 тыс. до 1 млн чанков.
+
+Запуск:
+    python scripts/benchmark_bm25.py [--sizes 1000 10000 100000 1000000] [--queries 100]
+
+Корпус генерируется сразу номерами терминов (распределение Ципфа), поэтому
+строится быстро и без токенизации. BM25Okapi измеряется только на корпусах
+до --okapi-max-docs (он строит и оценивает всё на Python); на первом из них
+проверяется совпадение счетов и top-k.
+
+Режимы exhaustive и maxscore должны возвращать одни и те же документы; это
+проверяется на каждом корпусе и отдельно на корпусе из повторённых
+документов, где равные счета попадают на границу top-k.
+"""
+import argparse
+import sys
+import time
+
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.rag.bm25 import BM25Index
+
+TOP_K = 10
+
+
+def generate_corpus(n_docs: int, vocab_size: int, avg_len: int, rng: np.random.Generator):
+    doc_lengths = rng.integers(avg_len // 2, avg_len * 3 // 2, size=n_docs)
+    term_ids = (rng.zipf(1.2, size=int(doc_lengths.sum())) - 1) % vocab_size
+    vocabulary = {f"t{i}": i for i in range(vocab_size)}
+    return term_ids, doc_lengths, vocabulary
+
+
+def generate_tied_corpus(n_docs: int, vocab_size: int, avg_len: int, rng: np.random.Generator, copies: int = 4):
+    """Каждый документ повторён copies раз в случайных местах: счета равны группами."""
+    term_ids, doc_lengths, vocabulary = generate_corpus(n_docs // copies, vocab_size, avg_len, rng)
+    docs = np.split(term_ids, np.cumsum(doc_lengths)[:-1])
+    order = rng.permutation(np.repeat(np.arange(len(docs)), copies))
+    return np.concatenate([docs[i] for i in order]), doc_lengths[order], vocabulary
+
+
+def generate_queries(n_queries: int, vocab_size: int, rng: np.random.Generator) -> list:
+    # Термины запросов из середины распределения: частые, но не стоп-слова
+    return [
+        [f"t{t}" for t in rng.integers(5, min(vocab_size, 5000), size=rng.integers(2, 7))]
+        for _ in range(n_queries)
+    ]
+
+
+def time_queries(search, queries: list) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        search(q)
+    return (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def check_okapi(index: BM25Index, okapi, queries: list):
+    max_diff = 0.0
+    same_top = 0
+    for q in queries:
+        reference = okapi.get_scores(q)
+        max_diff = max(max_diff, float(np.abs(reference - index.get_scores(q)).max()))
+        # При равных счетах порядок документов произволен — сравниваются счета top-k
+        expected = np.sort(reference)[::-1][:TOP_K]
+        expected = expected[expected > 0]
+        found = np.array([score for _, score in index.search(q, TOP_K, mode="maxscore")])
+        same_top += len(found) == len(expected) and np.allclose(found, expected, atol=1e-4)
+    print(f"   Проверка с BM25Okapi: макс. разница счетов {max_diff:.2e}, "
+          f"совпадение top-{TOP_K}: {same_top}/{len(queries)}")
+
+
+def check_modes(index: BM25Index, queries: list, label: str):
+    """exhaustive и maxscore: те же документы в том же порядке, для разных k."""
+    same = total = 0
+    for q in queries:
+        for k in (1, TOP_K, 3 * TOP_K):
+            exhaustive = [doc for doc, _ in index.search(q, k, mode="exhaustive")]
+            maxscore = [doc for doc, _ in index.search(q, k, mode="maxscore")]
+            same += exhaustive == maxscore
+            total += 1
+    print(f"   {label}: совпадение exhaustive и maxscore {same}/{total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк BM25")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=100, help="Запросов на замер")
+    parser.add_argument("--vocab", type=int, default=50000, help="Размер словаря")
+    parser.add_argument("--avg-len", type=int, default=60, help="Средняя длина чанка в токенах")
+    parser.add_argument("--okapi-max-docs", type=int, default=100000, help="Максимальный корпус для BM25Okapi")
+    args = parser.parse_args()
+
+    try:
+        from rank_bm25 import BM25Okapi
+    except ImportError:
+        BM25Okapi = None
+        print("rank_bm25 не установлен — измеряется только BM25Index")
+
+    rng = np.random.default_rng(42)
+    queries = generate_queries(args.queries, args.vocab, rng)
+    checked = False
+
+    print("=" * 90)
+    print(f"{'чанков':>10} {'построение':>12} {'exhaustive':>12} {'maxscore':>12} {'BM25Okapi':>12}   (мс на запрос)")
+    print("=" * 90)
+    for n_docs in args.sizes:
+        term_ids, doc_lengths, vocabulary = generate_corpus(n_docs, args.vocab, args.avg_len, rng)
+
+        t0 = time.perf_counter()
+        index = BM25Index.from_term_ids(term_ids, doc_lengths, vocabulary, [str(i) for i in range(n_docs)])
+        build_time = time.perf_counter() - t0
+
+        exhaustive = time_queries(lambda q: index.search(q, TOP_K, mode="exhaustive"), queries)
+        maxscore = time_queries(lambda q: index.search(q, TOP_K, mode="maxscore"), queries)
+
+        okapi_cell = "—"
+        if BM25Okapi is not None and n_docs <= args.okapi_max_docs:
+            inverse_vocab = np.array(list(vocabulary), dtype=object)
+            bounds = np.cumsum(doc_lengths)[:-1]
+            corpus = [list(doc) for doc in np.split(inverse_vocab[term_ids], bounds)]
+            okapi = BM25Okapi(corpus)
+            okapi_ms = time_queries(
+                lambda q: np.argpartition(-okapi.get_scores(q), TOP_K)[:TOP_K], queries[:10]
+            )
+            okapi_cell = f"{okapi_ms:10.2f}"
+            if not checked:
+                check_okapi(index, okapi, queries[:20])
+                checked = True
+
+        print(f"{n_docs:>10} {build_time:>10.2f} с {exhaustive:>12.2f} {maxscore:>12.2f} {okapi_cell:>12}")
+        check_modes(index, queries[:20], f"{n_docs} чанков")
+
+    n_tied = min(args.sizes)
+    term_ids, doc_lengths, vocabulary = generate_tied_corpus(n_tied, args.vocab, args.avg_len, rng)
+    index = BM25Index.from_term_ids(term_ids, doc_lengths, vocabulary, [str(i) for i in range(len(doc_lengths))])
+    check_modes(index, queries, f"{len(doc_lengths)} чанков с повторами (равные счета)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Пропускная способность чанкеров на полном документе реестра.
+
+Сравниваются chunk_by_tokens (по предложениям, токенизация каждого
+предложения и слова) и chunk_by_token_offsets (одна токенизация секции).
+
+Запуск:
+    python scripts/benchmark_chunker.py [--docx путь] [--tokenizer tiktoken|embedder] [--repeat 3]
+"""
+import argparse
+import sys
+import time
+
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.config import DOCX_PATH
+from src.transneft_ai_consultant.backend.data_processing.parse_docx_stream import iter_docx_sections
+from src.transneft_ai_consultant.backend.data_processing.chunk_text import chunk_sections, get_offset_tokenizer
+
+
+def measure(name: str, run, repeat: int, n_chars: int) -> list:
+    chunks = run()  # прогрев (загрузка токенизатора)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = run()
+        best = min(best, time.perf_counter() - t0)
+
+    print(f"   {name:<10} {best:8.3f} сек   {n_chars / best / 1024 / 1024:8.2f} МБ текста/сек   чанков: {len(chunks)}")
+    return chunks
+
+
+def max_chunk_tokens(chunks: list, tokenizer) -> int:
+    scale = getattr(tokenizer, "tokens_per_offset", 1.0)
+    return int(max((len(tokenizer(c["context"])) * scale for c in chunks), default=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк чанкеров")
+    parser.add_argument("--docx", type=Path, default=DOCX_PATH, help="Документ для разбивки")
+    parser.add_argument("--tokenizer", default="tiktoken", choices=["tiktoken", "embedder"],
+                        help="Токенизатор для chunk_by_token_offsets")
+    parser.add_argument("--repeat", type=int, default=3, help="Число замеров (берётся лучший)")
+    args = parser.parse_args()
+
+    sections = list(iter_docx_sections(str(args.docx)))
+    n_chars = sum(len(s["content"]) for s in sections)
+
+    print("=" * 70)
+    print(f"ЧАНКИНГ: {args.docx.name} — {len(sections)} секций, {n_chars / 1024:.0f} КБ текста")
+    print("=" * 70)
+
+    tokenizer = get_offset_tokenizer(args.tokenizer)
+    legacy = measure("tokens", lambda: chunk_sections(sections, chunker="tokens"), args.repeat, n_chars)
+    offsets = measure("offsets", lambda: chunk_sections(sections, chunker="offsets", tokenizer=tokenizer), args.repeat, n_chars)
+
+    print("=" * 70)
+    print(f"Максимум токенов в чанке ({args.tokenizer}): "
+          f"tokens={max_chunk_tokens(legacy, tokenizer)}, offsets={max_chunk_tokens(offsets, tokenizer)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Сравнение парсеров DOCX: python-docx (read_docx_sections) и потоковый
+(iter_docx_sections) на большом синтетическом документе.
+
+Запуск:
+    python scripts/benchmark_docx_parser.py [--sections 2000] [--paragraphs 10] [--docx путь]
+
+Измеряется время разбора и пиковая память (tracemalloc, отдельным прогоном),
+проверяется, что оба парсера выдают одинаковые секции.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.data_processing.parse_docx import read_docx_sections
+from src.transneft_ai_consultant.backend.data_processing.parse_docx_stream import iter_docx_sections
+
+WORDS = (
+    "нефтепровод транспортировка нефти магистральный резервуар станция перекачка "
+    "диагностика капитальный ремонт протяжённость эксплуатация инвестиционный проект "
+    "система компания дочернее общество объём поставки экспорт"
+).split()
+
+
+def generate_docx(path: Path, n_sections: int, n_paragraphs: int, seed: int = 42):
+    """Синтетический документ: заголовки, абзацы, списки и таблицы."""
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for s in range(n_sections):
+        doc.add_heading(f"Раздел {s}: {' '.join(rng.choices(WORDS, k=3))}", level=1 + s % 2)
+        for _ in range(n_paragraphs):
+            doc.add_paragraph(" ".join(rng.choices(WORDS, k=rng.randint(20, 60))) + ".")
+        for _ in range(3):
+            doc.add_paragraph(" ".join(rng.choices(WORDS, k=6)), style="List Bullet")
+        if s % 10 == 0:
+            table = doc.add_table(rows=5, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = " ".join(rng.choices(WORDS, k=3))
+    doc.save(str(path))
+
+
+def measure(name: str, parse, path: Path) -> list:
+    t0 = time.perf_counter()
+    sections = parse(path)
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    parse(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"   {name:<12} {elapsed:8.2f} сек   пик памяти {peak / 1024 / 1024:8.1f} МБ   секций: {len(sections)}")
+    return sections
+
+
+def _comparable(sections: list) -> list:
+    # Таблицы у потокового парсера идут в порядке документа
+    return sorted((s["type"], s["section_id"], s["title"], s["content"]) for s in sections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсеров DOCX")
+    parser.add_argument("--sections", type=int, default=2000, help="Разделов в синтетическом документе")
+    parser.add_argument("--paragraphs", type=int, default=10, help="Абзацев в разделе")
+    parser.add_argument("--docx", type=Path, help="Готовый документ вместо синтетического")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.docx:
+            path = args.docx
+        else:
+            path = Path(tmp) / "synthetic.docx"
+            print(f"Генерация документа: {args.sections} разделов × {args.paragraphs} абзацев...")
+            generate_docx(path, args.sections, args.paragraphs)
+
+        print("=" * 70)
+        print(f"ПАРСИНГ DOCX: {path.name} ({path.stat().st_size / 1024 / 1024:.1f} МБ)")
+        print("=" * 70)
+
+        baseline = measure("python-docx", lambda p: read_docx_sections(str(p)), path)
+        streaming = measure("iterparse", lambda p: list(iter_docx_sections(str(p))), path)
+
+    same = _comparable(baseline) == _comparable(streaming)
+    print("=" * 70)
+    print("✅ Секции совпадают" if same else "❌ Секции различаются")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Сравнение бэкендов reranker: CrossEncoder (torch) и ONNX Runtime int8.
+
+Кандидаты — hybrid_search для вопросов benchmarks/benchmark.json (поиск в
+замер не входит). Точность int8 проверяется относительно torch: ранговая
+корреляция скоров, совпадение top-k после reranking и MRR/nDCG по
+relevant_docs бенчмарка (evaluation/metrics_ranking). Задержка — время
+reranking кандидатов одного вопроса.
+
+Запуск:
+    python scripts/benchmark_reranker.py [--candidates 20] [--top-k 5] [--repeat 3] [--export]
+
+--export заново выгружает ONNX-модель из локального кэша HuggingFace.
+"""
+import argparse
+import json
+import sys
+import time
+
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.config import RERANK_PREDICT_BATCH_SIZE
+from src.transneft_ai_consultant.backend.evaluation.metrics_ranking import mrr_at_k, ndcg_mean_at_k
+from src.transneft_ai_consultant.backend.rag.hybrid_search import hybrid_search
+from src.transneft_ai_consultant.backend.rag.reranker import load_reranker
+from src.transneft_ai_consultant.backend.rag.reranker_onnx import export_onnx_reranker
+
+BENCHMARK_PATH = project_root / "benchmarks" / "benchmark.json"
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["questions"] if isinstance(data, dict) else data
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    if len(a) < 2:
+        return 1.0
+    ranks_a = np.argsort(np.argsort(a))
+    ranks_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def rerank(reranker, question: str, docs: list, batch_size: int) -> np.ndarray:
+    pairs = [[question, doc["context"]] for doc in docs]
+    return np.asarray(reranker.predict(pairs, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк reranker: torch vs ONNX int8")
+    parser.add_argument("--benchmark", type=Path, default=BENCHMARK_PATH, help="Файл с вопросами")
+    parser.add_argument("--candidates", type=int, default=20, help="Кандидатов на вопрос")
+    parser.add_argument("--top-k", type=int, default=5, help="Документов после reranking")
+    parser.add_argument("--batch-size", type=int, default=RERANK_PREDICT_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--export", action="store_true", help="Заново экспортировать ONNX-модель")
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx_reranker()
+
+    items = load_questions(args.benchmark)
+    candidates = [hybrid_search(item["question"], top_k=args.candidates) for item in items]
+    truth = {str(i): set(item.get("relevant_docs", [])) for i, item in enumerate(items)}
+    k = args.top_k
+
+    backends = {name: load_reranker(name) for name in ("torch", "onnx")}
+    scores = {}
+    print("=" * 90)
+    print(f"RERANKER: {len(items)} вопросов × {args.candidates} кандидатов, top-{k}, батч {args.batch_size}")
+    print("=" * 90)
+    print(f"   {'бэкенд':<8} {'p50, мс':>9} {'p95, мс':>9} {'пар/сек':>9} {'MRR@k':>7} {'nDCG@k':>7}")
+    for name, reranker in backends.items():
+        rerank(reranker, items[0]["question"], candidates[0], args.batch_size)  # прогрев
+        times = []
+        for _ in range(args.repeat):
+            for item, docs in zip(items, candidates):
+                t0 = time.perf_counter()
+                rerank(reranker, item["question"], docs, args.batch_size)
+                times.append((time.perf_counter() - t0) * 1000)
+        scores[name] = [rerank(reranker, item["question"], docs, args.batch_size)
+                        for item, docs in zip(items, candidates)]
+
+        retrieved = {
+            str(i): [docs[j]["id"] for j in np.argsort(-question_scores)[:k]]
+            for i, (docs, question_scores) in enumerate(zip(candidates, scores[name]))
+        }
+        pairs_per_sec = sum(len(docs) for docs in candidates) * args.repeat / (sum(times) / 1000)
+        print(f"   {name:<8} {np.percentile(times, 50):>9.1f} {np.percentile(times, 95):>9.1f} "
+              f"{pairs_per_sec:>9.0f} {mrr_at_k(truth, retrieved, k):>7.3f} {ndcg_mean_at_k(truth, retrieved, k):>7.3f}")
+
+    correlations, overlaps, max_diff = [], [], 0.0
+    for reference, quantized in zip(scores["torch"], scores["onnx"]):
+        if not len(reference):
+            continue
+        correlations.append(spearman(reference, quantized))
+        top_reference = set(np.argsort(-reference)[:k])
+        top_quantized = set(np.argsort(-quantized)[:k])
+        overlaps.append(len(top_reference & top_quantized) / len(top_reference))
+        max_diff = max(max_diff, float(np.abs(reference - quantized).max()))
+
+    print("=" * 90)
+    print(f"   ONNX int8 относительно torch: корреляция Спирмена {np.mean(correlations):.4f}, "
+          f"совпадение top-{k} {np.mean(overlaps):.3f}, макс. разница скоров {max_diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Сравнение бэкендов векторного поиска: HNSW ChromaDB и NumpyVectorIndex
+(float32, float16, int8 и binary с пересчётом по float32).
+
+Запросы — вопросы из benchmarks/benchmark.json (эмбеддинги считаются один
+раз заранее, в замер не входят). Recall@k считается относительно точного
+поиска float32: для ChromaDB это потери HNSW, для остальных — потери
+точности хранения. MRR, MAP и nDCG по relevant_docs бенчмарка считаются
+функциями evaluation/metrics_ranking. Память — матрица первого этапа,
+которую держит каждый процесс (float32 для пересчёта лежит в memory map).
+
+Запуск:
+    python scripts/benchmark_vector_search.py [--top-k 10] [--batch 16] [--repeat 3]
+"""
+import argparse
+import json
+import sys
+import time
+
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.evaluation.metrics_ranking import mrr_at_k, map_at_k, ndcg_mean_at_k
+from src.transneft_ai_consultant.backend.rag.embedder import embed_texts
+from src.transneft_ai_consultant.backend.rag.vector_store import NumpyVectorIndex, get_collection
+
+BENCHMARK_PATH = project_root / "benchmarks" / "benchmark.json"
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["questions"] if isinstance(data, dict) else data
+
+
+def latencies(run, query_embeddings: np.ndarray, batch: int, repeat: int) -> np.ndarray:
+    """Время на запрос (мс) при поиске батчами."""
+    times = []
+    for _ in range(repeat):
+        for start in range(0, len(query_embeddings), batch):
+            chunk = query_embeddings[start:start + batch]
+            t0 = time.perf_counter()
+            run(chunk)
+            times.extend([(time.perf_counter() - t0) * 1000 / len(chunk)] * len(chunk))
+    return np.array(times)
+
+
+def recall(found: list, exact: list) -> float:
+    return float(np.mean([len(set(f) & set(e)) / max(len(e), 1) for f, e in zip(found, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк векторного поиска")
+    parser.add_argument("--benchmark", type=Path, default=BENCHMARK_PATH, help="Файл с вопросами")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1, help="Запросов в одном вызове поиска")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    items = load_questions(args.benchmark)
+    questions = [item["question"] for item in items]
+    truth = {str(i): set(item.get("relevant_docs", [])) for i, item in enumerate(items)}
+    query_embeddings = np.asarray(embed_texts(questions), dtype=np.float32)
+
+    collection = get_collection()
+    indexes = {
+        f"numpy {dtype}": NumpyVectorIndex.from_collection(collection, dtype=dtype)
+        for dtype in ("float32", "float16", "int8", "binary")
+    }
+    k = args.top_k
+
+    def chroma_search(chunk):
+        return collection.query(query_embeddings=chunk.tolist(), n_results=k, include=["distances"])["ids"]
+
+    def numpy_search(index):
+        return lambda chunk: [[index.ids[i] for i in row] for row in index.search(chunk, k)[0]]
+
+    runs = {"chroma": chroma_search}
+    runs.update((name, numpy_search(index)) for name, index in indexes.items())
+
+    exact = runs["numpy float32"](query_embeddings)
+
+    print("=" * 100)
+    print(f"ВЕКТОРНЫЙ ПОИСК: {len(indexes['numpy float32'])} чанков, {len(questions)} запросов, "
+          f"top-{k}, батч {args.batch}")
+    print("=" * 100)
+    print(f"   {'бэкенд':<14} {'p50, мс':>9} {'p95, мс':>9} {'recall@k':>9} "
+          f"{'MRR@k':>7} {'MAP@k':>7} {'nDCG@k':>7} {'память, МБ':>11}")
+    for name, run in runs.items():
+        times = latencies(run, query_embeddings, args.batch, args.repeat)
+        found = [ids for start in range(0, len(query_embeddings), args.batch)
+                 for ids in run(query_embeddings[start:start + args.batch])]
+        retrieved = {str(i): ids for i, ids in enumerate(found)}
+        memory = indexes[name].matrix.nbytes / 1024 / 1024 if name in indexes else float("nan")
+        print(f"   {name:<14} {np.percentile(times, 50):>9.3f} {np.percentile(times, 95):>9.3f} "
+              f"{recall(found, exact):>9.3f} {mrr_at_k(truth, retrieved, k):>7.3f} "
+              f"{map_at_k(truth, retrieved, k):>7.3f} {ndcg_mean_at_k(truth, retrieved, k):>7.3f} {memory:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
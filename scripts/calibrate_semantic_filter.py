@@ -0,0 +1,123 @@
+"""
+Подбор порога семантической проверки фильтра вопросов (SEMANTIC_FILTER_THRESHOLD).
+
+Порог зависит от модели: у e5 косинусная близость даже несвязанных
+вопросов высокая, и значение, подобранное для одной модели, для другой
+пропускает всё или отсекает всё. Скрипт считает максимальную близость к
+эталонным вопросам (semantic_similarity) той моделью, которую
+использует фильтр: SEMANTIC_FILTER_MODEL или основной эмбеддер.
+
+По теме — вопросы benchmarks/benchmark.json и negative_samples.json
+(вопросы о Транснефти без ответа в документах фильтр должен пропускать),
+не по теме — набор ниже. Для каждого порога печатаются доли ошибочно
+отклонённых и ошибочно пропущенных вопросов; рекомендуется порог с
+наибольшей сбалансированной точностью. Отдельно показано, сколько вопросов
+доходит до семантической проверки (вопросительное слово без бизнес-терминов).
+
+Запуск:
+    python scripts/calibrate_semantic_filter.py [--min 0.3] [--max 0.95] [--step 0.01]
+"""
+import argparse
+import json
+import sys
+
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.config import (
+    EMBEDDER_MODEL_NAME,
+    SEMANTIC_FILTER_MODEL,
+    SEMANTIC_FILTER_THRESHOLD,
+)
+from src.transneft_ai_consultant.backend.rag.question_filter import (
+    is_question_relevant_advanced,
+    semantic_similarity,
+)
+
+BENCHMARK_DIR = project_root / "benchmarks"
+
+OFF_TOPIC_QUESTIONS = [
+    "Какая завтра погода в Москве?",
+    "Посоветуй хороший фильм на вечер",
+    "Как приготовить борщ?",
+    "Почему небо голубое?",
+    "Расскажи анекдот",
+    "Как выучить английский язык за месяц?",
+    "Какой язык программирования выбрать новичку?",
+    "Сколько калорий в банане?",
+    "Где провести отпуск летом?",
+    "Как быстро уснуть?",
+    "Что подарить маме на день рождения?",
+    "Какая столица Австралии?",
+    "Как поменять колесо на машине?",
+    "Сколько лет живут кошки?",
+    "Какие книги почитать по психологии?",
+    "Как научиться играть на гитаре?",
+    "Что такое чёрная дыра?",
+    "Как выбрать ноутбук для учёбы?",
+    "Когда лучше сажать помидоры?",
+    "Кто написал «Войну и мир»?",
+]
+
+
+def load_on_topic() -> list:
+    with open(BENCHMARK_DIR / "benchmark.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = data["questions"] if isinstance(data, dict) else data
+    with open(BENCHMARK_DIR / "negative_samples.json", "r", encoding="utf-8") as f:
+        items += json.load(f)
+    return [item["question"] for item in items]
+
+
+def reaches_semantic_check(question: str) -> bool:
+    """Лексические уровни не решили судьбу вопроса — решает порог."""
+    return is_question_relevant_advanced(question, use_semantic=False)[1]["reason"] == "valid_question_format"
+
+
+def scores(questions: list) -> np.ndarray:
+    return np.array([semantic_similarity(q) for q in questions], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор порога семантического фильтра вопросов")
+    parser.add_argument("--min", type=float, default=0.3, help="Наименьший проверяемый порог")
+    parser.add_argument("--max", type=float, default=0.95, help="Наибольший проверяемый порог")
+    parser.add_argument("--step", type=float, default=0.01, help="Шаг порога")
+    args = parser.parse_args()
+
+    on_topic = load_on_topic()
+    model = SEMANTIC_FILTER_MODEL or EMBEDDER_MODEL_NAME
+
+    print("=" * 80)
+    print(f"ПОРОГ СЕМАНТИЧЕСКОГО ФИЛЬТРА: {model}")
+    print("=" * 80)
+    on_scores = scores(on_topic)
+    off_scores = scores(OFF_TOPIC_QUESTIONS)
+
+    for name, questions, values in (("по теме", on_topic, on_scores), ("не по теме", OFF_TOPIC_QUESTIONS, off_scores)):
+        reached = sum(reaches_semantic_check(q) for q in questions)
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        print(f"   {name:>10}: {len(values):>4} вопросов, до проверки доходят {reached:>3}; "
+              f"близость p5={p5:.3f} p50={p50:.3f} p95={p95:.3f}")
+
+    print(f"\n   {'порог':>6} {'отклонено по теме':>18} {'пропущено не по теме':>21} {'сбаланс. точность':>18}")
+    best = None
+    for threshold in np.arange(args.min, args.max + args.step / 2, args.step):
+        false_reject = float((on_scores < threshold).mean())
+        false_accept = float((off_scores >= threshold).mean())
+        balanced = 1.0 - (false_reject + false_accept) / 2
+        if best is None or balanced > best[1]:
+            best = (threshold, balanced)
+        print(f"   {threshold:>6.2f} {false_reject:>18.1%} {false_accept:>21.1%} {balanced:>18.1%}")
+
+    print("=" * 80)
+    print(f"   Текущий SEMANTIC_FILTER_THRESHOLD = {SEMANTIC_FILTER_THRESHOLD}")
+    print(f"   Рекомендуемый порог: {best[0]:.2f} (сбалансированная точность {best[1]:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Проверка времени импорта backend.api через `python -X importtime`.
+
+Импорт модуля API не должен тянуть тяжёлые зависимости (torch,
+sentence_transformers, chromadb, whisper, librosa, llama_cpp, sklearn):
+они загружаются при первом использовании или в фазе прогрева.
+
+Запуск:
+    python scripts/check_import_time.py [--budget-ms 1500] [--top 15]
+
+Код возврата 1, если бюджет превышен или импортирован тяжёлый модуль.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.config import IMPORT_TIME_BUDGET_MS
+
+TARGET_MODULE = "transneft_ai_consultant.backend.api"
+
+HEAVY_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "chromadb",
+    "whisper",
+    "librosa",
+    "llama_cpp",
+    "sklearn",
+    "onnxruntime",
+]
+
+
+def measure_imports(module: str) -> list:
+    """Запускает чистый интерпретатор с -X importtime и разбирает его вывод."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in [str(project_root / "src"), env.get("PYTHONPATH", "")] if p
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=str(project_root),
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"Импорт {module} завершился с ошибкой:\n{tail[-2000:]}")
+
+    records = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Вложенность импорта кодируется отступом имени (по 2 пробела)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": depth,
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бюджет времени импорта backend.api")
+    parser.add_argument("--module", default=TARGET_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых медленных модулей показать")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"ВРЕМЯ ИМПОРТА: {args.module}")
+    print("=" * 70)
+
+    try:
+        records = measure_imports(args.module)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    total = next((r["cumulative_ms"] for r in records if r["module"] == args.module), None)
+    if total is None:
+        print(f"❌ Модуль {args.module} не найден в выводе importtime")
+        sys.exit(1)
+
+    print(f"\n⏱️ Самые медленные пакеты верхнего уровня:")
+    top_level = sorted(
+        (r for r in records if r["depth"] <= 1 and r["module"] != args.module),
+        key=lambda r: r["cumulative_ms"],
+        reverse=True
+    )
+    for r in top_level[:args.top]:
+        print(f"   {r['cumulative_ms']:9.1f} мс  {r['module']}")
+
+    imported = {r["module"].split(".")[0] for r in records}
+    heavy = [m for m in HEAVY_MODULES if m in imported]
+
+    print("\n" + "=" * 70)
+    print(f"ИТОГО: {total:.1f} мс (бюджет {args.budget_ms:.0f} мс)")
+    print("=" * 70)
+
+    ok = True
+    if heavy:
+        print(f"❌ При импорте загружены тяжёлые модули: {', '.join(heavy)}")
+        ok = False
+    if total > args.budget_ms:
+        print(f"❌ Бюджет превышен на {total - args.budget_ms:.1f} мс")
+        ok = False
+
+    if ok:
+        print("✅ Импорт укладывается в бюджет")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
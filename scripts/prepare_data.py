@@ -1,36 +1,42 @@
+import argparse
 import sys
 from pathlib import Path
 
 project_root = str(Path(__file__).parent.parent.absolute())
 sys.path.insert(0, project_root)
 
-from src.transneft_ai_consultant.backend.data_processing.parse_docx import read_docx_sections
-from src.transneft_ai_consultant.backend.data_processing.chunk_text import chunk_sections
-from src.transneft_ai_consultant.backend.rag.vector_store import add_documents, get_collection_size
-from src.transneft_ai_consultant.backend.config import DOCX_PATH
+from src.transneft_ai_consultant.backend.data_processing.indexer import sync_directory, watch_directory
+from src.transneft_ai_consultant.backend.data_processing.near_duplicates import rebuild_duplicate_clusters
+from src.transneft_ai_consultant.backend.rag.vector_store import get_collection_size
+from src.transneft_ai_consultant.backend.config import DATA_DIR, INDEX_WATCH_INTERVAL
 
 def main():
-    print("Запуск процесса индексации документов...")
-
-    # Шаг 1: Парсинг документа
-    print(f"1/3: Парсинг {DOCX_PATH}...")
-    sections = read_docx_sections(str(DOCX_PATH))
-    if not sections:
-        print("Ошибка: не удалось извлечь секции.")
+    parser = argparse.ArgumentParser(description="Индексация документов в ChromaDB")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="Папка с документами")
+    parser.add_argument("--watch", action="store_true", help="Следить за папкой и переиндексировать изменения")
+    parser.add_argument("--interval", type=float, default=INDEX_WATCH_INTERVAL, help="Период опроса в режиме --watch (сек)")
+    parser.add_argument("--rebuild-duplicates", action="store_true",
+                        help="Заново разметить кластеры почти-дубликатов во всей коллекции")
+    args = parser.parse_args()
+
+    if args.rebuild_duplicates:
+        rebuild_duplicate_clusters()
         return
-    print(f"Найдено {len(sections)} секций.")
 
-    # Шаг 2: Разбивка на чанки
-    print("2/3: Разбивка текста на чанки...")
-    chunks = chunk_sections(sections, strategy="smart")
-    print(f"Создано {len(chunks)} чанков.")
-
-    # Шаг 3: Добавление в векторную базу
-    print("3/3: Создание эмбеддингов и сохранение в ChromaDB...")
-    add_documents(chunks)
+    print("Запуск процесса индексации документов...")
 
-    print("\n✅ Индексация завершена!")
-    print(f"Всего добавлено: {get_collection_size()} документов.")
+    # Конвейер: парсинг в пуле процессов → эмбеддинги → запись в ChromaDB;
+    # эмбеддинги считаются только для новых и изменившихся чанков
+    if args.watch:
+        try:
+            watch_directory(args.data_dir, interval=args.interval)
+        except KeyboardInterrupt:
+            print("\nНаблюдение остановлено.")
+    else:
+        sync_directory(args.data_dir)
+        print("\n✅ Индексация завершена!")
+
+    print(f"Всего в коллекции: {get_collection_size()} документов.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""
+Однократный перевод ID чанков в разметке бенчмарка на новую схему.
+
+ID чанка — "doc_" + md5(текст)[:CHUNK_ID_HEX_CHARS]; раньше брались 8
+hex-символов (ids.LEGACY_CHUNK_ID_HEX_CHARS). Старый ID — префикс нового,
+но восстановить новый можно только по тексту чанка. Тексты берутся из
+benchmarks/doc_id_mapping.json (full_content), evaluation_results.json
+(context_docs) и, с --from-collection, из коллекции ChromaDB.
+
+В файлах бенчмарка заменяются строки "doc_<8 hex>", для которых текст
+найден; форматирование файлов не меняется. ID, которым соответствуют
+разные тексты (коллизия старой схемы), и ID без текста остаются как есть —
+их нужно переразметить вручную.
+
+Запуск:
+    python scripts/remap_chunk_ids.py [--from-collection] [--dry-run]
+"""
+import argparse
+import json
+import re
+import sys
+
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(project_root))
+
+from src.transneft_ai_consultant.backend.data_processing.ids import LEGACY_CHUNK_ID_HEX_CHARS, make_chunk_id
+
+BENCHMARK_DIR = project_root / "benchmarks"
+TARGET_FILES = ["benchmark.json", "doc_id_mapping.json", "evaluation_results.json"]
+LEGACY_ID_RE = re.compile(rf'"(doc_[0-9a-f]{{{LEGACY_CHUNK_ID_HEX_CHARS}}})"')
+
+
+def load_texts(from_collection: bool) -> list:
+    texts = []
+    mapping_path = BENCHMARK_DIR / "doc_id_mapping.json"
+    if mapping_path.exists():
+        with open(mapping_path, "r", encoding="utf-8") as f:
+            texts += [info["full_content"] for info in json.load(f).values() if info.get("full_content")]
+
+    results_path = BENCHMARK_DIR / "evaluation_results.json"
+    if results_path.exists():
+        with open(results_path, "r", encoding="utf-8") as f:
+            for result in json.load(f):
+                texts += [doc["context"] for doc in result.get("context_docs", []) if doc.get("context")]
+
+    if from_collection:
+        from src.transneft_ai_consultant.backend.rag.vector_store import get_collection
+        texts += get_collection().get(include=["documents"])["documents"]
+    return texts
+
+
+def build_mapping(texts: list) -> tuple:
+    """({старый ID: новый ID}, {старый ID: набор новых} для коллизий)."""
+    candidates = {}
+    for text in texts:
+        candidates.setdefault(make_chunk_id(text, LEGACY_CHUNK_ID_HEX_CHARS), set()).add(make_chunk_id(text))
+    mapping = {old: next(iter(new)) for old, new in candidates.items() if len(new) == 1}
+    collisions = {old: new for old, new in candidates.items() if len(new) > 1}
+    return mapping, collisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перевод ID чанков бенчмарка на новую схему")
+    parser.add_argument("--from-collection", action="store_true", help="Брать тексты чанков и из ChromaDB")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет заменено")
+    args = parser.parse_args()
+
+    mapping, collisions = build_mapping(load_texts(args.from_collection))
+    print("=" * 70)
+    print(f"ПЕРЕВОД ID ЧАНКОВ: {len(mapping)} текстов с однозначным ID")
+    print("=" * 70)
+
+    unresolved = set()
+    for name in TARGET_FILES:
+        path = BENCHMARK_DIR / name
+        if not path.exists():
+            continue
+        raw = path.read_text(encoding="utf-8")
+        replaced = 0
+
+        def replace(match):
+            nonlocal replaced
+            old = match.group(1)
+            if old not in mapping:
+                unresolved.add(old)
+                return match.group(0)
+            replaced += 1
+            return f'"{mapping[old]}"'
+
+        updated = LEGACY_ID_RE.sub(replace, raw)
+        print(f"   {name}: заменено {replaced}")
+        if not args.dry_run and updated != raw:
+            path.write_text(updated, encoding="utf-8")
+
+    for old in sorted(unresolved):
+        reason = f"коллизия: {sorted(collisions[old])}" if old in collisions else "текст не найден"
+        print(f"   ⚠️ {old} не заменён ({reason})")
+    if args.dry_run:
+        print("\n(--dry-run: файлы не изменены)")
+
+
+if __name__ == "__main__":
+    main()
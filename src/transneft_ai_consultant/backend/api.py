@@ -1,18 +1,25 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
 from .rag.hybrid_search import hybrid_search, init_hybrid_search
 from typing import Optional
 
-import uvicorn
 import mimetypes
 import logging
+import json
 
-from .config import ROOT_DIR, CORS_ORIGINS, FRONTEND_DIR
-from .rag.pipeline import rag_answer
+from .config import ROOT_DIR, CORS_ORIGINS, FRONTEND_DIR, WARMUP_ON_STARTUP
+from .rag.pipeline import rag_answer, rag_answer_stream
 from .api_voice import router as voice_router
+from .executor import get_pipeline_executor, PipelineOverloaded
+from .rag.embedder import get_query_batcher
+from .rag.reranker import get_rerank_batcher, get_rerank_cache_stats
+from .rag.llm import get_llm_pool_stats
+from .rag.answer_cache import get_answer_cache_stats
+from .rag.vector_store import get_retrieval_cache_stats
+from .warmup import start_warmup, skip_warmup, get_readiness
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -54,6 +61,15 @@ class ChatResponse(BaseModel):
 
 app.include_router(voice_router)
 
+
+@app.on_event("startup")
+async def warmup_on_startup():
+    """Параллельная загрузка моделей и индексов в фоне (см. warmup.py)."""
+    if WARMUP_ON_STARTUP:
+        start_warmup()
+    else:
+        skip_warmup()
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """Текстовый чат endpoint."""
@@ -61,7 +77,9 @@ async def chat_endpoint(request: ChatRequest):
     logger.info(f"Получен вопрос: {question[:100]}...")
 
     try:
-        result = rag_answer(question, use_reranking=True, log_demo=False)
+        result = await get_pipeline_executor().run(
+            rag_answer, question, use_reranking=True, log_demo=False
+        )
 
         if not result or "answer" not in result:
             logger.warning("RAG вернул пустой ответ")
@@ -79,6 +97,13 @@ async def chat_endpoint(request: ChatRequest):
             audioUrl=None  # ✅ ДОБАВЬ (null = кнопка сгенерирует TTS)
         )
 
+    except PipelineOverloaded as e:
+        logger.warning(f"Запрос отклонён: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Ошибка в chat_endpoint: {e}", exc_info=True)
         raise HTTPException(
@@ -87,13 +112,100 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 
+def _format_sse(event: dict) -> str:
+    """Кодирует событие pipeline в формат Server-Sent Events."""
+    data = json.dumps(event.get("data", {}), ensure_ascii=False)
+    return f"event: {event['event']}\ndata: {data}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Потоковый текстовый чат (Server-Sent Events).
+
+    События: retrieval (контексты и скоры) → token (фрагменты ответа) → done
+    (итоговый ответ, скоры, time_to_first_token). При ошибке — событие error.
+    """
+    question = request.question
+    logger.info(f"Получен вопрос (stream): {question[:100]}...")
+
+    try:
+        events = get_pipeline_executor().open_stream(
+            rag_answer_stream, question, use_reranking=True, log_demo=False
+        )
+    except PipelineOverloaded as e:
+        logger.warning(f"Запрос отклонён: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    async def event_source():
+        try:
+            async for event in events:
+                if event["event"] == "done":
+                    logger.info(
+                        f"Ответ сгенерирован (stream): {len(event['data']['answer'])} символов, "
+                        f"TTFT={event['data'].get('time_to_first_token')} сек"
+                    )
+                yield _format_sse(event)
+        except PipelineOverloaded as e:
+            # Таймаут ожидания слота наступает уже после начала ответа
+            logger.warning(f"Запрос отклонён: {e}")
+            yield _format_sse({
+                "event": "error",
+                "data": {"detail": str(e), "status_code": e.status_code, "retry_after": e.retry_after}
+            })
+        except Exception as e:
+            logger.error(f"Ошибка в chat_stream_endpoint: {e}", exc_info=True)
+            yield _format_sse({
+                "event": "error",
+                "data": {"detail": f"Ошибка обработки запроса: {str(e)}"}
+            })
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # отключает буферизацию в Nginx
+        }
+    )
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
     return {
         "status": "ok",
         "service": "Transneft AI Assistant",
-        "features": ["rag", "text_chat"]  # ВРЕМЕННО без голоса
+        "features": ["rag", "text_chat", "text_chat_stream"]  # ВРЕМЕННО без голоса
+    }
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness endpoint для балансировщика.
+
+    200 — все модели и индексы загружены и прогреты, 503 — ещё нет.
+    """
+    readiness = get_readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
+@app.get("/api/stats")
+async def stats():
+    """Счётчики очереди и пула pipeline, батчинга моделей и кэшей."""
+    return {
+        "pipeline": get_pipeline_executor().get_stats(),
+        "embedding_batcher": get_query_batcher().get_stats(),
+        "rerank_batcher": get_rerank_batcher().get_stats(),
+        "llm_pool": get_llm_pool_stats(),
+        "retrieval_cache": get_retrieval_cache_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "rerank_cache": get_rerank_cache_stats()
     }
 
 
@@ -157,6 +269,8 @@ else:
     logger.error(f"Frontend directory NOT FOUND: {FRONTEND_DIR}")
 
 if __name__ == "__main__":
+    import uvicorn
+
     print(f"\n{'=' * 60}")
     print(f"Starting Transneft AI Assistant")
     print(f"{'=' * 60}")
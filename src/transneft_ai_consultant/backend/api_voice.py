@@ -1,6 +1,7 @@
 import tempfile
 import logging
 import base64
+import importlib.util
 import numpy as np
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
@@ -14,50 +15,67 @@ router = APIRouter(prefix="/api/voice", tags=["voice"])
 TEMP_AUDIO_DIR = Path(tempfile.gettempdir()) / "transneft_audio"
 TEMP_AUDIO_DIR.mkdir(exist_ok=True)
 
-# Импорты для конвертации аудио
-try:
-    import soundfile as sf
-    import librosa
-    AUDIO_CONVERTER_AVAILABLE = True
+# Тяжёлые библиотеки (librosa, whisper, torch) импортируются при первом
+# использовании; при импорте модуля проверяется только их наличие.
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# Конвертация аудио
+AUDIO_CONVERTER_AVAILABLE = _module_available("soundfile") and _module_available("librosa")
+if AUDIO_CONVERTER_AVAILABLE:
     logger.info("[API_VOICE] soundfile/librosa доступны")
-except ImportError as e:
-    AUDIO_CONVERTER_AVAILABLE = False
-    logger.warning(f"[API_VOICE] soundfile/librosa недоступны: {e}")
+else:
+    logger.warning("[API_VOICE] soundfile/librosa недоступны")
 
-# Импорт шумоподавления (опционально)
-try:
-    import noisereduce as nr
-    NOISE_REDUCE_AVAILABLE = True
+# Шумоподавление (опционально)
+NOISE_REDUCE_AVAILABLE = _module_available("noisereduce")
+if NOISE_REDUCE_AVAILABLE:
     logger.info("[API_VOICE] noisereduce доступен")
-except ImportError:
-    NOISE_REDUCE_AVAILABLE = False
+else:
     logger.warning("[API_VOICE] noisereduce недоступен: установите pip install noisereduce")
 
-# Импорты модулей STT/TTS/RAG
-try:
-    from .stt_tts.speech_to_text import get_stt_instance
-    STT_AVAILABLE = True
-    logger.info("[API_VOICE] STT модуль импортирован")
-except ImportError as e:
-    STT_AVAILABLE = False
-    logger.warning(f"[API_VOICE] STT недоступен: {e}")
+# Модули STT/TTS/RAG
+STT_AVAILABLE = _module_available("whisper")
+if STT_AVAILABLE:
+    logger.info("[API_VOICE] STT модуль доступен")
+else:
+    logger.warning("[API_VOICE] STT недоступен: не установлен whisper")
 
-try:
-    from .stt_tts.text_to_speech import get_tts_instance
-    TTS_AVAILABLE = True
-    logger.info("[API_VOICE] TTS модуль импортирован")
-except ImportError as e:
-    TTS_AVAILABLE = False
-    logger.warning(f"[API_VOICE] TTS недоступен: {e}")
+TTS_AVAILABLE = _module_available("torch") and _module_available("num2words")
+if TTS_AVAILABLE:
+    logger.info("[API_VOICE] TTS модуль доступен")
+else:
+    logger.warning("[API_VOICE] TTS недоступен: не установлены torch/num2words")
 
 try:
     from .rag.pipeline import rag_answer
+    from .executor import get_pipeline_executor, PipelineOverloaded
     RAG_AVAILABLE = True
 except ImportError as e:
     RAG_AVAILABLE = False
     logger.warning(f"[API_VOICE] RAG недоступен: {e}")
 
 
+def _audio_libs():
+    import soundfile as sf
+    import librosa
+    return sf, librosa
+
+
+def get_stt_instance(*args, **kwargs):
+    from .stt_tts.speech_to_text import get_stt_instance as _get_stt_instance
+    return _get_stt_instance(*args, **kwargs)
+
+
+def get_tts_instance(*args, **kwargs):
+    from .stt_tts.text_to_speech import get_tts_instance as _get_tts_instance
+    return _get_tts_instance(*args, **kwargs)
+
+
 def enhanced_preprocess(audio_data: np.ndarray, sr: int = 16000,
                         target_amp: float = 0.9, target_rms: float = 0.1,
                         denoise: bool = False) -> np.ndarray:
@@ -87,6 +105,7 @@ def enhanced_preprocess(audio_data: np.ndarray, sr: int = 16000,
 
     # (опционально) шумоподавление
     if denoise and NOISE_REDUCE_AVAILABLE:
+        import noisereduce as nr
         audio_data = nr.reduce_noise(y=audio_data, sr=sr, stationary=True)
         logger.info("[API_VOICE] Шумоподавление применено (stationary=True)")
     elif denoise:
@@ -133,6 +152,7 @@ async def speech_to_text_endpoint(
     temp_input = None
     temp_wav = None
     try:
+        sf, librosa = _audio_libs()
         temp_input = TEMP_AUDIO_DIR / f"input_{audio.filename}"
         with open(temp_input, "wb") as f:
             content = await audio.read()
@@ -228,6 +248,7 @@ async def voice_chat_endpoint(
     temp_input = None
     temp_wav = None
     try:
+        sf, librosa = _audio_libs()
         logger.info("[API_VOICE] Voice Chat: начало обработки")
 
         temp_input = TEMP_AUDIO_DIR / f"voice_input_{audio.filename}"
@@ -255,7 +276,9 @@ async def voice_chat_endpoint(
         logger.info(f"[API_VOICE] [1/3] STT: {question[:100]}...")
 
         # RAG → ответ
-        rag_result = rag_answer(question, use_reranking=True, log_demo=False)
+        rag_result = await get_pipeline_executor().run(
+            rag_answer, question, use_reranking=True, log_demo=False
+        )
         answer = rag_result.get("answer", "")
 
         # TTS → голос
@@ -275,6 +298,13 @@ async def voice_chat_endpoint(
         )
     except HTTPException:
         raise
+    except PipelineOverloaded as e:
+        logger.warning(f"[API_VOICE] Запрос отклонён: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"[API_VOICE] Ошибка voice chat: {e}", exc_info=True)
         if temp_input and temp_input.exists():
@@ -296,6 +326,7 @@ async def test_stt_upload(
     temp_input = None
     temp_wav = None
     try:
+        sf, librosa = _audio_libs()
         temp_input = TEMP_AUDIO_DIR / f"test_input_{audio.filename}"
         with open(temp_input, "wb") as f:
             content = await audio.read()
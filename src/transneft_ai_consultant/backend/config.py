@@ -17,10 +17,21 @@ FINAL_METRICS_PATH = ROOT_DIR / "final_metrics.json"
 
 # --- Модели ---
 LLM_MODEL_PATH = MODELS_DIR / "saiga_mistral_7b.Q4_K_M.gguf"
-EMBEDDER_MODEL_NAME = 'BAAI/bge-m3'
-RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+EMBEDDER_MODEL_NAME = 'intfloat/multilingual-e5-large-instruct'
+RERANKER_MODEL_NAME = 'DiTy/cross-encoder-russian-msmarco'
+RERANKER_BACKEND = "torch"                      # "torch" (CrossEncoder) или "onnx" (ONNX Runtime, int8)
+RERANKER_MAX_LENGTH = 512                       # токенов в паре (вопрос, чанк), длиннее — обрезается
+RERANKER_ONNX_DIR = MODELS_DIR / "reranker_onnx"    # экспорт для RERANKER_BACKEND = "onnx"
+# Модель семантического фильтра вопросов: None — вектор основного эмбеддера (вопрос
+# кодируется один раз за запрос). Порог подобран для e5-small; перед переходом на None
+# его нужно измерить для основного эмбеддера: scripts/calibrate_semantic_filter.py
+SEMANTIC_FILTER_MODEL = 'intfloat/multilingual-e5-small'
+SEMANTIC_FILTER_THRESHOLD = 0.4  # порог близости к эталонным вопросам для SEMANTIC_FILTER_MODEL
+# Словари, шаблоны и эталонные вопросы фильтра (компилируются один раз при старте)
+QUESTION_FILTER_RULES_PATH = BACKEND_DIR / "rag" / "question_filter_rules.json"
 
 # --- RAG ---
+CHROMA_DIR = BACKEND_DIR / "db" / "chroma"
 COLLECTION_NAME = "transneft_docs"
 TOP_K_RETRIEVER = 5
 INITIAL_TOP_K = 10
@@ -28,9 +39,80 @@ MIN_SIMILARITY_THRESHOLD = 0.3
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# --- Векторный поиск ---
+VECTOR_BACKEND = "chroma"                       # "chroma" (HNSW) или "numpy" (точный поиск в памяти)
+VECTOR_DTYPE = "float16"                        # матрица numpy-бэкенда: float32, float16, int8 или binary
+VECTOR_RESCORE_FACTOR = 4                       # int8/binary: кандидатов на пересчёт по float32 = k × factor
+VECTOR_INDEX_DIR = BACKEND_DIR / "db" / "vectors"
+VECTOR_SEARCH_BLOCK_ROWS = 8192                 # строк матрицы на одно умножение
+
+# --- Чанкинг ---
+# "tokens" — разбивка по предложениям (на ней размечен бенчмарк: ID чанков зависят от текста),
+# "offsets" — однопроходная разбивка по смещениям токенов; после смены — переразметка relevant_docs
+CHUNKER = "tokens"
+CHUNK_TOKENIZER = "tiktoken"    # для "offsets": "tiktoken" или "embedder" (токенизатор e5, окно 512)
+
+# --- BM25 ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25             # доля среднего IDF вместо отрицательного (как в rank_bm25)
+BM25_SEARCH_MODE = "exhaustive"                 # или "maxscore" — досрочное отсечение, тот же top-k
+BM25_INDEX_DIR = BACKEND_DIR / "db" / "bm25"    # сохранённый индекс (.npy, открывается через mmap)
+INDEX_REFRESH_DEBOUNCE = 2.0    # сек без записей в коллекцию перед фоновой перестройкой BM25 / матрицы numpy
+
+# --- Гибридный поиск ---
+HYBRID_FUSION = "weighted"      # "weighted" (min-max + alpha) или "rrf" (Reciprocal Rank Fusion)
+RRF_K = 60                      # сглаживание рангов в RRF
+
+# --- Индексация ---
+INDEX_WATCH_INTERVAL = 2.0      # сек, период опроса папки данных (prepare_data.py --watch)
+INGEST_PARSE_WORKERS = 4        # процессов для парсинга документов
+INGEST_EMBED_BATCH_SIZE = 64    # чанков в батче эмбеддингов и записи в ChromaDB
+INGEST_QUEUE_SIZE = 8           # батчей в очередях между стадиями (back-pressure)
+DEDUP_SIMILARITY_THRESHOLD = 0.97   # косинусная близость эмбеддингов почти-дубликатов (общий dup_cluster)
+DEDUP_DROP_EXACT = False            # не индексировать чанки, совпадающие до регистра и пробелов с другим чанком того же файла
+
+# --- Кэш эмбеддингов при индексации ---
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = BACKEND_DIR / "db" / "embedding_cache"    # memmap float32 + index.json
+
+# --- Батчинг эмбеддингов запросов ---
+EMBED_BATCH_MAX_SIZE = 32       # максимум запросов в одном вызове encode
+EMBED_BATCH_MAX_WAIT_MS = 5.0   # окно ожидания попутных запросов (мс)
+
+# --- Батчинг reranking ---
+RERANK_BATCH_MAX_PAIRS = 64     # максимум пар (вопрос, чанк) в одном батче
+RERANK_BATCH_MAX_WAIT_MS = 5.0  # окно ожидания попутных запросов (мс)
+RERANK_PREDICT_BATCH_SIZE = 16  # размер мини-батча внутри CrossEncoder.predict
+
+# --- Кэш скоров reranking ---
+RERANK_CACHE_ENABLED = True
+RERANK_CACHE_MAX_ENTRIES = 100000   # пар (вопрос, чанк) в кэше (LRU)
+RERANK_CACHE_TTL = None             # сек жизни скора, None — без ограничения
+
+# --- Кэш результатов поиска ---
+RETRIEVAL_CACHE_MAX_ENTRIES = 2048              # максимум закэшированных запросов (LRU)
+RETRIEVAL_CACHE_MAX_BYTES = 64 * 1024 * 1024    # суммарный объём результатов (байт)
+RETRIEVAL_CACHE_TTL = None                      # сек жизни записи, None — до переиндексации
+
+# --- Кэш ответов ---
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 1000             # максимум закэшированных ответов (LRU)
+ANSWER_CACHE_TTL = 3600.0                   # сек жизни ответа, None — без ограничения
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95    # косинусная близость вопросов для попадания
+
 # --- API ---
 CORS_ORIGINS = ["*"]
 
+# --- Прогрев ---
+WARMUP_ON_STARTUP = True        # загружать модели и индексы при старте API
+
+# --- Параллелизм pipeline ---
+PIPELINE_MAX_WORKERS = 2        # одновременно выполняемых запросов RAG
+PIPELINE_MAX_QUEUE = 16         # запросов, ожидающих свободного слота
+PIPELINE_QUEUE_TIMEOUT = 60.0   # сек ожидания слота до ответа 503
+PIPELINE_RETRY_AFTER = 5        # сек, заголовок Retry-After при отказе
+
 # --- LLM ---
 LLM_N_CTX = 4096
 LLM_N_THREADS = 8
@@ -38,12 +120,20 @@ LLM_N_GPU_LAYERS = 32
 LLM_MAX_TOKENS = 512
 LLM_TEMPERATURE = 0.1
 
+# --- Пул процессов LLM ---
+LLM_POOL_SIZE = 0                   # 0 — одна модель в процессе API; N — N процессов-реплик
+LLM_POOL_THREADS_PER_WORKER = 4     # n_threads каждой реплики (реплики × потоки ≈ числу ядер)
+LLM_POOL_REQUEST_TIMEOUT = 120.0    # сек на запрос (очередь + генерация)
+
 # --- Бенчмарк ---
 NUM_BENCHMARK_QUESTIONS = 100
 BENCHMARK_MAX_ATTEMPTS_MULTIPLIER = 2
 
-# --- Проверка критических путей при импорте ---
-if __name__ != "__main__":
+# --- Бюджет времени импорта backend.api (scripts/check_import_time.py) ---
+IMPORT_TIME_BUDGET_MS = 1500
+
+# --- Проверка критических путей ---
+if __name__ == "__main__":
     print(f"[Config] ROOT_DIR: {ROOT_DIR}")
     print(f"[Config] FRONTEND_DIR: {FRONTEND_DIR}")
     print(f"[Config] DOCX_PATH: {DOCX_PATH}")
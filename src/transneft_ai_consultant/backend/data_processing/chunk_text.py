@@ -1,5 +1,10 @@
 import re
 
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Callable, List, Optional
+from ..config import CHUNKER, CHUNK_TOKENIZER, EMBEDDER_MODEL_NAME
+
 try:
     import tiktoken
 
@@ -9,16 +14,65 @@ except ImportError:
 
 _APPROX_TOKENS_PER_WORD = 1.3
 
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\S+')
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model_encoding: str):
+    return tiktoken.get_encoding(model_encoding)
+
 
 def count_tokens(text: str, model_encoding: str = "cl100k_base") -> int:
     """Возвращает число токенов для текста."""
     if has_tiktoken:
-        enc = tiktoken.get_encoding(model_encoding)
-        return len(enc.encode(text))
+        return len(_get_encoding(model_encoding).encode(text))
     words = len(text.split())
     return max(1, int(words * _APPROX_TOKENS_PER_WORD))
 
 
+@lru_cache(maxsize=None)
+def get_offset_tokenizer(name: str = CHUNK_TOKENIZER) -> Callable[[str], List[int]]:
+    """
+    Токенизатор для chunk_by_token_offsets: текст → позиции начала токенов.
+
+    Args:
+        name: "tiktoken" (cl100k_base) или "embedder" (быстрый токенизатор
+            EMBEDDER_MODEL_NAME — лимиты чанков совпадают с окном e5)
+
+    Без tiktoken/transformers токенами считаются слова.
+    """
+    if name == "embedder":
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(EMBEDDER_MODEL_NAME, use_fast=True)
+
+            def embedder_offsets(text: str) -> List[int]:
+                encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+                return [start for start, end in encoding["offset_mapping"] if end > start]
+
+            return embedder_offsets
+        except (ImportError, OSError) as e:
+            print(f"⚠️ Токенизатор эмбеддера недоступен ({e}), используется tiktoken")
+
+    if has_tiktoken:
+        enc = _get_encoding("cl100k_base")
+
+        def tiktoken_offsets(text: str) -> List[int]:
+            _, offsets = enc.decode_with_offsets(enc.encode(text))
+            return offsets
+
+        return tiktoken_offsets
+
+    def word_offsets(text: str) -> List[int]:
+        return [m.start() for m in _WORD.finditer(text)]
+
+    # Одно слово ≈ 1.3 токена: chunk_sections пересчитывает лимиты
+    word_offsets.tokens_per_offset = _APPROX_TOKENS_PER_WORD
+    return word_offsets
+
+
 def chunk_by_tokens(
         text: str,
         max_tokens: int = 512,
@@ -90,18 +144,109 @@ def chunk_by_tokens(
     return chunks
 
 
-def chunk_sections(sections: list, strategy: str = "smart") -> list:
+def _snap(boundaries: List[int], lo: int, hi: int, last: bool) -> Optional[int]:
+    """Граница из boundaries в (lo, hi]: последняя или первая; None, если нет."""
+    if last:
+        i = bisect_right(boundaries, hi) - 1
+        return boundaries[i] if i >= 0 and boundaries[i] > lo else None
+    i = bisect_right(boundaries, lo)
+    return boundaries[i] if i < len(boundaries) and boundaries[i] <= hi else None
+
+
+def chunk_by_token_offsets(
+        text: str,
+        max_tokens: int = 512,
+        overlap: int = 50,
+        offsets: Optional[List[int]] = None,
+        tokenizer: Optional[Callable[[str], List[int]]] = None
+) -> list:
+    """
+    Однопроходная разбивка текста на чанки по смещениям токенов.
+
+    Текст кодируется один раз; чанк режется по индексу токена с привязкой
+    к концу предложения (иначе к началу слова), перекрытие отсчитывается
+    назад по тем же смещениям — без повторной токенизации.
+
+    Args:
+        text: текст для разбивки
+        max_tokens: максимальное количество токенов в чанке
+        overlap: количество токенов для перекрытия между чанками
+        offsets: готовые позиции начала токенов (если текст уже закодирован)
+        tokenizer: функция текст → позиции начала токенов (см. get_offset_tokenizer)
+
+    Returns:
+        список текстовых чанков
+    """
+    if not text.strip():
+        return []
+    if offsets is None:
+        offsets = (tokenizer or get_offset_tokenizer())(text)
+    n = len(offsets)
+    if n == 0:
+        return [text.strip()]
+
+    # Индексы токенов, с которых начинаются предложения и слова
+    sentence_starts = [bisect_left(offsets, m.end()) for m in _SENTENCE_BREAK.finditer(text)]
+    word_starts = [
+        i for i, pos in enumerate(offsets)
+        if i and (text[pos].isspace() or text[pos - 1].isspace())
+    ]
+    overlap = min(overlap, max_tokens // 2)
+
+    chunks = []
+    start = 0
+    while start < n:
+        limit = start + max_tokens
+        if limit >= n:
+            end = n
+        else:
+            end = (_snap(sentence_starts, start, limit, last=True)
+                   or _snap(word_starts, start, limit, last=True)
+                   or limit)
+
+        chunk = text[offsets[start]:offsets[end] if end < n else len(text)].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == n:
+            break
+
+        # Перекрытие: с начала предложения или слова не раньше end - overlap
+        back = max(end - overlap, start + 1)
+        if back >= end:
+            start = end
+        else:
+            start = (_snap(sentence_starts, back - 1, end - 1, last=False)
+                     or _snap(word_starts, back - 1, end - 1, last=False)
+                     or back)
+
+    return chunks
+
+
+def chunk_sections(
+        sections: list,
+        strategy: str = "smart",
+        chunker: str = CHUNKER,
+        tokenizer: Optional[Callable[[str], List[int]]] = None
+) -> list:
     """
     Умная разбивка с сохранением контекста заголовков.
 
     Args:
         sections: список секций документа
         strategy: "simple" или "smart" (с сохранением заголовков)
+        chunker: "tokens" (chunk_by_tokens) или "offsets" (chunk_by_token_offsets,
+            секция кодируется один раз)
+        tokenizer: токенизатор для "offsets" (по умолчанию CHUNK_TOKENIZER)
 
     Returns:
         список чанков с метаданными
     """
     chunks = []
+    if chunker == "offsets":
+        tokenizer = tokenizer or get_offset_tokenizer()
+    else:
+        tokenizer = None
+    scale = getattr(tokenizer, "tokens_per_offset", 1.0)
 
     for section in sections:
         title = section.get("title", "")
@@ -110,8 +255,11 @@ def chunk_sections(sections: list, strategy: str = "smart") -> list:
         if not content.strip():
             continue
 
+        offsets = tokenizer(content) if tokenizer is not None else None
+        n_tokens = len(offsets) * scale if offsets is not None else count_tokens(content)
+
         # Для коротких секций — не делим
-        if count_tokens(content) <= 512:
+        if n_tokens <= 512:
             context = f"{title}\n\n{content}" if title and title != "ROOT" else content
             chunks.append({
                 "context": context,
@@ -126,7 +274,12 @@ def chunk_sections(sections: list, strategy: str = "smart") -> list:
             continue
 
         # Для длинных — умная разбивка
-        text_chunks = chunk_by_tokens(content, max_tokens=400, overlap=80)
+        if offsets is not None:
+            text_chunks = chunk_by_token_offsets(
+                content, max_tokens=int(400 / scale), overlap=int(80 / scale), offsets=offsets
+            )
+        else:
+            text_chunks = chunk_by_tokens(content, max_tokens=400, overlap=80)
 
         for i, chunk_text in enumerate(text_chunks):
             if strategy == "smart" and title and title != "ROOT":
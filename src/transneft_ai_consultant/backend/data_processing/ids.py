@@ -0,0 +1,41 @@
+"""
+Детерминированные идентификаторы секций и чанков.
+
+ID чанка выводится из его текста — один и тот же чанк получает один и тот же
+ID при любой переиндексации, в ChromaDB, в ответах pipeline и в разметке
+бенчмарка (benchmarks/benchmark.json → relevant_docs). Поэтому схему
+"doc_" + md5(текст)[:CHUNK_ID_HEX_CHARS] нельзя менять без переразметки
+бенчмарка (scripts/remap_chunk_ids.py).
+
+Совпадение ID молча перезаписывает в коллекции другой чанк и отдаёт его скор
+из кэша reranking, поэтому 16 hex-символов (64 бита): при 10⁵ чанков
+вероятность коллизии ~3·10⁻¹⁰. Прежние 8 символов (LEGACY_CHUNK_ID_HEX_CHARS)
+давали ~70% уже при 10⁵ чанков. Коллекция со старыми ID переводится на новые
+обычной индексацией: чанки записываются под новыми ID, старые удаляются.
+"""
+import hashlib
+
+CHUNK_ID_HEX_CHARS = 16
+LEGACY_CHUNK_ID_HEX_CHARS = 8
+
+
+def make_chunk_id(context: str, hex_chars: int = CHUNK_ID_HEX_CHARS) -> str:
+    """ID чанка по его тексту (тот же, что в relevant_docs бенчмарка)."""
+    return "doc_" + hashlib.md5(context.encode("utf-8")).hexdigest()[:hex_chars]
+
+
+def make_section_id(source_file: str, section_type: str, title: str, occurrence: int) -> str:
+    """
+    ID секции документа.
+
+    Зависит от файла, типа и заголовка секции и номера повторения заголовка,
+    но не от содержимого: правка текста секции не меняет её ID.
+
+    Args:
+        source_file: Имя исходного файла
+        section_type: section / heading / table / image
+        title: Заголовок секции
+        occurrence: Порядковый номер секции с таким же типом и заголовком в файле
+    """
+    key = f"{source_file}\n{section_type}\n{title}\n{occurrence}"
+    return "sec_" + hashlib.md5(key.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,73 @@
+"""
+Хранилище изображений из документов с адресацией по содержимому.
+
+Файл называется по SHA-256 своего содержимого (img_<hash>.<ext>): одно и то же
+изображение при повторной индексации не записывается заново, а каталог не
+растёт с каждым запуском. Запись идёт через временный файл и os.replace,
+поэтому параллельные процессы индексации не оставляют недописанных файлов.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from typing import BinaryIO, Callable
+
+_READ_BLOCK = 1024 * 1024
+
+
+def _image_path(out_dir: str, digest: str, ext: str) -> str:
+    return os.path.join(out_dir, f"img_{digest[:32]}.{ext.lower() or 'bin'}")
+
+
+def _write_atomic(path: str, write: Callable[[BinaryIO], None]):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_image_stream(open_stream: Callable[[], BinaryIO], ext: str, out_dir: str) -> str:
+    """
+    Сохраняет изображение, читая его потоком (без копии в памяти).
+
+    Поток открывается дважды: первый проход считает хэш, второй копирует
+    данные на диск — только если такого файла ещё нет.
+
+    Args:
+        open_stream: Функция, открывающая поток с данными изображения
+        ext: Расширение файла без точки
+        out_dir: Каталог изображений
+
+    Returns:
+        Путь к файлу изображения
+    """
+    digest = hashlib.sha256()
+    with open_stream() as src:
+        for block in iter(lambda: src.read(_READ_BLOCK), b""):
+            digest.update(block)
+
+    path = _image_path(out_dir, digest.hexdigest(), ext)
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+
+        def copy(dst: BinaryIO):
+            with open_stream() as src:
+                shutil.copyfileobj(src, dst, _READ_BLOCK)
+
+        _write_atomic(path, copy)
+    return path
+
+
+def store_image_bytes(data: bytes, ext: str, out_dir: str) -> str:
+    """То же для уже загруженных в память данных (python-docx держит blob части)."""
+    path = _image_path(out_dir, hashlib.sha256(data).hexdigest(), ext)
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        _write_atomic(path, lambda dst: dst.write(data))
+    return path
@@ -0,0 +1,125 @@
+"""
+Инкрементальная индексация документов в ChromaDB.
+
+ID чанка выводится из его текста (ids.make_chunk_id), поэтому новый набор
+чанков сравнивается с коллекцией по ID (см. ingestion.IngestionPipeline):
+  - новых ID нет в коллекции → эмбеддинги и upsert;
+  - ID есть, но изменились метаданные (номер чанка, заголовок) → только update;
+  - ID есть в коллекции, но не в новом наборе → delete.
+Чанк с одинаковым текстом в нескольких файлах хранится один раз, файлы
+перечислены в source_files: синхронизация или удаление одного файла
+снимает только его вклад, а чанк удаляется, когда его не даёт ни один файл.
+Неизменившиеся чанки не трогаются, поэтому правка одного абзаца стоит
+нескольких эмбеддингов, а не переиндексации всего корпуса.
+
+Режим наблюдения опрашивает папку с данными и синхронизирует только
+изменившиеся, новые и удалённые файлы.
+"""
+import time
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .ingestion import IngestionPipeline, SUPPORTED_EXTENSIONS, plan_source_changes, print_ingestion_stats
+from ..rag.bm25 import BM25Builder
+from ..rag.hybrid_search import update_bm25_index
+from ..rag.vector_store import delete_documents, get_indexed_metadatas, get_content_version, update_metadatas
+from ..config import DATA_DIR, INDEX_WATCH_INTERVAL
+
+
+def list_source_files(data_dir: Path = DATA_DIR) -> List[Path]:
+    """Документы для индексации (без временных файлов Word "~$...")."""
+    return sorted(
+        p for p in Path(data_dir).iterdir()
+        if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS and not p.name.startswith("~$")
+    )
+
+
+def sync_file(path: Path) -> dict:
+    """Синхронизирует чанки одного файла с коллекцией."""
+    path = Path(path)
+    # Вся коллекция: чанк файла может уже лежать в ней от другого файла
+    stats = IngestionPipeline().run([path], get_indexed_metadatas(), scope={path.name})
+    print_ingestion_stats(stats)
+    if stats["failed_files"]:
+        raise RuntimeError(f"не удалось разобрать {path.name}")
+    return stats
+
+
+def remove_file(source_file: str) -> int:
+    """
+    Снимает вклад файла (файл удалён из папки данных).
+
+    Чанки, которые дают и другие файлы, остаются — из их source_files
+    убирается только этот файл.
+
+    Returns:
+        Число удалённых чанков
+    """
+    base_version = get_content_version()
+    updates, ids, _ = plan_source_changes(get_indexed_metadatas(), {}, scope={source_file})
+    update_metadatas(list(updates), list(updates.values()))
+    delete_documents(ids)
+    update_bm25_index(BM25Builder(), ids, base_version)
+    print(f"[INDEX] {source_file}: файл удалён, -{len(ids)} чанков, ~{len(updates)} остались у других файлов")
+    return len(ids)
+
+
+def sync_directory(data_dir: Path = DATA_DIR) -> dict:
+    """
+    Полная синхронизация: коллекция приводится к содержимому папки данных.
+
+    Чанки удалённых файлов и записи со старыми (позиционными) ID удаляются.
+    """
+    files = list_source_files(data_dir)
+    print(f"[INDEX] {data_dir}: {len(files)} документов")
+    stats = IngestionPipeline().run(files, get_indexed_metadatas())
+    print_ingestion_stats(stats)
+    return stats
+
+
+def _snapshot(data_dir: Path) -> Dict[Path, Tuple[int, int]]:
+    snapshot = {}
+    for path in list_source_files(data_dir):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def watch_directory(data_dir: Path = DATA_DIR, interval: float = INDEX_WATCH_INTERVAL,
+                    max_iterations: Optional[int] = None):
+    """
+    Следит за папкой данных и синхронизирует изменившиеся файлы.
+
+    Args:
+        data_dir: Папка с документами
+        interval: Период опроса (сек)
+        max_iterations: Число опросов (None — бесконечно, до Ctrl+C)
+    """
+    data_dir = Path(data_dir)
+    sync_directory(data_dir)
+    known = _snapshot(data_dir)
+    print(f"[INDEX] Наблюдение за {data_dir} (каждые {interval} сек, Ctrl+C — выход)")
+
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        iteration += 1
+        time.sleep(interval)
+        current = _snapshot(data_dir)
+
+        for path, signature in current.items():
+            if known.get(path) == signature:
+                continue
+            try:
+                sync_file(path)
+            except Exception as e:
+                # Файл может быть ещё не дописан — повторим на следующем опросе
+                print(f"[INDEX] ⚠️ {path.name}: ошибка синхронизации, повтор позже: {e}")
+                current[path] = known.get(path)
+
+        for path in set(known) - set(current):
+            remove_file(path.name)
+
+        known = {path: sig for path, sig in current.items() if sig is not None}
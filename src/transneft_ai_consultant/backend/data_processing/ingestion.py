@@ -0,0 +1,389 @@
+"""
+Конвейер индексации: парсинг → эмбеддинги → запись в ChromaDB.
+
+    [пул процессов: парсинг + чанкинг] → очередь → [поток: эмбеддинги]
+                                                 → очередь → [поток: запись в ChromaDB]
+
+Стадии работают одновременно: пока эмбеддер кодирует один батч, предыдущий
+пишется в ChromaDB, а процессы разбирают следующие файлы. Очереди между
+стадиями ограничены — медленная стадия тормозит предыдущие (back-pressure),
+и память не растёт с числом документов. Парсинг тоже ограничен: в работе
+не больше 2 × workers файлов одновременно.
+
+Новый набор чанков сравнивается с коллекцией по ID (см. ids.make_chunk_id):
+кодируются и записываются только новые чанки, у изменившихся метаданных
+вызывается update, исчезнувшие чанки удаляются. Те же изменения в конце
+применяются к сохранённому BM25-индексу (hybrid_search.update_bm25_index).
+Перед записью батча новым чанкам назначается кластер почти-дубликатов
+(near_duplicates.assign_duplicate_clusters).
+
+Один и тот же текст может встречаться в нескольких файлах — тогда это один
+чанк (один ID), а все файлы, которые его дают, перечислены в метаданных
+source_files. Метаданные (source_file, номер чанка, заголовок) берутся из
+одного из них. Синхронизация части файлов (scope) меняет только их вклад:
+чанк удаляется, лишь когда его не даёт ни один файл.
+"""
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .chunk_text import chunk_sections
+from .ids import make_chunk_id
+from .near_duplicates import assign_duplicate_clusters, exact_text_key, keep_cluster_id, strip_cluster_id
+from ..rag.bm25 import BM25Builder
+from ..rag.embedding_cache import compact_embedding_cache, embed_texts_cached
+from ..rag.hybrid_search import update_bm25_index
+from ..rag.vector_store import upsert_documents, update_metadatas, delete_documents, get_content_version
+from ..config import INGEST_PARSE_WORKERS, INGEST_EMBED_BATCH_SIZE, INGEST_QUEUE_SIZE, DEDUP_DROP_EXACT
+
+SUPPORTED_EXTENSIONS = (".docx", ".txt", ".md")
+
+SOURCE_FILES_KEY = "source_files"
+_SOURCES_SEPARATOR = "|"  # запрещён в именах файлов Windows
+
+_STAGE_END = None
+
+
+def parse_document(path: str) -> Tuple[List[dict], float]:
+    """
+    Парсинг и разбивка одного файла на чанки (выполняется в процессе пула).
+
+    Returns:
+        (chunks, parse_time)
+    """
+    t0 = time.perf_counter()
+    if path.lower().endswith(".docx"):
+        from .parse_docx_stream import iter_docx_sections
+        sections = iter_docx_sections(path)
+    else:
+        from .parse_text import read_text_sections
+        sections = read_text_sections(path)
+    chunks = chunk_sections(sections, strategy="smart")
+    return chunks, time.perf_counter() - t0
+
+
+def chunk_sources(metadata: dict) -> List[str]:
+    """Файлы, которые дают чанк; у чанков без source_files — его source_file."""
+    value = metadata.get(SOURCE_FILES_KEY)
+    if value:
+        return value.split(_SOURCES_SEPARATOR)
+    return [metadata["source_file"]] if metadata.get("source_file") else []
+
+
+def with_sources(metadata: dict, sources) -> dict:
+    return {**metadata, SOURCE_FILES_KEY: _SOURCES_SEPARATOR.join(sorted(set(sources)))}
+
+
+def plan_source_changes(
+        indexed: Dict[str, dict],
+        produced: Dict[str, Dict[str, dict]],
+        scope: Optional[set] = None,
+        keep_files: tuple = (),
+        written: Optional[Dict[str, dict]] = None,
+        delete_missing: bool = True
+) -> Tuple[Dict[str, dict], List[str], int]:
+    """
+    Сводит вклад синхронизированных файлов с коллекцией.
+
+    Args:
+        indexed: {id: metadata} коллекции до синхронизации
+        produced: {id: {файл: metadata}} — чанки, которые дали файлы из scope
+        scope: Синхронизированные файлы; None — вся коллекция
+        keep_files: Файлы из scope, которые не удалось разобрать: их вклад не меняется
+        written: {id: metadata} чанков, записанных в этом запуске
+        delete_missing: Удалять чанки, которые больше не даёт ни один файл
+
+    Returns:
+        ({id: новые метаданные}, ID на удаление, число чанков без изменений)
+    """
+    written = written or {}
+    updates, delete_ids, unchanged = {}, [], 0
+
+    def in_scope(source: str) -> bool:
+        return (scope is None or source in scope) and source not in keep_files
+
+    touched = set(produced) | {
+        chunk_id for chunk_id, meta in indexed.items()
+        if any(in_scope(source) for source in chunk_sources(meta))
+    }
+    for chunk_id in touched:
+        old = indexed.get(chunk_id)
+        by_file = produced.get(chunk_id, {})
+        kept = [source for source in chunk_sources(old) if not in_scope(source)] if old else []
+        sources = set(kept) | set(by_file)
+
+        if old is None:
+            if chunk_id in written:
+                meta = with_sources(written[chunk_id], sources)
+                if meta != written[chunk_id]:
+                    updates[chunk_id] = meta
+            continue
+        if not sources:
+            if delete_missing:
+                delete_ids.append(chunk_id)
+            continue
+
+        # Метаданные остаются от прежнего основного файла, пока он даёт чанк
+        primary = old.get("source_file")
+        if primary in by_file:
+            base = by_file[primary]
+        elif primary in kept:
+            base = strip_cluster_id(old)
+        elif by_file:
+            base = by_file[min(by_file)]
+        else:
+            # Основной файл удалён, чанк остаётся за другими; их метаданные обновит их синхронизация
+            base = {**strip_cluster_id(old), "source_file": min(kept)}
+        meta = keep_cluster_id(with_sources(base, sources), old)
+        if meta != old:
+            updates[chunk_id] = meta
+        else:
+            unchanged += 1
+    return updates, delete_ids, unchanged
+
+
+class _StageStats:
+    def __init__(self):
+        self.items = 0
+        self.batches = 0
+        self.busy_time = 0.0
+
+    def to_dict(self, total_time: float, unit: str, workers: int = 1) -> dict:
+        return {
+            unit: self.items,
+            "batches": self.batches,
+            "busy_time": round(self.busy_time, 3),
+            # Доля времени, когда стадия была занята: у узкого места близка к 1
+            "utilization": round(self.busy_time / (total_time * workers), 3) if total_time else 0.0,
+            f"{unit}_per_sec": round(self.items / total_time, 2) if total_time else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """Параллельная индексация набора файлов с back-pressure между стадиями."""
+
+    def __init__(
+            self,
+            parse_workers: int = INGEST_PARSE_WORKERS,
+            embed_batch_size: int = INGEST_EMBED_BATCH_SIZE,
+            queue_size: int = INGEST_QUEUE_SIZE
+    ):
+        """
+        Args:
+            parse_workers: Процессов для парсинга документов
+            embed_batch_size: Чанков в одном батче эмбеддингов / записи
+            queue_size: Вместимость очередей между стадиями (в батчах)
+        """
+        self.parse_workers = max(1, parse_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.queue_size = max(1, queue_size)
+
+    # ─── Стадии ───
+
+    def _parse_stage(self, files: List[Path]):
+        """Генератор (path, chunks | None, error) в порядке готовности."""
+        workers = min(self.parse_workers, len(files))
+        if workers <= 1:
+            # Один файл (режим наблюдения) — без накладных расходов на запуск процессов
+            for path in files:
+                try:
+                    chunks, parse_time = parse_document(str(path))
+                except Exception as e:
+                    yield path, None, e
+                    continue
+                self._parse_stats.busy_time += parse_time
+                yield path, chunks, None
+            return
+
+        pending = list(files)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            in_flight = {}
+            while pending or in_flight:
+                # Не больше 2 × workers файлов в работе: готовые чанки не копятся в памяти
+                while pending and len(in_flight) < workers * 2:
+                    path = pending.pop(0)
+                    in_flight[pool.submit(parse_document, str(path))] = path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        chunks, parse_time = future.result()
+                    except Exception as e:
+                        yield path, None, e
+                        continue
+                    self._parse_stats.busy_time += parse_time
+                    yield path, chunks, None
+
+    def _embed_stage(self):
+        while True:
+            batch = self._embed_queue.get()
+            if batch is _STAGE_END:
+                self._write_queue.put(_STAGE_END)
+                return
+            if self._error is not None:
+                continue  # после ошибки только освобождаем очередь
+            try:
+                t0 = time.perf_counter()
+                ids = [chunk_id for chunk_id, _ in batch]
+                contexts = [chunk["context"] for _, chunk in batch]
+                metadatas = [chunk["metadata"] for _, chunk in batch]
+                embeddings = embed_texts_cached(contexts)
+                self._embed_stats.busy_time += time.perf_counter() - t0
+                self._embed_stats.items += len(batch)
+                self._embed_stats.batches += 1
+                self._write_queue.put((ids, embeddings, contexts, metadatas))
+            except Exception as e:
+                self._error = e
+
+    def _write_stage(self):
+        while True:
+            item = self._write_queue.get()
+            if item is _STAGE_END:
+                return
+            if self._error is not None:
+                continue
+            try:
+                t0 = time.perf_counter()
+                ids, embeddings, contexts, metadatas = item
+                assign_duplicate_clusters(ids, embeddings, contexts, metadatas)
+                upsert_documents(ids, embeddings, contexts, metadatas)
+                self._bm25_added.add_texts(ids, contexts)
+                self._written.update(zip(ids, metadatas))
+                self._write_stats.busy_time += time.perf_counter() - t0
+                self._write_stats.items += len(ids)
+                self._write_stats.batches += 1
+            except Exception as e:
+                self._error = e
+
+    # ─── Запуск ───
+
+    def run(self, files: List[Path], indexed: Dict[str, dict], scope: Optional[set] = None,
+            delete_missing: bool = True) -> dict:
+        """
+        Индексирует файлы и приводит к ним коллекцию.
+
+        Args:
+            files: Файлы для индексации
+            indexed: {id: metadata} всей коллекции
+            scope: Имена синхронизируемых файлов; None — вся коллекция
+                (чанки файлов, которых нет в files, удаляются)
+            delete_missing: Удалять чанки, которые больше не даёт ни один файл
+
+        Returns:
+            Счётчики изменений и пропускная способность стадий
+        """
+        t0 = time.perf_counter()
+        self._parse_stats = _StageStats()
+        self._embed_stats = _StageStats()
+        self._write_stats = _StageStats()
+        self._parsed_chunks = 0
+        self._embed_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._write_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._error: Optional[BaseException] = None
+        self._bm25_added = BM25Builder()
+        self._duplicates_dropped = 0
+        self._written: Dict[str, dict] = {}
+        base_version = get_content_version()
+
+        embed_thread = threading.Thread(target=self._embed_stage, name="ingest-embed", daemon=True)
+        write_thread = threading.Thread(target=self._write_stage, name="ingest-write", daemon=True)
+        embed_thread.start()
+        write_thread.start()
+
+        produced: Dict[str, Dict[str, dict]] = {}  # id -> {файл: metadata}
+        failed_files = []
+        batch = []
+
+        try:
+            for path, chunks, error in self._parse_stage(files):
+                if error is not None:
+                    print(f"[INGEST] ❌ {path.name}: ошибка парсинга: {error}")
+                    failed_files.append(path.name)
+                    continue
+                self._parse_stats.items += 1
+                self._parsed_chunks += len(chunks)
+                print(f"[INGEST] {path.name}: {len(chunks)} чанков")
+
+                file_texts = set()  # точные дубликаты ищутся только внутри файла
+                for chunk in chunks:
+                    chunk_id = make_chunk_id(chunk["context"])
+                    if path.name in produced.get(chunk_id, {}):
+                        continue
+                    if DEDUP_DROP_EXACT:
+                        text_key = exact_text_key(chunk["context"])
+                        if text_key in file_texts:
+                            self._duplicates_dropped += 1
+                            continue
+                        file_texts.add(text_key)
+                    by_file = produced.setdefault(chunk_id, {})
+                    by_file[path.name] = chunk["metadata"]
+                    # Чанк уже есть в коллекции (в т.ч. от другого файла) или уже в очереди
+                    if chunk_id in indexed or len(by_file) > 1:
+                        continue
+                    batch.append((chunk_id, {**chunk, "metadata": with_sources(chunk["metadata"], [path.name])}))
+                    if len(batch) >= self.embed_batch_size:
+                        self._embed_queue.put(batch)  # блокируется, если эмбеддер не успевает
+                        batch = []
+            if batch:
+                self._embed_queue.put(batch)
+        finally:
+            self._embed_queue.put(_STAGE_END)
+            embed_thread.join()
+            write_thread.join()
+            compact_embedding_cache()
+
+        if self._error is not None:
+            raise RuntimeError(f"Ошибка конвейера индексации: {self._error}") from self._error
+
+        # Чанки файлов, которые не удалось разобрать, не трогаем
+        updates, delete_ids, unchanged = plan_source_changes(
+            indexed, produced, scope, tuple(failed_files), self._written, delete_missing
+        )
+        update_metadatas(list(updates), list(updates.values()))
+        delete_documents(delete_ids)
+
+        update_bm25_index(self._bm25_added, delete_ids, base_version)
+
+        total_time = time.perf_counter() - t0
+        parse = self._parse_stats.to_dict(total_time, "docs", workers=min(self.parse_workers, max(1, len(files))))
+        del parse["batches"]
+        parse["chunks"] = self._parsed_chunks
+        parse["chunks_per_sec"] = round(self._parsed_chunks / total_time, 2) if total_time else 0.0
+
+        return {
+            "files": len(files),
+            "failed_files": failed_files,
+            "added": self._write_stats.items,
+            "updated": len(updates),
+            "deleted": len(delete_ids),
+            "unchanged": unchanged,
+            "duplicates_dropped": self._duplicates_dropped,
+            "total_time": round(total_time, 3),
+            "stages": {
+                "parse": parse,
+                "embed": self._embed_stats.to_dict(total_time, "embeddings"),
+                "write": self._write_stats.to_dict(total_time, "chunks"),
+            },
+        }
+
+
+def print_ingestion_stats(stats: dict):
+    stages = stats["stages"]
+    print(
+        f"[INGEST] +{stats['added']} новых, ~{stats['updated']} обновлено, -{stats['deleted']} удалено, "
+        f"{stats['unchanged']} без изменений за {stats['total_time']:.2f} сек"
+    )
+    if stats["duplicates_dropped"]:
+        print(f"[INGEST] Не записано точных дубликатов: {stats['duplicates_dropped']}")
+    print(
+        f"[INGEST] Парсинг: {stages['parse']['docs_per_sec']} док/с, {stages['parse']['chunks_per_sec']} чанков/с "
+        f"(загрузка {stages['parse']['utilization']:.0%}); "
+        f"эмбеддинги: {stages['embed']['embeddings_per_sec']}/с (загрузка {stages['embed']['utilization']:.0%}); "
+        f"запись: {stages['write']['chunks_per_sec']} чанков/с (загрузка {stages['write']['utilization']:.0%})"
+    )
+    if stats["failed_files"]:
+        print(f"[INGEST] ⚠️ Не разобраны: {', '.join(stats['failed_files'])}")
@@ -0,0 +1,125 @@
+"""
+Почти-дубликаты чанков, найденные при индексации.
+
+Каждый чанк получает в метаданных dup_cluster — ID первого проиндексированного
+чанка, на который он почти совпадает (косинусная близость эмбеддингов не ниже
+DEDUP_SIMILARITY_THRESHOLD), или собственный ID. Эмбеддинги новых чанков уже
+посчитаны конвейером индексации, поэтому на батч нужен один запрос ближайшего
+соседа к коллекции и одно умножение внутри батча.
+
+Дедупликация при ответе (pipeline.deduplicate_contexts) сводится к множеству
+увиденных dup_cluster. При DEDUP_DROP_EXACT чанки, совпадающие до регистра
+и пробелов с более ранним чанком того же файла, отбрасываются ещё до
+эмбеддингов (exact_text_key в ingestion). Копия из другого файла не
+отбрасывается: при удалении того файла текст пропал бы из индекса.
+
+Коллекции, проиндексированные до появления dup_cluster, размечаются
+rebuild_duplicate_clusters (scripts/prepare_data.py --rebuild-duplicates).
+"""
+import hashlib
+
+from typing import List, Optional
+
+import numpy as np
+
+from ..rag.vector_store import get_collection, get_collection_size, query_collection, update_metadatas
+from ..config import DEDUP_SIMILARITY_THRESHOLD
+
+DUP_CLUSTER_KEY = "dup_cluster"
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def exact_text_key(text: str) -> str:
+    """Ключ точного дубликата: текст без учёта регистра и пробелов."""
+    return hashlib.md5(_normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cluster_id(doc: dict) -> str:
+    """Кластер найденного документа; у чанков без разметки — собственный ID."""
+    return (doc.get("metadata") or {}).get(DUP_CLUSTER_KEY) or doc["id"]
+
+
+def strip_cluster_id(metadata: dict) -> dict:
+    """Метаданные без dup_cluster — для сравнения с метаданными из парсера."""
+    return {key: value for key, value in metadata.items() if key != DUP_CLUSTER_KEY}
+
+
+def keep_cluster_id(metadata: dict, indexed: dict) -> dict:
+    """Новые метаданные чанка с dup_cluster, уже назначенным в коллекции."""
+    if DUP_CLUSTER_KEY in indexed:
+        return {**metadata, DUP_CLUSTER_KEY: indexed[DUP_CLUSTER_KEY]}
+    return metadata
+
+
+def assign_duplicate_clusters(
+        ids: List[str],
+        embeddings: List[List[float]],
+        contexts: List[str],
+        metadatas: List[dict],
+        threshold: float = DEDUP_SIMILARITY_THRESHOLD
+):
+    """
+    Дописывает dup_cluster в метаданные батча новых чанков перед записью.
+
+    Кандидаты — ближайший сосед в коллекции и предыдущие чанки батча.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    nearest = query_collection(matrix, top_k=1) if get_collection_size() else [[] for _ in ids]
+    within = matrix @ matrix.T
+
+    clusters: List[str] = []
+    for i, chunk_id in enumerate(ids):
+        best_similarity, best_cluster = threshold, None
+        if nearest[i] and nearest[i][0]["similarity"] >= best_similarity:
+            neighbour = nearest[i][0]
+            best_similarity, best_cluster = neighbour["similarity"], cluster_id(neighbour)
+        if i:
+            j = int(np.argmax(within[i, :i]))
+            if within[i, j] >= best_similarity:
+                best_cluster = clusters[j]
+
+        clusters.append(best_cluster or chunk_id)
+        metadatas[i][DUP_CLUSTER_KEY] = clusters[i]
+
+
+def rebuild_duplicate_clusters(threshold: float = DEDUP_SIMILARITY_THRESHOLD, block_rows: int = 1024) -> int:
+    """
+    Размечает dup_cluster всей коллекции заново.
+
+    Чанки обходятся в порядке коллекции: каждый попадает в кластер самого
+    близкого из предыдущих, если близость не ниже threshold.
+
+    Returns:
+        Число чанков, у которых изменился dup_cluster
+    """
+    results = get_collection().get(include=["embeddings", "metadatas"])
+    ids = results["ids"]
+    if not ids:
+        return 0
+    matrix = np.asarray(results["embeddings"], dtype=np.float32)
+
+    clusters: List[Optional[str]] = [None] * len(ids)
+    for start in range(0, len(ids), block_rows):
+        # Близость блока ко всем предыдущим чанкам; сами с собой и последующие исключены
+        block = matrix[start:start + block_rows] @ matrix[:start + block_rows].T
+        for offset, row in enumerate(block):
+            i = start + offset
+            clusters[i] = ids[i]
+            if i:
+                j = int(np.argmax(row[:i]))
+                if row[j] >= threshold:
+                    clusters[i] = clusters[j]
+
+    changed_ids, changed_metas = [], []
+    for chunk_id, meta, cluster in zip(ids, results["metadatas"], clusters):
+        meta = meta or {}
+        if meta.get(DUP_CLUSTER_KEY) != cluster:
+            changed_ids.append(chunk_id)
+            changed_metas.append({**meta, DUP_CLUSTER_KEY: cluster})
+    update_metadatas(changed_ids, changed_metas)
+
+    print(f"[DEDUP] {len(ids)} чанков, кластеров: {len(set(clusters))}, обновлено: {len(changed_ids)}")
+    return len(changed_ids)
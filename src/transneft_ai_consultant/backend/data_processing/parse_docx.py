@@ -1,8 +1,10 @@
 import os
-import uuid
 
+from collections import Counter
 from docx import Document
-from typing import List, Dict
+from typing import List, Dict, Optional
+from .ids import make_section_id
+from .images import store_image_bytes
 
 NS = {
     'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
@@ -15,35 +17,38 @@ def is_list_paragraph(paragraph):
     return numPr is not None
 
 def extract_images(doc: Document, out_dir: str):
-    os.makedirs(out_dir, exist_ok=True)
+    # Имя файла — хэш содержимого: уже сохранённые изображения не перезаписываются
     saved = []
     for rel in doc.part.rels.values():
         try:
             tp = rel.target_part
             ctype = getattr(tp, "content_type", "")
             if "image" in ctype:
-                img = tp.blob
-                ext = ctype.split('/')[-1]
-                name = f"img_{uuid.uuid4().hex}.{ext}"
-                path = os.path.join(out_dir, name)
-                with open(path, "wb") as f:
-                    f.write(img)
-                saved.append(path)
+                path = store_image_bytes(tp.blob, ctype.split('/')[-1], out_dir)
+                if path not in saved:
+                    saved.append(path)
         except Exception:
             # игнорировать нерелевантные связи
             continue
     return saved
 
-def read_docx_sections(path: str) -> List[Dict]:
+def read_docx_sections(path: str, with_images: bool = False, images_dir: Optional[str] = None) -> List[Dict]:
     doc = Document(path)
     base_name = os.path.basename(path)
     sections = []
+    occurrences = Counter()
+
+    def section_id(section_type: str, title: str) -> str:
+        # Стабильный ID: одинаковые заголовки различаются порядковым номером
+        occurrences[(section_type, title)] += 1
+        return make_section_id(base_name, section_type, title, occurrences[(section_type, title)])
+
     current = {
         "title": "ROOT",
         "content": "",
         "type": "section",
         "source_file": base_name,
-        "section_id": uuid.uuid4().hex
+        "section_id": section_id("section", "ROOT")
     }
 
     for para in doc.paragraphs:
@@ -61,7 +66,7 @@ def read_docx_sections(path: str) -> List[Dict]:
                 "type": "heading",
                 "style": style_name,
                 "source_file": base_name,
-                "section_id": uuid.uuid4().hex
+                "section_id": section_id("heading", text)
             }
             continue
 
@@ -82,17 +87,20 @@ def read_docx_sections(path: str) -> List[Dict]:
             "content": "\n".join(rows),
             "type": "table",
             "source_file": base_name,
-            "section_id": uuid.uuid4().hex
+            "section_id": section_id("table", "TABLE")
         })
 
-    imgs = extract_images(doc, out_dir=os.path.join(os.path.dirname(path), "images"))
+    if not with_images:
+        return sections
+
+    imgs = extract_images(doc, out_dir=images_dir or os.path.join(os.path.dirname(path), "images"))
     for p in imgs:
         sections.append({
             "title": "IMAGE",
             "content": p,
             "type": "image",
             "source_file": base_name,
-            "section_id": uuid.uuid4().hex
+            "section_id": section_id("image", "IMAGE")
         })
 
     return sections
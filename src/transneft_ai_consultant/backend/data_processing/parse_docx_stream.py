@@ -0,0 +1,261 @@
+"""
+Потоковый парсер DOCX без объектной модели python-docx.
+
+word/document.xml читается через ElementTree.iterparse прямо из zip-архива:
+каждый абзац и таблица верхнего уровня обрабатываются по событию "end" и
+сразу удаляются из дерева, поэтому память не зависит от размера документа.
+Стили (какой styleId является заголовком) берутся из word/styles.xml.
+
+Секции имеют тот же формат, что у parse_docx.read_docx_sections, и отдаются
+генератором в порядке документа: таблица идёт сразу после секции, в которой
+она встретилась (а не в конце документа, как у python-docx парсера).
+"""
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+from .ids import make_section_id
+from .images import store_image_stream
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_BODY = _W + "body"
+_P = _W + "p"
+_TBL = _W + "tbl"
+_TR = _W + "tr"
+_TC = _W + "tc"
+_RUN = _W + "r"
+_HYPERLINK = _W + "hyperlink"
+
+# Текстовые эквиваленты элементов внутри w:r (как CT_R.text в python-docx)
+_RUN_TEXT = {
+    _W + "tab": "\t",
+    _W + "ptab": "\t",
+    _W + "cr": "\n",
+    _W + "noBreakHyphen": "-",
+}
+
+
+def _load_styles(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """styleId → имя стиля; ключ None — стиль абзаца по умолчанию."""
+    try:
+        data = zf.read("word/styles.xml")
+    except KeyError:
+        return {}
+    styles = {}
+    for style in ET.fromstring(data).iter(_W + "style"):
+        if style.get(_W + "type") != "paragraph":
+            continue
+        name_el = style.find(_W + "name")
+        name = name_el.get(_W + "val") if name_el is not None else ""
+        styles[style.get(_W + "styleId")] = name
+        if style.get(_W + "default") in ("1", "true", "on"):
+            styles[None] = name
+    return styles
+
+
+def _run_text(run: ET.Element) -> str:
+    parts = []
+    for child in run:
+        if child.tag == _W + "t":
+            parts.append(child.text or "")
+        elif child.tag == _W + "br":
+            # Разрывы страницы и колонки текста не дают
+            if child.get(_W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(_RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    parts = []
+    for child in p:
+        if child.tag == _RUN:
+            parts.append(_run_text(child))
+        elif child.tag == _HYPERLINK:
+            parts.extend(_run_text(run) for run in child.findall(_RUN))
+    return "".join(parts)
+
+
+def _paragraph_style(p: ET.Element, styles: Dict[str, str]) -> str:
+    ppr = p.find(_W + "pPr")
+    style_el = ppr.find(_W + "pStyle") if ppr is not None else None
+    if style_el is not None and style_el.get(_W + "val") in styles:
+        return styles[style_el.get(_W + "val")]
+    return styles.get(None, "")
+
+
+def _is_list_paragraph(p: ET.Element) -> bool:
+    ppr = p.find(_W + "pPr")
+    return ppr is not None and ppr.find(_W + "numPr") is not None
+
+
+def _table_rows(tbl: ET.Element) -> List[str]:
+    """
+    Строки таблицы "| a | b |".
+
+    Как row.cells в python-docx: объединённая по горизонтали ячейка
+    повторяется по числу колонок (gridSpan), продолжение вертикального
+    объединения (vMerge) берёт текст верхней ячейки.
+    """
+    rows = []
+    above: Dict[int, str] = {}  # колонка сетки → текст ячейки в предыдущей строке
+    for tr in tbl.findall(_TR):
+        trpr = tr.find(_W + "trPr")
+        grid_before = trpr.find(_W + "gridBefore") if trpr is not None else None
+        col = int(grid_before.get(_W + "val", "0")) if grid_before is not None else 0
+
+        cells = []
+        current: Dict[int, str] = {}
+        for tc in tr.findall(_TC):
+            tcpr = tc.find(_W + "tcPr")
+            span_el = tcpr.find(_W + "gridSpan") if tcpr is not None else None
+            span = int(span_el.get(_W + "val", "1")) if span_el is not None else 1
+            vmerge = tcpr.find(_W + "vMerge") if tcpr is not None else None
+
+            if vmerge is not None and vmerge.get(_W + "val", "continue") == "continue":
+                text = above.get(col, "")
+            else:
+                text = "\n".join(_paragraph_text(p) for p in tc.findall(_P))
+            text = text.strip().replace("\n", " ")
+
+            for offset in range(span):
+                current[col + offset] = text
+                cells.append(text)
+            col += span
+
+        above = current
+        rows.append("| " + " | ".join(cells) + " |")
+    return rows
+
+
+def _image_targets(zf: zipfile.ZipFile) -> List[str]:
+    """Пути в архиве изображений, на которые ссылается документ."""
+    try:
+        data = zf.read("word/_rels/document.xml.rels")
+    except KeyError:
+        return []
+    targets = []
+    for rel in ET.fromstring(data).iter(_PKG_REL + "Relationship"):
+        if rel.get("TargetMode") == "External" or not rel.get("Type", "").endswith("/image"):
+            continue
+        target = rel.get("Target", "")
+        targets.append(target.lstrip("/") if target.startswith("/") else "word/" + target)
+    return targets
+
+
+def _extract_images(zf: zipfile.ZipFile, out_dir: str) -> List[str]:
+    saved = []
+    for target in _image_targets(zf):
+        if target not in zf.NameToInfo:
+            continue
+        ext = os.path.splitext(target)[1].lstrip(".")
+        path = store_image_stream(lambda: zf.open(target), ext, out_dir)
+        if path not in saved:
+            saved.append(path)
+    return saved
+
+
+def iter_docx_sections(
+        path: str,
+        with_images: bool = False,
+        images_dir: Optional[str] = None
+) -> Iterator[Dict]:
+    """
+    Потоково читает DOCX и отдаёт секции в порядке документа.
+
+    Args:
+        path: Путь к .docx
+        with_images: Извлекать изображения и отдавать секции "image"
+        images_dir: Куда извлекать изображения (по умолчанию <папка файла>/images)
+
+    Yields:
+        Секции {"title", "content", "type", "source_file", "section_id", ["style"]}
+    """
+    base_name = os.path.basename(path)
+    occurrences = Counter()
+
+    def section_id(section_type: str, title: str) -> str:
+        occurrences[(section_type, title)] += 1
+        return make_section_id(base_name, section_type, title, occurrences[(section_type, title)])
+
+    with zipfile.ZipFile(path) as zf:
+        styles = _load_styles(zf)
+
+        current = {
+            "title": "ROOT",
+            "content": "",
+            "type": "section",
+            "source_file": base_name,
+            "section_id": section_id("section", "ROOT")
+        }
+        pending_tables = []
+        body = None
+        depth = 0
+
+        with zf.open("word/document.xml") as xml_file:
+            for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if elem.tag == _BODY:
+                        body = elem
+                    continue
+                depth -= 1
+
+                # Интересуют только прямые потомки w:body (document → body → p/tbl)
+                if body is None or depth != 2:
+                    continue
+
+                if elem.tag == _P:
+                    text = _paragraph_text(elem).strip()
+                    if text:
+                        style_name = _paragraph_style(elem, styles)
+                        if style_name and style_name.lower().startswith("heading"):
+                            yield current
+                            # Таблицы секции отдаются сразу после неё
+                            yield from pending_tables
+                            pending_tables = []
+                            current = {
+                                "title": text,
+                                "content": "",
+                                "type": "heading",
+                                "style": style_name,
+                                "source_file": base_name,
+                                "section_id": section_id("heading", text)
+                            }
+                        elif _is_list_paragraph(elem):
+                            current["content"] += "\n- " + text
+                        else:
+                            current["content"] += ("\n" if current["content"] else "") + text
+
+                elif elem.tag == _TBL:
+                    pending_tables.append({
+                        "title": "TABLE",
+                        "content": "\n".join(_table_rows(elem)),
+                        "type": "table",
+                        "source_file": base_name,
+                        "section_id": section_id("table", "TABLE")
+                    })
+
+                # Обработанные элементы больше не нужны — память не растёт
+                body.clear()
+
+        yield current
+        yield from pending_tables
+
+        if not with_images:
+            return
+
+        out_dir = images_dir or os.path.join(os.path.dirname(path), "images")
+        for image_path in _extract_images(zf, out_dir):
+            yield {
+                "title": "IMAGE",
+                "content": image_path,
+                "type": "image",
+                "source_file": base_name,
+                "section_id": section_id("image", "IMAGE")
+            }
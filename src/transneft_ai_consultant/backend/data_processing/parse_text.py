@@ -0,0 +1,53 @@
+"""
+Парсинг текстовых документов (.txt, .md) в секции того же формата, что read_docx_sections.
+
+Markdown делится на секции по заголовкам (#, ##, ...), обычный текст —
+одна секция ROOT.
+"""
+import os
+import re
+
+from collections import Counter
+from typing import List, Dict
+from .ids import make_section_id
+
+_MD_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+def read_text_sections(path: str) -> List[Dict]:
+    base_name = os.path.basename(path)
+    is_markdown = path.lower().endswith(".md")
+    occurrences = Counter()
+
+    def new_section(section_type: str, title: str) -> Dict:
+        occurrences[(section_type, title)] += 1
+        return {
+            "title": title,
+            "content": "",
+            "type": section_type,
+            "source_file": base_name,
+            "section_id": make_section_id(base_name, section_type, title, occurrences[(section_type, title)])
+        }
+
+    sections = []
+    current = new_section("section", "ROOT")
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            text = line.strip()
+            if not text:
+                continue
+
+            heading = _MD_HEADING_RE.match(line) if is_markdown else None
+            if heading:
+                if current["content"] or current["title"] != "ROOT":
+                    sections.append(current)
+                current = new_section("heading", heading.group(2))
+                current["style"] = f"Heading {len(heading.group(1))}"
+                continue
+
+            current["content"] += ("\n" if current["content"] else "") + text
+
+    if current["content"] or current["title"] != "ROOT":
+        sections.append(current)
+    return sections
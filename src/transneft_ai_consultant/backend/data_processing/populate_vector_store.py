@@ -1,6 +1,5 @@
-import uuid
-
 from .chunk_text import chunk_by_tokens, count_tokens
+from .ids import make_chunk_id
 
 def index_sections_to_chroma(sections, chroma_client, collection_name="transneft_docs"):
     collection = chroma_client.get_or_create_collection(collection_name)
@@ -8,6 +7,7 @@ def index_sections_to_chroma(sections, chroma_client, collection_name="transneft
     docs = []
     metadatas = []
     ids = []
+    seen = set()
 
     for sec_idx, sec in enumerate(sections):
         content = sec.get("content", "")
@@ -19,23 +19,26 @@ def index_sections_to_chroma(sections, chroma_client, collection_name="transneft
         chunks = chunk_by_tokens(content, max_tokens=400, overlap=80)
 
         for ci, chunk in enumerate(chunks):
-            doc_id = f"{sec.get('section_id', uuid.uuid4().hex)}_{ci}"
+            doc_id = make_chunk_id(chunk)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
             token_count = count_tokens(chunk)
 
             docs.append(chunk)
             metadatas.append({
                 "source_file": sec.get("source_file", "unknown.docx"),
                 "section_title": sec.get("title", ""),
-                "section_id": sec.get("section_id", uuid.uuid4().hex),
+                "section_id": sec.get("section_id", "unknown"),
                 "section_index": sec_idx,
                 "chunk_index": ci,
                 "token_count": token_count
             })
             ids.append(doc_id)
 
-    # Bulk add to chroma
+    # Bulk upsert: повторная индексация не создаёт дубликатов
     if docs:
-        collection.add(
+        collection.upsert(
             documents=docs,
             metadatas=metadatas,
             ids=ids
@@ -0,0 +1,262 @@
+"""
+Выполнение синхронного RAG pipeline вне event loop.
+
+rag_answer полностью синхронный (retrieval, reranking, LLM), поэтому
+вызов из async-обработчика замораживает весь uvicorn. Здесь pipeline
+выполняется в отдельном пуле потоков с ограничением параллелизма и
+ограниченной очередью ожидания: при переполнении запрос отклоняется
+сразу (429), при слишком долгом ожидании слота — по таймауту (503).
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from .config import (
+    PIPELINE_MAX_WORKERS,
+    PIPELINE_MAX_QUEUE,
+    PIPELINE_QUEUE_TIMEOUT,
+    PIPELINE_RETRY_AFTER,
+)
+
+logger = logging.getLogger(__name__)
+
+_STREAM_END = object()
+
+
+class PipelineOverloaded(Exception):
+    """Запрос не может быть принят: очередь заполнена или истёк таймаут ожидания."""
+
+    def __init__(self, message: str, status_code: int = 429, retry_after: int = PIPELINE_RETRY_AFTER):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _close_generator(gen: Iterator):
+    try:
+        gen.close()
+    except Exception as e:
+        logger.warning(f"[EXECUTOR] Ошибка при закрытии потокового генератора: {e}")
+
+
+class PipelineExecutor:
+    """Пул потоков для pipeline с ограниченной очередью и счётчиками."""
+
+    def __init__(
+            self,
+            max_workers: int = PIPELINE_MAX_WORKERS,
+            max_queue: int = PIPELINE_MAX_QUEUE,
+            queue_timeout: float = PIPELINE_QUEUE_TIMEOUT,
+            retry_after: int = PIPELINE_RETRY_AFTER
+    ):
+        """
+        Args:
+            max_workers: Сколько запросов pipeline выполняется одновременно
+            max_queue: Сколько запросов может ждать свободного слота
+            queue_timeout: Максимальное время ожидания слота (сек)
+            retry_after: Значение заголовка Retry-After при отказе (сек)
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-pipeline")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+        # Счётчики
+        self._waiting = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._run_time_total = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Семафор создаётся внутри работающего event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    def _check_capacity(self):
+        """Отклоняет запрос (429), если очередь заполнена. Вызывается под self._lock."""
+        # Принятые запросы = выполняющиеся + ожидающие слота
+        if self._active + self._waiting >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise PipelineOverloaded(
+                "Сервер перегружен: очередь запросов заполнена",
+                status_code=429,
+                retry_after=self.retry_after
+            )
+
+    async def _acquire_slot(self) -> float:
+        """Ждёт свободный слот. Возвращает время ожидания (сек)."""
+        semaphore = self._get_semaphore()
+
+        with self._lock:
+            self._check_capacity()
+            self._waiting += 1
+
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise PipelineOverloaded(
+                f"Сервер перегружен: ожидание в очереди превысило {self.queue_timeout:.0f} сек",
+                status_code=503,
+                retry_after=self.retry_after
+            )
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        waited = time.perf_counter() - t0
+        with self._lock:
+            self._active += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return waited
+
+    def _release_slot(self, run_time: float, failed: bool):
+        with self._lock:
+            self._active -= 1
+            self._run_time_total += run_time
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+        self._get_semaphore().release()
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """
+        Выполняет func(*args, **kwargs) в пуле потоков.
+
+        Слот освобождается, когда func действительно завершилась в потоке
+        пула, — даже если ожидавший её запрос отменён (клиент отключился).
+
+        Raises:
+            PipelineOverloaded: очередь заполнена или истёк таймаут ожидания
+        """
+        waited = await self._acquire_slot()
+        if waited > 1.0:
+            logger.info(f"[EXECUTOR] Запрос ждал в очереди {waited:.2f} сек")
+
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+
+        def release(future: asyncio.Future):
+            failed = future.cancelled() or future.exception() is not None
+            self._release_slot(time.perf_counter() - t0, failed)
+
+        future = loop.run_in_executor(self._pool, lambda: func(*args, **kwargs))
+        future.add_done_callback(release)
+        # shield: отмена ожидающего не отменяет future, release сработает по завершении потока
+        return await asyncio.shield(future)
+
+    def open_stream(self, func: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        """
+        Возвращает async-итератор по синхронному генератору func(*args, **kwargs).
+
+        Заполненная очередь проверяется сразу (PipelineOverloaded 429), чтобы
+        вернуть корректный HTTP статус до начала потока. Слот занимается только
+        при первом шаге итератора: если ответ так и не начал читаться (клиент
+        отключился раньше), занимать и освобождать нечего. Истечение таймаута
+        ожидания слота выбрасывается уже из итератора.
+
+        Каждый шаг генератора выполняется в пуле потоков. Слот освобождается,
+        когда генератор исчерпан или клиент отключился — но не раньше, чем
+        завершится шаг, ещё выполняющийся в потоке пула, и генератор будет закрыт.
+        """
+        with self._lock:
+            self._check_capacity()
+        return self._iterate(func, args, kwargs)
+
+    async def _iterate(self, func: Callable[..., Iterator], args: tuple, kwargs: dict) -> AsyncIterator:
+        waited = await self._acquire_slot()
+        if waited > 1.0:
+            logger.info(f"[EXECUTOR] Потоковый запрос ждал в очереди {waited:.2f} сек")
+
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        gen = None
+        step = None
+        failed = False
+        try:
+            gen = func(*args, **kwargs)
+            while True:
+                step = loop.run_in_executor(self._pool, next, gen, _STREAM_END)
+                # shield: при отмене (клиент отключился) шаг продолжает выполняться,
+                # и step остаётся незавершённым, пока поток пула не вернётся
+                item = await asyncio.shield(step)
+                if item is _STREAM_END:
+                    break
+                yield item
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._finish_stream(loop, gen, step, t0, failed)
+
+    def _finish_stream(self, loop: asyncio.AbstractEventLoop, gen: Optional[Iterator],
+                       step: Optional[asyncio.Future], t0: float, failed: bool):
+        """Закрывает генератор после завершения текущего шага и только затем освобождает слот."""
+        def release(_=None):
+            self._release_slot(time.perf_counter() - t0, failed)
+
+        def close(_=None):
+            if gen is None:
+                release()
+                return
+            loop.run_in_executor(self._pool, _close_generator, gen).add_done_callback(release)
+
+        if step is None or step.done():
+            close()
+        else:
+            step.add_done_callback(close)
+
+    def get_stats(self) -> dict:
+        """Снимок счётчиков очереди и пула."""
+        with self._lock:
+            started = self._completed + self._failed + self._active
+            finished = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_wait_time": round(self._wait_time_total / started, 4) if started else 0.0,
+                "max_wait_time": round(self._wait_time_max, 4),
+                "avg_run_time": round(self._run_time_total / finished, 4) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+_executor = None
+
+
+def get_pipeline_executor() -> PipelineExecutor:
+    """Глобальный экземпляр executor (singleton pattern)."""
+    global _executor
+    if _executor is None:
+        _executor = PipelineExecutor()
+        logger.info(
+            f"[EXECUTOR] Пул pipeline: workers={_executor.max_workers}, "
+            f"queue={_executor.max_queue}, timeout={_executor.queue_timeout}s"
+        )
+    return _executor
@@ -0,0 +1,238 @@
+"""
+Семантический кэш ответов RAG.
+
+Пользователи задают одни и те же вопросы в разных формулировках. Перед
+полным pipeline (фильтр → поиск → reranking → LLM) вопрос ищется в кэше:
+  1. точное совпадение по нормализованной строке вопроса;
+  2. ближайший сосед среди эмбеддингов закэшированных вопросов
+     (косинусная близость не ниже ANSWER_CACHE_SIMILARITY_THRESHOLD).
+
+Записи вытесняются по LRU и TTL. При изменении коллекции ChromaDB
+(см. vector_store.get_collection_version) кэш сбрасывается целиком.
+
+Эмбеддинги закэшированных вопросов лежат в заранее выделенной матрице
+(max_entries × размерность): store() пишет строку на место, а строки
+вытесненных записей освобождаются для повторного использования, так что
+матрица не перестраивается из списков после каждой записи.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from .cache import LRUCache
+from .query_context import QueryContext
+from .vector_store import get_collection_version
+from ..config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+class CacheProbe:
+    """Результат поиска в кэше: ключ, эмбеддинг и версия коллекции для записи."""
+    __slots__ = ("key", "embedding", "version")
+
+    def __init__(self, key: str, embedding: Optional[List[float]], version: str):
+        self.key = key
+        self.embedding = embedding
+        self.version = version
+
+
+class AnswerCache:
+    """Кэш ответов: точный ключ + поиск ближайшего вопроса по эмбеддингам."""
+
+    def __init__(
+            self,
+            max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+            ttl: Optional[float] = ANSWER_CACHE_TTL,
+            similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD
+    ):
+        """
+        Args:
+            max_entries: Максимум закэшированных ответов
+            ttl: Срок жизни ответа (сек), None — без ограничения
+            similarity_threshold: Минимальная косинусная близость для семантического попадания
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        # Удалённые из LRU записи; строки матрицы освобождаются под self._lock (_drain_removed)
+        self._removed = deque()
+        self._entries = LRUCache(
+            max_entries=max_entries, ttl=ttl, name="answers",
+            on_remove=lambda key, entry: self._removed.append((key, entry))
+        )
+        self._lock = threading.Lock()
+        self._version = None
+
+        # Матрица эмбеддингов: строка на запись, свободные строки переиспользуются
+        self._matrix: Optional[np.ndarray] = None
+        self._occupied: Optional[np.ndarray] = None  # bool по строкам
+        self._rows: Dict[str, int] = {}  # ключ -> строка
+        self._row_keys: List[Optional[str]] = []
+        self._row_entries: List[Optional[tuple]] = []  # запись LRU, которой принадлежит строка
+        self._free_rows: List[int] = []
+        self._used_rows = 0  # строки [0, _used_rows) хотя бы раз заняты
+
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+
+    def _check_version(self) -> str:
+        """Сбрасывает кэш, если коллекция изменилась с момента последней проверки."""
+        version = get_collection_version()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info("[ANSWER_CACHE] Коллекция изменилась — кэш ответов сброшен")
+                self._entries.clear()
+            self._version = version
+        return version
+
+    def _drain_removed(self):
+        """Освобождает строки записей, удалённых из LRU (под self._lock)."""
+        while self._removed:
+            key, entry = self._removed.popleft()
+            row = self._rows.get(key)
+            # Ключ мог быть записан заново — строка тогда принадлежит новой записи
+            if row is None or self._row_entries[row] is not entry:
+                continue
+            del self._rows[key]
+            self._row_keys[row] = None
+            self._row_entries[row] = None
+            self._occupied[row] = False
+            self._free_rows.append(row)
+
+    def _put_row(self, key: str, entry: tuple):
+        """Записывает эмбеддинг записи в свободную строку матрицы (под self._lock)."""
+        embedding = np.asarray(entry[0], dtype=np.float32)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            self._occupied = np.zeros(self.max_entries, dtype=bool)
+            self._row_keys = [None] * self.max_entries
+            self._row_entries = [None] * self.max_entries
+
+        row = self._rows.get(key)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            elif self._used_rows < self.max_entries:
+                row = self._used_rows
+                self._used_rows += 1
+            else:
+                # Все строки заняты, но вытеснение ещё не дошло — не индексируем
+                return
+        self._matrix[row] = embedding
+        self._occupied[row] = True
+        self._rows[key] = row
+        self._row_keys[row] = key
+        self._row_entries[row] = entry
+
+    def _nearest(self, embedding: List[float]) -> Tuple[Optional[str], float]:
+        """Ближайший закэшированный вопрос и его косинусная близость."""
+        with self._lock:
+            self._drain_removed()
+            if not self._rows:
+                return None, 0.0
+            n = self._used_rows
+            # Эмбеддинги нормализованы — скалярное произведение равно косинусной близости
+            similarities = self._matrix[:n] @ np.asarray(embedding, dtype=np.float32)
+            similarities[~self._occupied[:n]] = -np.inf
+            best = int(np.argmax(similarities))
+            return self._row_keys[best], float(similarities[best])
+
+    def lookup(self, question: str, context: Optional[QueryContext] = None) -> Tuple[Optional[dict], CacheProbe]:
+        """
+        Ищет ответ на вопрос.
+
+        Args:
+            question: Вопрос пользователя
+            context: Контекст запроса; посчитанный здесь эмбеддинг остаётся в нём
+                для фильтра и поиска
+
+        Returns:
+            (result, probe): result — копия закэшированного ответа или None;
+            probe передаётся в store() после вычисления ответа.
+        """
+        version = self._check_version()
+        context = context or QueryContext(question)
+        key = context.normalized
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self._exact_hits += 1
+            return dict(entry[1], cache_hit="exact"), CacheProbe(key, entry[0], version)
+
+        embedding = context.embedding
+        nearest_key, similarity = self._nearest(embedding)
+        if nearest_key is not None and similarity >= self.similarity_threshold:
+            entry = self._entries.get(nearest_key)
+            if entry is not None:
+                with self._lock:
+                    self._semantic_hits += 1
+                logger.info(
+                    f"[ANSWER_CACHE] Семантическое попадание ({similarity:.3f}): "
+                    f"'{question[:60]}' ≈ '{nearest_key[:60]}'"
+                )
+                return dict(entry[1], cache_hit="semantic"), CacheProbe(key, embedding, version)
+
+        with self._lock:
+            self._misses += 1
+        return None, CacheProbe(key, embedding, version)
+
+    def store(self, probe: CacheProbe, result: dict):
+        """Сохраняет ответ, если коллекция не менялась с момента lookup()."""
+        if probe.embedding is None or probe.version != get_collection_version():
+            return
+        entry = (probe.embedding, dict(result))
+        with self._lock:
+            if self._entries.set(probe.key, entry):
+                self._drain_removed()
+                self._put_row(probe.key, entry)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        stats = self._entries.get_stats()
+        # Сырые счётчики LRU учитывают и служебные обращения семантического поиска
+        stats.pop("hits")
+        stats.pop("misses")
+        with self._lock:
+            lookups = self._exact_hits + self._semantic_hits + self._misses
+            hits = self._exact_hits + self._semantic_hits
+            stats.update({
+                "enabled": ANSWER_CACHE_ENABLED,
+                "similarity_threshold": self.similarity_threshold,
+                "lookups": lookups,
+                "exact_hits": self._exact_hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            })
+        return stats
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Глобальный кэш ответов; None, если кэш отключён в конфиге."""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+    return _answer_cache
+
+
+def get_answer_cache_stats() -> dict:
+    cache = get_answer_cache()
+    return cache.get_stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,162 @@
+"""
+Микро-батчинг запросов к моделям между параллельными запросами API.
+
+Каждый поток API вызывает submit() со своими элементами и блокируется.
+Фоновый поток собирает элементы от разных запросов в течение короткого
+окна (max_wait_ms) или до max_batch_size элементов, выполняет один вызов
+модели и раздаёт результаты обратно вызывающим.
+"""
+import logging
+import queue
+import threading
+import time
+
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchRequest:
+    __slots__ = ("items", "future", "enqueued_at")
+
+    def __init__(self, items: list):
+        self.items = items
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Собирает элементы от параллельных вызывающих в общие батчи."""
+
+    def __init__(
+            self,
+            process_batch: Callable[[list], list],
+            max_batch_size: int = 32,
+            max_wait_ms: float = 5.0,
+            name: str = "batcher"
+    ):
+        """
+        Args:
+            process_batch: Функция модели: список элементов -> список результатов той же длины
+            max_batch_size: Максимум элементов в одном вызове модели
+            max_wait_ms: Сколько ждать попутных запросов после первого (мс)
+            name: Имя для логов и статистики
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue[_BatchRequest]" = queue.Queue()
+        self._carry: Optional[_BatchRequest] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # Статистика
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._errors = 0
+        self._batch_sizes = Counter()
+        self._wait_time_total = 0.0
+        self._process_time_total = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, items: list) -> list:
+        """Ставит элементы в очередь и ждёт результаты (в том же порядке)."""
+        if not items:
+            return []
+        self._ensure_started()
+        request = _BatchRequest(list(items))
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self) -> List[_BatchRequest]:
+        """Собирает запросы в один батч с учётом окна ожидания и лимита."""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+
+        batch = [first]
+        total = len(first.items)
+        deadline = time.perf_counter() + self.max_wait
+
+        while total < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if total + len(request.items) > self.max_batch_size:
+                # Не помещается — станет первым в следующем батче
+                self._carry = request
+                break
+            batch.append(request)
+            total += len(request.items)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for request in batch for item in request.items]
+
+            started = time.perf_counter()
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: получено {len(results)} результатов для {len(items)} элементов"
+                    )
+            except Exception as e:
+                logger.error(f"[BATCH] {self.name}: ошибка обработки батча: {e}", exc_info=True)
+                with self._stats_lock:
+                    self._errors += 1
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            offset = 0
+            for request in batch:
+                n = len(request.items)
+                request.future.set_result(results[offset:offset + n])
+                offset += n
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(items)
+                self._requests += len(batch)
+                self._batch_sizes[len(items)] += 1
+                self._wait_time_total += sum(started - r.enqueued_at for r in batch)
+                self._process_time_total += finished - started
+
+    def get_stats(self) -> dict:
+        """Счётчики батчинга и гистограмма размеров батчей."""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "batches": self._batches,
+                "requests": self._requests,
+                "items": self._items,
+                "errors": self._errors,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "avg_wait_ms": round(self._wait_time_total / self._requests * 1000, 3) if self._requests else 0.0,
+                "avg_batch_time_ms": round(self._process_time_total / self._batches * 1000, 3) if self._batches else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            }
@@ -0,0 +1,430 @@
+"""
+BM25 на инвертированном индексе.
+
+Для каждого термина хранится список вхождений (postings): номера документов
+и частоты термина, отсортированные по документу. IDF и нормировка по длине
+документа считаются при построении, а вклад каждого вхождения
+idf · tf·(k1+1) / (tf + k1·(1 − b + b·len/avgdl)) хранится готовым.
+
+Запрос оценивает только документы, в которых встречаются его термины, и
+выбирает top-k частичной сортировкой (partition), вместо того чтобы
+считать и сортировать все N документов, как BM25Okapi.get_scores. Равные
+счета упорядочиваются по номеру документа, поэтому оба режима ниже
+возвращают одни и те же документы.
+
+Режим "maxscore" дополнительно отсекает документы, которые уже не могут
+попасть в top-k: термины обрабатываются по убыванию максимального вклада,
+и как только сумма верхних границ оставшихся терминов меньше k-го лучшего
+счёта, новые кандидаты не набираются — оставшиеся термины только
+досчитывают уже найденные документы. Результат совпадает с полным
+перебором.
+
+Параметры и формула IDF (с epsilon для отрицательных значений) такие же,
+как у rank_bm25.BM25Okapi, поэтому счета совпадают с точностью float32.
+
+Индекс целиком состоит из массивов NumPy (словарь и ID документов —
+отсортированные строковые массивы с бинарным поиском), поэтому сохраняется
+в .npy и открывается через mmap: загрузка не зависит от размера корпуса.
+Добавление и удаление документов (merge) пересобирает массивы из уже
+посчитанных частот, без повторной токенизации корпуса.
+"""
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .index_store import CURRENT_FILE, index_lock, new_generation, publish_generation, read_current
+from ..config import BM25_K1, BM25_B, BM25_EPSILON
+
+_ARRAYS = (
+    "terms", "doc_ids", "doc_order", "doc_lengths", "indptr",
+    "postings", "term_freqs", "impacts", "idf", "max_impacts",
+)
+
+
+class BM25Builder:
+    """Накопитель новых документов: номера терминов вместо списков строк."""
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self._term_ids = array("q")
+        self._doc_lengths = array("q")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: str, tokens: Iterable[str]):
+        vocabulary = self.vocabulary
+        before = len(self._term_ids)
+        self._term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+        self._doc_lengths.append(len(self._term_ids) - before)
+        self.doc_ids.append(doc_id)
+
+    def add_texts(self, doc_ids: Sequence[str], texts: Sequence[str]):
+        for doc_id, text in zip(doc_ids, texts):
+            self.add(doc_id, tokenize(text))
+
+    def term_ids(self) -> np.ndarray:
+        return np.frombuffer(self._term_ids, dtype=np.int64) if self._term_ids else np.zeros(0, dtype=np.int64)
+
+    def doc_lengths(self) -> np.ndarray:
+        return np.frombuffer(self._doc_lengths, dtype=np.int64) if self._doc_lengths else np.zeros(0, dtype=np.int64)
+
+    def build(self, **params) -> "BM25Index":
+        return BM25Index.from_term_ids(self.term_ids(), self.doc_lengths(), self.vocabulary, self.doc_ids, **params)
+
+
+class BM25Index:
+    """Разреженный BM25-индекс: термин → (документы, вклады)."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, epsilon: float = BM25_EPSILON):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.version: Optional[str] = None                  # версия коллекции, с которой построен индекс
+
+        self.terms = np.zeros(0, dtype="U1")                # отсортированный словарь
+        self.doc_ids = np.zeros(0, dtype="U1")
+        self.doc_order = np.zeros(0, dtype=np.int64)        # argsort(doc_ids) для поиска по ID
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.indptr = np.zeros(1, dtype=np.int64)           # границы postings термина
+        self.postings = np.zeros(0, dtype=np.int32)         # номера документов
+        self.term_freqs = np.zeros(0, dtype=np.int32)       # tf в документе
+        self.impacts = np.zeros(0, dtype=np.float32)        # готовый вклад вхождения
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.max_impacts = np.zeros(0, dtype=np.float32)    # верхняя граница вклада термина
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    # --- Построение ---
+
+    @classmethod
+    def from_corpus(cls, corpus: Sequence[List[str]], doc_ids: Sequence[str], **params) -> "BM25Index":
+        """
+        Строит индекс из токенизированных документов.
+
+        Args:
+            corpus: Списки токенов документов
+            doc_ids: ID документов в том же порядке
+        """
+        builder = BM25Builder()
+        for doc_id, tokens in zip(doc_ids, corpus):
+            builder.add(doc_id, tokens)
+        return builder.build(**params)
+
+    @classmethod
+    def from_term_ids(
+            cls,
+            term_ids: np.ndarray,
+            doc_lengths: np.ndarray,
+            vocabulary: Dict[str, int],
+            doc_ids: Sequence[str],
+            **params
+    ) -> "BM25Index":
+        """
+        Строит индекс из уже пронумерованных токенов.
+
+        Args:
+            term_ids: Номера терминов всех документов подряд
+            doc_lengths: Число токенов в каждом документе
+            vocabulary: Термин → номер
+            doc_ids: ID документов
+        """
+        terms, term_map = _sorted_vocabulary(vocabulary)
+        doc_terms, docs, tfs = _count_postings(term_map[np.asarray(term_ids, dtype=np.int64)], doc_lengths)
+        return cls._from_postings(terms, doc_terms, docs, tfs, doc_lengths, list(doc_ids), **params)
+
+    @classmethod
+    def _from_postings(
+            cls,
+            terms: np.ndarray,
+            doc_terms: np.ndarray,
+            docs: np.ndarray,
+            tfs: np.ndarray,
+            doc_lengths: np.ndarray,
+            doc_ids: Sequence[str],
+            **params
+    ) -> "BM25Index":
+        """Собирает индекс из троек (термин, документ, tf); термины без вхождений отбрасываются."""
+        index = cls(**params)
+        n_docs = len(doc_ids)
+
+        used = np.zeros(len(terms), dtype=bool)
+        used[doc_terms] = True
+        new_term = np.cumsum(used) - 1
+        doc_terms = new_term[doc_terms]
+        index.terms = terms[used] if len(terms) else terms
+
+        order = np.lexsort((docs, doc_terms))
+        index.postings = docs[order].astype(np.int32)
+        index.term_freqs = tfs[order].astype(np.int32)
+        index.indptr = np.zeros(len(index.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc_terms, minlength=len(index.terms)), out=index.indptr[1:])
+
+        index.doc_ids = np.array(doc_ids, dtype=str) if n_docs else np.zeros(0, dtype="U1")
+        index.doc_order = np.argsort(index.doc_ids, kind="stable")
+        index.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+
+        index._compute_impacts()
+        return index
+
+    def merge(self, added: BM25Builder, removed: Iterable[str] = ()) -> "BM25Index":
+        """
+        Новый индекс с добавленными и удалёнными документами.
+
+        Документ из added с уже существующим ID заменяет старый (как upsert).
+        Частоты терминов оставшихся документов берутся из индекса; IDF,
+        средняя длина и вклады пересчитываются для нового корпуса.
+        """
+        drop = set(removed) | set(added.doc_ids)
+        old_indices = self.find_docs(list(drop))
+        keep = np.ones(len(self), dtype=bool)
+        keep[old_indices[old_indices >= 0]] = False
+
+        # Старые вхождения оставшихся документов с новой нумерацией документов
+        old_terms = np.repeat(np.arange(len(self.terms)), np.diff(self.indptr))
+        old_mask = keep[self.postings]
+        new_doc = np.cumsum(keep) - 1
+        n_kept = int(keep.sum())
+
+        # Общий отсортированный словарь
+        added_terms, added_map = _sorted_vocabulary(added.vocabulary)
+        terms = np.union1d(self.terms, added_terms) if len(added_terms) else np.asarray(self.terms)
+        old_to_merged = np.searchsorted(terms, self.terms) if len(self.terms) else np.zeros(0, dtype=np.int64)
+        added_to_merged = np.searchsorted(terms, added_terms)
+
+        add_terms, add_docs, add_tfs = _count_postings(
+            added_map[added.term_ids()] if len(added_map) else added.term_ids(), added.doc_lengths()
+        )
+
+        return type(self)._from_postings(
+            terms,
+            np.concatenate([old_to_merged[old_terms[old_mask]], added_to_merged[add_terms]]).astype(np.int64),
+            np.concatenate([new_doc[self.postings[old_mask]], add_docs + n_kept]).astype(np.int64),
+            np.concatenate([self.term_freqs[old_mask], add_tfs]),
+            np.concatenate([np.asarray(self.doc_lengths)[keep], added.doc_lengths()]),
+            [str(doc_id) for doc_id in np.asarray(self.doc_ids)[keep]] + list(added.doc_ids),
+            k1=self.k1, b=self.b, epsilon=self.epsilon
+        )
+
+    def _compute_impacts(self):
+        """IDF, нормировка длины и вклады вхождений (как в BM25Okapi)."""
+        n_docs = len(self.doc_ids)
+        doc_freqs = np.diff(self.indptr).astype(np.float64)
+
+        idf = np.log(n_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5) if len(doc_freqs) else doc_freqs
+        if len(idf):
+            # rank_bm25: отрицательный IDF заменяется на epsilon · средний IDF
+            idf = np.where(idf < 0, self.epsilon * idf.mean(), idf)
+        self.idf = idf.astype(np.float32)
+
+        avgdl = self.doc_lengths.mean() if n_docs else 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(avgdl, 1e-9))
+
+        tf = self.term_freqs.astype(np.float64)
+        term_of_posting = np.repeat(np.arange(len(self.idf)), np.diff(self.indptr))
+        self.impacts = (
+            self.idf[term_of_posting] * tf * (self.k1 + 1) / (tf + length_norm[self.postings])
+        ).astype(np.float32)
+
+        self.max_impacts = np.zeros(len(self.idf), dtype=np.float32)
+        non_empty = np.diff(self.indptr) > 0
+        if self.impacts.size:
+            self.max_impacts[non_empty] = np.maximum.reduceat(self.impacts, self.indptr[:-1][non_empty])
+
+    # --- Сохранение ---
+
+    def save(self, index_dir: Path, version: Optional[str] = None):
+        """
+        Сохраняет индекс в новое поколение и атомарно переключает current.json.
+
+        Читатели, открывшие предыдущее поколение через mmap, продолжают с ним
+        работать (см. index_store.publish_generation).
+        """
+        with index_lock(index_dir):
+            target = new_generation(index_dir)
+            for name in _ARRAYS:
+                np.save(target / f"{name}.npy", np.asarray(getattr(self, name)))
+            self.version = version
+            publish_generation(index_dir, {
+                "generation": target.name,
+                "version": version,
+                "documents": len(self),
+                "k1": self.k1,
+                "b": self.b,
+                "epsilon": self.epsilon,
+            })
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["BM25Index"]:
+        """Открывает сохранённый индекс через mmap; None, если его нет или он повреждён."""
+        index_dir = Path(index_dir)
+        try:
+            meta = read_current(index_dir)
+            index = cls(k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"])
+            for name in _ARRAYS:
+                setattr(index, name, np.load(index_dir / meta["generation"] / f"{name}.npy", mmap_mode="r"))
+        except (OSError, ValueError, KeyError) as e:
+            if (index_dir / CURRENT_FILE).exists():
+                print(f"[BM25] ⚠️ Не удалось загрузить индекс из {index_dir}: {e}")
+            return None
+        index.version = meta["version"]
+        return index
+
+    # --- Поиск ---
+
+    def find_docs(self, doc_ids: Sequence[str]) -> np.ndarray:
+        """Номера документов по ID (-1 для отсутствующих)."""
+        if not len(doc_ids) or not len(self.doc_ids):
+            return np.full(len(doc_ids), -1, dtype=np.int64)
+        sorted_ids = self.doc_ids[self.doc_order]
+        query = np.asarray(doc_ids, dtype=str)
+        pos = np.minimum(np.searchsorted(sorted_ids, query), len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == query, self.doc_order[pos], -1)
+
+    def _query_terms(self, query_tokens: Iterable[str]) -> List[Tuple[int, int]]:
+        """(номер термина, кратность в запросе) для известных терминов."""
+        counts: Dict[int, int] = {}
+        for token in query_tokens:
+            pos = int(np.searchsorted(self.terms, token))
+            if pos < len(self.terms) and self.terms[pos] == token:
+                counts[pos] = counts.get(pos, 0) + 1
+        return list(counts.items())
+
+    def _term_postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[term], self.indptr[term + 1]
+        return self.postings[start:end], self.impacts[start:end]
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Счета всех документов (как BM25Okapi.get_scores) — для проверки и отладки."""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        for term, multiplicity in self._query_terms(query_tokens):
+            docs, impacts = self._term_postings(term)
+            scores[docs] += multiplicity * impacts.astype(np.float64)
+        return scores
+
+    def score_docs(self, query_tokens: List[str], doc_indices: Sequence[int]) -> np.ndarray:
+        """Счета заданных документов (postings отсортированы — поиск бинарный)."""
+        doc_indices = np.asarray(doc_indices, dtype=np.int32)
+        scores = np.zeros(len(doc_indices), dtype=np.float64)
+        for term, multiplicity in self._query_terms(query_tokens):
+            docs, impacts = self._term_postings(term)
+            pos = np.searchsorted(docs, doc_indices)
+            found = pos < len(docs)
+            found[found] = docs[pos[found]] == doc_indices[found]
+            scores[found] += multiplicity * impacts[pos[found]]
+        return scores
+
+    def search(self, query_tokens: List[str], top_k: int = 10, mode: str = "exhaustive") -> List[Tuple[int, float]]:
+        """
+        Top-k документов по BM25.
+
+        Args:
+            query_tokens: Токены запроса
+            top_k: Число результатов
+            mode: "exhaustive" — все документы с терминами запроса,
+                "maxscore" — с досрочным отсечением (тот же результат)
+
+        Returns:
+            [(номер документа, счёт), ...] по убыванию счёта, только счёт > 0
+        """
+        terms = self._query_terms(query_tokens)
+        if not terms or top_k <= 0:
+            return []
+        if mode == "maxscore":
+            docs, scores = self._search_maxscore(terms, top_k)
+        else:
+            docs, scores = self._accumulate(terms)
+        return _top_k(docs, scores, top_k)
+
+    def _accumulate(self, terms: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Сумма вкладов по документам, где встречается хотя бы один термин."""
+        parts = [self._term_postings(term) for term, _ in terms]
+        docs = np.concatenate([d for d, _ in parts])
+        weights = np.concatenate([w.astype(np.float64) * m for (_, w), (_, m) in zip(parts, terms)])
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=weights, minlength=len(unique_docs))
+
+    def _search_maxscore(self, terms: List[Tuple[int, int]], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Term-at-a-time MaxScore: новые кандидаты только пока они могут войти в top-k."""
+        bounds = [float(self.max_impacts[term]) * m for term, m in terms]
+        order = sorted(range(len(terms)), key=lambda i: -bounds[i])
+        remaining = sum(bounds)
+
+        cand_docs = np.zeros(0, dtype=np.int32)
+        cand_scores = np.zeros(0, dtype=np.float64)
+        for i in order:
+            term, multiplicity = terms[i]
+            remaining -= bounds[i]
+            docs, impacts = self._term_postings(term)
+            weights = impacts.astype(np.float64) * multiplicity
+
+            threshold = _kth_largest(cand_scores, top_k)
+            if threshold is not None and remaining + bounds[i] < threshold:
+                # Документ вне кандидатов наберёт не больше remaining + bounds[i] — досчитываем только кандидатов
+                pos = np.searchsorted(docs, cand_docs)
+                found = pos < len(docs)
+                found[found] = docs[pos[found]] == cand_docs[found]
+                cand_scores[found] += weights[pos[found]]
+                # Кандидаты, которым не догнать k-й счёт, больше не нужны
+                keep = cand_scores + remaining >= _kth_largest(cand_scores, top_k)
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+            else:
+                merged = np.concatenate([cand_docs, docs])
+                unique_docs, inverse = np.unique(merged, return_inverse=True)
+                cand_scores = np.bincount(
+                    inverse,
+                    weights=np.concatenate([cand_scores, weights]),
+                    minlength=len(unique_docs)
+                )
+                cand_docs = unique_docs.astype(np.int32)
+        return cand_docs, cand_scores
+
+
+def _kth_largest(scores: np.ndarray, k: int) -> Optional[float]:
+    if len(scores) < k:
+        return None
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+def _top_k(docs: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    """Top-k по (−счёт, номер документа): при равных счетах на границе — меньшие номера."""
+    positive = scores > 0
+    docs, scores = docs[positive], scores[positive]
+    if len(scores) > top_k:
+        # argpartition выбирает среди равных k-му счёту произвольно — берём их всех до сортировки
+        kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        keep = scores >= kth
+        docs, scores = docs[keep], scores[keep]
+    order = np.lexsort((docs, -scores))[:top_k]
+    return [(int(docs[i]), float(scores[i])) for i in order]
+
+
+def _sorted_vocabulary(vocabulary: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Словарь → (отсортированные термины, номер термина → позиция в них)."""
+    if not vocabulary:
+        return np.zeros(0, dtype="U1"), np.zeros(0, dtype=np.int64)
+    terms = np.array(list(vocabulary), dtype=str)
+    order = np.argsort(terms, kind="stable")
+    term_map = np.empty(len(terms), dtype=np.int64)
+    term_map[np.fromiter(vocabulary.values(), dtype=np.int64, count=len(vocabulary))[order]] = np.arange(len(terms))
+    return terms[order], term_map
+
+
+def _count_postings(term_ids: np.ndarray, doc_lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Токены документов подряд → тройки (термин, документ, tf)."""
+    doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+    n_docs = max(len(doc_lengths), 1)
+    doc_of_token = np.repeat(np.arange(len(doc_lengths), dtype=np.int64), doc_lengths)
+    keys, counts = np.unique(np.asarray(term_ids, dtype=np.int64) * n_docs + doc_of_token, return_counts=True)
+    return keys // n_docs, keys % n_docs, counts
+
+
+def tokenize(text: str) -> List[str]:
+    """Токенизация для BM25 (razdel, нижний регистр)."""
+    import razdel
+
+    return [token.text.lower() for token in razdel.tokenize(text)]
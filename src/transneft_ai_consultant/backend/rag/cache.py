@@ -0,0 +1,169 @@
+"""
+Потокобезопасный LRU-кэш с TTL и счётчиками.
+
+Общая основа для кэшей RAG (ответы, результаты поиска): ограничение по
+числу записей и по объёму, вытеснение давно не использованных, срок жизни
+записи и статистика попаданий/промахов для /api/stats.
+"""
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+def estimate_size(obj: Any) -> int:
+    """Приблизительный объём объекта в байтах (вложенные dict/list/tuple/str/числа)."""
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(item) for item in obj)
+    if hasattr(obj, "nbytes"):  # numpy
+        return int(obj.nbytes)
+    return sys.getsizeof(obj)
+
+
+class LRUCache:
+    """LRU-кэш с ограничением по числу записей и объёму, опциональным TTL."""
+
+    def __init__(
+            self,
+            max_entries: int = 1000,
+            ttl: Optional[float] = None,
+            name: str = "cache",
+            max_bytes: Optional[int] = None,
+            sizeof: Callable[[Any], int] = estimate_size,
+            on_remove: Optional[Callable[[Hashable, Any], None]] = None
+    ):
+        """
+        Args:
+            max_entries: Максимум записей, при превышении вытесняются самые старые
+            ttl: Срок жизни записи (сек), None — без ограничения
+            name: Имя для логов и статистики
+            max_bytes: Максимальный суммарный объём значений (байт), None — без ограничения
+            sizeof: Оценка объёма значения в байтах
+            on_remove: Вызывается с (key, value) для каждой удалённой записи
+                (вытеснение, истечение TTL, замена, pop, clear) — после
+                освобождения блокировки кэша
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.name = name
+        self.max_bytes = max_bytes if max_bytes and max_bytes > 0 else None
+        self.sizeof = sizeof
+        self.on_remove = on_remove
+
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Статистика
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def _notify(self, removed: list):
+        if self.on_remove is not None:
+            for key, value in removed:
+                self.on_remove(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение по ключу (запись становится самой свежей) или default."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self._misses += 1
+                return default
+            value, expires_at, size = item
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self._hits += 1
+                return value
+            del self._data[key]
+            self._bytes -= size
+            self._expirations += 1
+            self._misses += 1
+        self._notify([(key, value)])
+        return default
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """
+        Сохраняет значение.
+
+        Returns:
+            False, если значение само по себе больше max_bytes и не сохранено
+        """
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return False
+        removed = []
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+                removed.append((key, old[0]))
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                evicted_key, (evicted_value, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+                removed.append((evicted_key, evicted_value))
+        self._notify(removed)
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            if item is _MISSING:
+                return default
+            self._bytes -= item[2]
+        self._notify([(key, item[0])])
+        return item[0]
+
+    def clear(self):
+        """Сбрасывает все записи (инвалидация)."""
+        with self._lock:
+            if self._data:
+                self._invalidations += 1
+            removed = [(key, value) for key, (value, _, _) in self._data.items()] if self.on_remove else []
+            self._data.clear()
+            self._bytes = 0
+        self._notify(removed)
+
+    def items(self) -> list:
+        """Снимок действующих записей [(key, value)] без изменения порядка LRU."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (value, expires_at, _) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def get_stats(self) -> dict:
+        """Счётчики попаданий, промахов и вытеснений."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
@@ -1,17 +1,25 @@
-import torch
+import threading
 import time
 
-from sentence_transformers import SentenceTransformer
 from typing import List
+from .batching import MicroBatcher
+from ..config import EMBEDDER_MODEL_NAME, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS
 
 _model = None
+_model_lock = threading.Lock()
+_query_batcher = None
+_query_batcher_lock = threading.Lock()
 
 def get_embedder():
     global _model
-    if _model is None:
-        print("Инициализация эмбеддера BGE-M3...")
-        _model = SentenceTransformer('intfloat/multilingual-e5-large-instruct', device='cuda' if torch.cuda.is_available() else 'cpu')
-        print("Эмбеддер инициализирован.")
+    with _model_lock:
+        if _model is None:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            print(f"Инициализация эмбеддера {EMBEDDER_MODEL_NAME}...")
+            _model = SentenceTransformer(EMBEDDER_MODEL_NAME, device='cuda' if torch.cuda.is_available() else 'cpu')
+            print("Эмбеддер инициализирован.")
     return _model
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
@@ -23,6 +31,37 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     print(f"Эмбеддинги созданы за {t1 - t0:.2f} сек.")
     return embeddings.tolist()
 
+def _encode_query_batch(texts: List[str]) -> List[List[float]]:
+    model = get_embedder()
+    embeddings = model.encode(texts, normalize_embeddings=True, batch_size=len(texts))
+    return embeddings.tolist()
+
+
+def get_query_batcher() -> MicroBatcher:
+    """Общий батчер эмбеддингов запросов для всех потоков API."""
+    global _query_batcher
+    if _query_batcher is None:
+        # Иначе параллельные первые запросы создадут по батчеру со своим потоком
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = MicroBatcher(
+                    _encode_query_batch,
+                    max_batch_size=EMBED_BATCH_MAX_SIZE,
+                    max_wait_ms=EMBED_BATCH_MAX_WAIT_MS,
+                    name="query_embeddings"
+                )
+    return _query_batcher
+
+
+def embed_query(text: str) -> List[float]:
+    """
+    Эмбеддинг одного поискового запроса.
+
+    Параллельные запросы объединяются в один вызов encode (см. MicroBatcher).
+    """
+    return get_query_batcher().submit([text])[0]
+
+
 # --- Для проверки ---
 if __name__ == "__main__":
     test_texts = ["Это тестовое предложение.", "Это еще одно предложение для проверки."]
@@ -0,0 +1,220 @@
+"""
+Дисковый кэш эмбеддингов чанков для индексации.
+
+Ключ — sha256 от имени модели и нормализованного текста чанка, поэтому
+неизменившиеся чанки при повторной индексации не кодируются заново.
+Векторы хранятся подряд в файле float32 (читается через np.memmap),
+соответствие ключ → номер строки — в index.json рядом с ним. Каждый батч
+put_many дописывает свои ключи строкой в index.log.jsonl, а не переписывает
+index.json целиком: в конце индексации compact() сливает журнал в снимок.
+
+    <EMBEDDING_CACHE_DIR>/<модель>/vectors.f32
+    <EMBEDDING_CACHE_DIR>/<модель>/index.json
+    <EMBEDDING_CACHE_DIR>/<модель>/index.log.jsonl
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from pathlib import Path
+from typing import List, Optional
+from .embedder import embed_texts
+from ..config import EMBEDDER_MODEL_NAME, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_ENABLED
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFC и схлопывание пробелов: форматирование не меняет ключ кэша."""
+    return _SPACES_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Кэш эмбеддингов одной модели: memmap-матрица float32 + индекс ключей."""
+
+    def __init__(self, cache_dir: Path, model_name: str):
+        """
+        Args:
+            cache_dir: Корневая папка кэша
+            model_name: Имя модели эмбеддингов (часть ключа и имя подпапки)
+        """
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / re.sub(r"[^\w.-]+", "_", model_name)
+        self.vectors_path = self.dir / "vectors.f32"
+        self.index_path = self.dir / "index.json"
+        self.log_path = self.dir / "index.log.jsonl"
+
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._rows = {}  # key -> номер строки
+        self._matrix = None
+        self._load_index()
+
+    def _load_index(self):
+        dim, rows = None, {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[EMB_CACHE] ⚠️ Индекс кэша повреждён, кэш будет создан заново: {e}")
+                return
+            if index.get("model") != self.model_name:
+                return
+            dim, rows = index["dim"], index["rows"]
+
+        # Журнал батчей после последнего снимка; оборванная последняя строка отбрасывается
+        if self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if entry.get("model") != self.model_name:
+                        continue
+                    dim = entry["dim"]
+                    rows.update(entry["rows"])
+
+        if dim is None:
+            return
+        # Строки, которых нет в файле векторов (прерванная запись), отбрасываем
+        available = self.vectors_path.stat().st_size // (dim * 4) if self.vectors_path.exists() else 0
+        self._dim = dim
+        self._rows = {key: row for key, row in rows.items() if row < available}
+
+    def _append_log(self, new_rows: dict):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"model": self.model_name, "dim": self._dim, "rows": new_rows}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Сливает журнал батчей в index.json (один раз в конце индексации)."""
+        with self._lock:
+            if not self.log_path.exists() or self._dim is None:
+                return
+            tmp_path = self.index_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self._dim, "rows": self._rows}, f)
+            os.replace(tmp_path, self.index_path)
+            self.log_path.unlink()
+
+    def _get_matrix(self):
+        count = len(self._rows)
+        if self._matrix is None or self._matrix.shape[0] < count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self._dim))
+        return self._matrix
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Векторы из кэша в порядке texts (None для отсутствующих)."""
+        keys = [text_key(self.model_name, t) for t in texts]
+        with self._lock:
+            rows = [self._rows.get(k) for k in keys]
+            if all(r is None for r in rows):
+                return [None] * len(texts)
+            matrix = self._get_matrix()
+            return [np.array(matrix[r]) if r is not None else None for r in rows]
+
+    def put_many(self, texts: List[str], vectors):
+        """Дописывает новые векторы в конец файла и их ключи в журнал индекса."""
+        if not len(texts):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            if vectors.shape[1] != self._dim:
+                raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с кэшем ({self._dim})")
+
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(self.model_name, text)
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+
+            self.dir.mkdir(parents=True, exist_ok=True)
+            start = len(self._rows)
+            mode = "r+b" if self.vectors_path.exists() else "wb"
+            with open(self.vectors_path, mode) as f:
+                # Пишем сразу после последней строки из индекса (хвост прерванной записи затирается)
+                f.seek(start * self._dim * 4)
+                f.write(np.stack(list(new.values())).tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+            new_rows = {key: start + i for i, key in enumerate(new)}
+            self._rows.update(new_rows)
+            self._matrix = None
+            self._append_log(new_rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Кэш эмбеддингов текущей модели; None, если кэш отключён."""
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDER_MODEL_NAME)
+    return _cache
+
+
+def compact_embedding_cache():
+    """Сливает журнал кэша эмбеддингов в index.json (вызывается в конце индексации)."""
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.compact()
+
+
+def embed_texts_cached(texts: List[str]) -> List[List[float]]:
+    """
+    Эмбеддинги текстов с дисковым кэшем: кодируются только отсутствующие в кэше.
+
+    Args:
+        texts: Тексты чанков
+
+    Returns:
+        Векторы в порядке texts
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return embed_texts(texts)
+
+    cached = cache.get_many(texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    encoded = 0
+    if missing:
+        # Одинаковые (после нормализации) чанки кодируются один раз
+        unique = {}
+        for i in missing:
+            unique.setdefault(text_key(cache.model_name, texts[i]), []).append(i)
+        unique_texts = [texts[positions[0]] for positions in unique.values()]
+        vectors = embed_texts(unique_texts)
+        encoded = len(unique_texts)
+        cache.put_many(unique_texts, vectors)
+        for positions, vector in zip(unique.values(), vectors):
+            for i in positions:
+                cached[i] = vector
+
+    print(f"[EMB_CACHE] Из кэша: {len(texts) - len(missing)}/{len(texts)}, закодировано: {encoded}")
+    return [v.tolist() if isinstance(v, np.ndarray) else list(v) for v in cached]
@@ -0,0 +1,63 @@
+"""
+Слияние результатов векторного поиска и BM25.
+
+Каждый метод принимает счета кандидатов двух ретриверов ({id: счёт}) и вес
+dense-поиска alpha и возвращает объединённые счета {id: счёт}. Документ,
+которого нет в выдаче ретривера, получает от него нулевой вклад, поэтому
+в BM25-счета передаются только документы с положительным счётом.
+
+    weighted — взвешенная сумма счетов, нормированных к [0, 1]
+    rrf      — Reciprocal Rank Fusion: Σ w / (k + ранг), учитывает только порядок
+"""
+from typing import Callable, Dict
+from ..config import RRF_K
+
+FusionMethod = Callable[[Dict[str, float], Dict[str, float], float], Dict[str, float]]
+
+
+def _min_max(scores: Dict[str, float], lower: float = None) -> Dict[str, float]:
+    if not scores:
+        return {}
+    low = min(scores.values()) if lower is None else lower
+    span = max(scores.values()) - low
+    if span <= 0:
+        return {doc_id: 1.0 for doc_id in scores}
+    return {doc_id: (score - low) / span for doc_id, score in scores.items()}
+
+
+def weighted_fusion(dense: Dict[str, float], sparse: Dict[str, float], alpha: float) -> Dict[str, float]:
+    """
+    alpha · dense + (1 − alpha) · bm25 после min-max нормировки.
+
+    Косинусная близость нормируется по кандидатам dense-выдачи; BM25 — от
+    нуля (счета неотрицательны, документы без терминов запроса дают 0).
+    """
+    dense_norm = _min_max(dense)
+    sparse_norm = _min_max(sparse, lower=0.0)
+    return {
+        doc_id: alpha * dense_norm.get(doc_id, 0.0) + (1 - alpha) * sparse_norm.get(doc_id, 0.0)
+        for doc_id in dense_norm.keys() | sparse_norm.keys()
+    }
+
+
+def rrf_fusion(dense: Dict[str, float], sparse: Dict[str, float], alpha: float, k: int = RRF_K) -> Dict[str, float]:
+    """Reciprocal Rank Fusion с весами alpha и 1 − alpha у dense и BM25."""
+    fused: Dict[str, float] = {}
+    for scores, weight in ((dense, alpha), (sparse, 1 - alpha)):
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+FUSION_METHODS: Dict[str, FusionMethod] = {
+    "weighted": weighted_fusion,
+    "rrf": rrf_fusion,
+}
+
+
+def get_fusion_method(name: str) -> FusionMethod:
+    try:
+        return FUSION_METHODS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный метод слияния: {name} (доступны: {', '.join(FUSION_METHODS)})")
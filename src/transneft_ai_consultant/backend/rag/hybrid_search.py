@@ -1,46 +1,134 @@
-from rank_bm25 import BM25Okapi
-from typing import List
-import numpy as np
-import razdel
-from .vector_store import query_documents, collection
+"""
+Гибридный поиск: векторный (ChromaDB) + BM25.
+
+BM25-индекс хранится рядом с ChromaDB (BM25_INDEX_DIR) и помечен версией
+содержимого коллекции (vector_store.get_content_version). Процесс API
+открывает его через mmap, не читая и не токенизируя корпус; индексация
+(ingestion) применяет к нему добавленные и удалённые чанки.
+
+Если версия ушла вперёд, запросы продолжают обслуживаться загруженным
+индексом, а новый подхватывается или перестраивается из ChromaDB в фоне
+(index_store.IndexRefresher) — не в пути запроса и не на каждый батч
+идущей индексации.
+"""
+from typing import List, Optional
+import threading
+from .bm25 import BM25Builder, BM25Index
+from .fusion import get_fusion_method
+from .index_store import IndexRefresher, index_lock
+from .query_context import QueryContext
+from .vector_store import query_documents, get_collection, get_documents, get_content_version
+from ..config import BM25_SEARCH_MODE, BM25_INDEX_DIR, HYBRID_FUSION
+
+_bm25_index: Optional[BM25Index] = None
+_build_lock = threading.Lock()
 
-_bm25_index = None
-_bm25_corpus = None
-_doc_ids = None
 
 def build_bm25_index():
-    """Строит BM25 индекс из всех документов в ChromaDB."""
-    global _bm25_index, _bm25_corpus, _doc_ids
+    """Загружает сохранённый BM25 индекс или строит его из ChromaDB (синхронно, для прогрева)."""
+    global _bm25_index
 
-    if _bm25_index is not None:
-        print("[BM25] Индекс уже построен")
-        return
+    with _build_lock:
+        version = get_content_version()
+        if _bm25_index is not None and _bm25_index.version == version:
+            return
+        if _load_bm25_index(version):
+            return
 
+        with index_lock(BM25_INDEX_DIR):
+            # Пока ждали блокировку, индекс мог перестроить другой процесс
+            if _load_bm25_index(version):
+                return
+            _bm25_index = rebuild_bm25_index(version)
+
+
+def _load_bm25_index(version: Optional[str] = None) -> bool:
+    """Загружает сохранённый индекс; с version — только если он ей соответствует."""
+    global _bm25_index
+
+    index = BM25Index.load(BM25_INDEX_DIR)
+    if index is None or (version is not None and index.version != version):
+        return False
+    _bm25_index = index
+    print(f"[BM25] ✅ Индекс загружен для {len(index)} документов")
+    return True
+
+
+_refresher = IndexRefresher(
+    "BM25",
+    refresh=build_bm25_index,
+    is_stale=lambda: _bm25_index is not None and _bm25_index.version != get_content_version(),
+    version=get_content_version,
+)
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """
+    BM25 индекс для запроса; не ждёт перестройки.
+
+    Устаревший индекс отдаётся как есть, а обновление запускается в фоне.
+    Синхронно индекс строится, только если на диске его ещё нет.
+    """
+    if _bm25_index is None:
+        with _build_lock:
+            loaded = _bm25_index is not None or _load_bm25_index()
+        if not loaded:
+            build_bm25_index()
+
+    index = _bm25_index
+    if index is not None and index.version != get_content_version():
+        _refresher.request()
+    return index
+
+
+def rebuild_bm25_index(version: Optional[str] = None) -> Optional[BM25Index]:
+    """
+    Строит BM25 индекс из всех документов в ChromaDB и сохраняет его.
+
+    Версия берётся до чтения коллекции: записи во время построения
+    дадут новую версию, и индекс будет перестроен при следующей проверке.
+    """
+    version = version or get_content_version()
     print("[BM25] Строим BM25 индекс...")
 
     # Получаем все документы из коллекции
-    all_results = collection.get()
+    all_results = get_collection().get(include=["documents"])
 
     if not all_results or not all_results.get('documents'):
         print("[BM25] ⚠️ Коллекция пуста")
-        return
+        return None
 
-    documents = all_results['documents']
-    _doc_ids = all_results['ids']
+    builder = BM25Builder()
+    builder.add_texts(all_results['ids'], all_results['documents'])
+    index = builder.build()
+    index.save(BM25_INDEX_DIR, version)
 
-    # Токенизация для BM25
-    _bm25_corpus = [
-        [token.text.lower() for token in razdel.tokenize(doc)]
-        for doc in documents
-    ]
+    print(f"[BM25] ✅ Индекс построен для {len(index)} документов")
+    return index
 
-    # Создаём BM25 индекс
-    _bm25_index = BM25Okapi(_bm25_corpus)
 
-    print(f"[BM25] ✅ Индекс построен для {len(documents)} документов")
+def update_bm25_index(added: BM25Builder, removed: List[str], base_version: str):
+    """
+    Применяет изменения индексации к сохранённому BM25 индексу.
+
+    Args:
+        added: Добавленные (или перезаписанные) чанки
+        removed: ID удалённых чанков
+        base_version: Версия содержимого коллекции до записи изменений; если
+            индекс сохранён для другой версии, одной дельты мало — полная перестройка
+    """
+    with index_lock(BM25_INDEX_DIR):
+        index = BM25Index.load(BM25_INDEX_DIR)
+        if index is None or index.version != base_version:
+            rebuild_bm25_index()
+            return
 
+        index.merge(added, removed).save(BM25_INDEX_DIR, get_content_version())
+    print(f"[BM25] Индекс обновлён: +{len(added)}, -{len(removed)}")
 
-def hybrid_search(question: str, top_k: int = 10, alpha: float = 0.5) -> list:
+
+def hybrid_search(question: str, top_k: int = 10, alpha: float = 0.5, fusion: str = HYBRID_FUSION,
+                  context: Optional[QueryContext] = None) -> list:
     """
     Комбинирует векторный поиск (Dense) и BM25 (Sparse).
 
@@ -48,87 +136,60 @@ def hybrid_search(question: str, top_k: int = 10, alpha: float = 0.5) -> list:
         question: Поисковый запрос
         top_k: Количество результатов
         alpha: Вес dense search (0.7 = 70% векторный, 30% BM25)
+        fusion: Метод слияния (см. fusion.FUSION_METHODS)
+        context: Контекст запроса с уже посчитанными эмбеддингом и токенами
     """
+    context = context or QueryContext(question)
 
-    # 1. Строим BM25 индекс
-    if _bm25_index is None:
-        build_bm25_index()
-
-    if _bm25_index is None:
+    # 1. BM25 индекс (устаревший обновляется в фоне)
+    index = get_bm25_index()
+    if index is None:
         print("[HYBRID] BM25 недоступен, используем только векторный поиск")
-        return query_documents(question, top_k=top_k)
+        return query_documents(question, top_k=top_k, embedding=context.embedding)
 
     # 2. Dense retrieval (векторный поиск)
-    dense_results = query_documents(question, top_k=top_k * 3)
-
-    # 3. BM25 sparse retrieval
-    tokenized_query = [token.text.lower() for token in razdel.tokenize(question)]
-    bm25_scores = _bm25_index.get_scores(tokenized_query)
-
-    # 4. Создаём маппинг doc_id -> scores
-    dense_score_map = {}
-    for doc in dense_results:
-        doc_id = doc.get('id') or doc.get('metadata', {}).get('id')
-        if doc_id:
-            dense_score_map[doc_id] = doc.get('similarity', 0)
-
-    # Нормализуем BM25 scores к [0, 1]
-    max_bm25 = max(bm25_scores) if len(bm25_scores) > 0 else 1.0
-    min_bm25 = min(bm25_scores) if len(bm25_scores) > 0 else 0.0
-    bm25_range = max_bm25 - min_bm25 if max_bm25 > min_bm25 else 1.0
-
-    bm25_score_map = {}
-    for i, score in enumerate(bm25_scores):
-        if i < len(_doc_ids):
-            normalized_score = (score - min_bm25) / bm25_range
-            bm25_score_map[_doc_ids[i]] = normalized_score
-
-    # 5. Комбинируем скоры
-    combined_scores = {}
-    all_doc_ids = set(dense_score_map.keys()) | set(bm25_score_map.keys())
-
-    for doc_id in all_doc_ids:
-        dense_score = dense_score_map.get(doc_id, 0.0)
-        bm25_score = bm25_score_map.get(doc_id, 0.0)
-        combined_scores[doc_id] = alpha * dense_score + (1 - alpha) * bm25_score
-
-    # 6. Сортируем и берём top_k
+    dense_results = query_documents(question, top_k=top_k * 3, embedding=context.embedding)
+    doc_map = {doc['id']: doc for doc in dense_results}
+    dense_score_map = {doc['id']: doc['similarity'] for doc in dense_results}
+
+    # 3. BM25 sparse retrieval: top-k по индексу и счета документов из dense-выдачи.
+    # Остальные документы не могут обойти BM25 top-k, поэтому весь корпус не оценивается
+    tokenized_query = context.tokens
+    bm25_hits = index.search(tokenized_query, top_k=top_k, mode=BM25_SEARCH_MODE)
+    dense_indices = index.find_docs(list(dense_score_map))
+    dense_indices = dense_indices[dense_indices >= 0]
+    dense_bm25 = index.score_docs(tokenized_query, dense_indices)
+
+    bm25_score_map = {str(index.doc_ids[i]): score for i, score in bm25_hits}
+    bm25_score_map.update(
+        (str(index.doc_ids[i]), float(score)) for i, score in zip(dense_indices, dense_bm25) if score > 0
+    )
+
+    # 4. Слияние и top_k
+    combined_scores = get_fusion_method(fusion)(dense_score_map, bm25_score_map, alpha)
     sorted_docs = sorted(
         combined_scores.items(),
         key=lambda x: x[1],
         reverse=True
     )[:top_k]
 
-    # 7. Формируем результаты
-    result_docs = []
-    doc_map = {}
-    for doc in dense_results:
-        doc_id = doc.get('id') or doc.get('metadata', {}).get('id')
-        if doc_id:
-            doc_map[doc_id] = doc
+    # 5. Документы только из BM25 — одним запросом к коллекции
+    missing = [doc_id for doc_id, _ in sorted_docs if doc_id not in doc_map]
+    doc_map.update(get_documents(missing))
 
+    # 6. Формируем результаты
+    max_bm25 = max(bm25_score_map.values(), default=0.0) or 1.0
+    result_docs = []
     for doc_id, score in sorted_docs:
-        if doc_id in doc_map:
-            doc = doc_map[doc_id].copy()
-            doc['hybrid_score'] = score
-            doc['dense_score'] = dense_score_map.get(doc_id, 0.0)
-            doc['bm25_score'] = bm25_score_map.get(doc_id, 0.0)
-            result_docs.append(doc)
-        else:
-            # Документ только из BM25
-            all_data = collection.get(ids=[doc_id])
-            if all_data and all_data['documents']:
-                doc = {
-                    'id': doc_id,
-                    'context': all_data['documents'][0],
-                    'metadata': all_data['metadatas'][0] if all_data['metadatas'] else {},
-                    'hybrid_score': score,
-                    'dense_score': 0.0,
-                    'bm25_score': bm25_score_map.get(doc_id, 0.0)
-                }
-                result_docs.append(doc)
-
-    print(f"[HYBRID] Возвращено {len(result_docs)} документов (alpha={alpha})")
+        if doc_id not in doc_map:
+            continue  # удалён из коллекции после построения BM25 индекса
+        doc = {**doc_map[doc_id], 'metadata': dict(doc_map[doc_id]['metadata'] or {})}
+        doc['hybrid_score'] = score
+        doc['dense_score'] = dense_score_map.get(doc_id, 0.0)
+        doc['bm25_score'] = bm25_score_map.get(doc_id, 0.0) / max_bm25
+        result_docs.append(doc)
+
+    print(f"[HYBRID] Возвращено {len(result_docs)} документов ({fusion}, alpha={alpha})")
     return result_docs
 
 
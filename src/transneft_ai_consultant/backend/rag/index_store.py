@@ -0,0 +1,182 @@
+"""
+Поколения сохранённых индексов (BM25, матрица numpy-бэкенда) и их фоновое обновление.
+
+Каждое сохранение пишет новый подкаталог-поколение и атомарно переключает
+current.json. Имена поколений упорядочены по времени создания. В каталог
+индекса пишут несколько процессов (воркеры API, индексация), поэтому
+сохранение выполняется под файловой блокировкой index_lock, а удаляются
+только поколения старше того, которое current.json только что заменил:
+процесс, успевший прочитать прежний current.json, ещё может его открывать.
+
+IndexRefresher перестраивает устаревший индекс в фоновом потоке, пока
+запросы обслуживает уже загруженный. Перестройка начинается, только когда
+версия коллекции не менялась INDEX_REFRESH_DEBOUNCE сек: во время
+индексации каждый записанный батч меняет версию.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from ..config import INDEX_REFRESH_DEBOUNCE
+
+CURRENT_FILE = "current.json"
+_LOCK_FILE = ".lock"
+_GENERATION_RE = re.compile(r"^\d{20}_[0-9a-f]{8}$")
+
+
+class _IndexLock:
+    """Блокировка каталога: поток процесса (RLock) + файл для других процессов."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+
+_locks: Dict[str, _IndexLock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_file(f):
+    if os.name == "nt":
+        import msvcrt
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue  # LK_LOCK сдаётся после 10 попыток по секунде
+    import fcntl
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(f):
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    import fcntl
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def index_lock(index_dir: Path):
+    """Исключительная блокировка каталога индекса между процессами (повторно входимая в потоке)."""
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    key = str(index_dir.resolve())
+    with _locks_guard:
+        lock = _locks.setdefault(key, _IndexLock(index_dir / _LOCK_FILE))
+
+    with lock.rlock:
+        if lock.depth == 0:
+            lock.file = open(lock.path, "a+b")
+            _lock_file(lock.file)
+        lock.depth += 1
+        try:
+            yield
+        finally:
+            lock.depth -= 1
+            if lock.depth == 0:
+                _unlock_file(lock.file)
+                lock.file.close()
+                lock.file = None
+
+
+def new_generation(index_dir: Path) -> Path:
+    """Пустой каталог нового поколения; имя сортируется по времени создания."""
+    target = Path(index_dir) / f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+    target.mkdir(parents=True)
+    return target
+
+
+def read_current(index_dir: Path) -> dict:
+    """Содержимое current.json (OSError/ValueError, если его нет или он повреждён)."""
+    return json.loads((Path(index_dir) / CURRENT_FILE).read_text(encoding="utf-8"))
+
+
+def publish_generation(index_dir: Path, meta: dict):
+    """
+    Атомарно переключает current.json на meta["generation"] и удаляет старые поколения.
+
+    Вызывается под index_lock. Остаются новое поколение и то, которое оно
+    заменило; недописанные каталоги прерванных сохранений старше его удаляются.
+    """
+    index_dir = Path(index_dir)
+    try:
+        previous = read_current(index_dir).get("generation")
+    except (OSError, ValueError):
+        previous = None
+
+    tmp_path = index_dir / f"{CURRENT_FILE}.{meta['generation']}.tmp"
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, index_dir / CURRENT_FILE)
+
+    if previous is None:
+        return
+    keep = {previous, meta["generation"]}
+    for path in index_dir.iterdir():
+        if not path.is_dir() or path.name in keep:
+            continue
+        # Каталоги со старыми (uuid) именами не упорядочены по времени — удаляются всегда
+        if not _GENERATION_RE.match(path.name) or not _GENERATION_RE.match(previous) or path.name < previous:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class IndexRefresher:
+    """Фоновая перестройка индекса с ожиданием затишья в записях коллекции."""
+
+    def __init__(
+            self,
+            name: str,
+            refresh: Callable[[], None],
+            is_stale: Callable[[], bool],
+            version: Callable[[], str],
+            debounce: float = INDEX_REFRESH_DEBOUNCE
+    ):
+        """
+        Args:
+            name: Префикс логов
+            refresh: Загружает или перестраивает индекс для текущей версии
+            is_stale: True, если загруженный индекс отстаёт от коллекции
+            version: Текущая версия коллекции
+            debounce: Сколько секунд версия должна не меняться перед перестройкой
+        """
+        self.name = name
+        self.refresh = refresh
+        self.is_stale = is_stale
+        self.version = version
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def request(self):
+        """Запускает фоновое обновление, если оно ещё не идёт (не блокирует)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name.lower()}-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while self.is_stale():
+            version = self.version()
+            time.sleep(self.debounce)
+            if self.version() != version:
+                continue  # коллекция ещё пишется
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[{self.name}] ⚠️ Фоновое обновление индекса не удалось: {e}")
+                return
+            if self.version() == version and self.is_stale():
+                return  # обновление ничего не изменило — повторим при следующем запросе
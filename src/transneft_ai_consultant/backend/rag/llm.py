@@ -1,59 +1,199 @@
-from llama_cpp import Llama
-import torch
+from typing import Iterator
+from .llm_pool import LLMPool
+from ..config import (
+    LLM_POOL_SIZE,
+    LLM_POOL_THREADS_PER_WORKER,
+    LLM_POOL_REQUEST_TIMEOUT,
+    LLM_N_CTX,
+)
+import threading
+
+MODEL_PATH = "src/transneft_ai_consultant/backend/models/saiga_mistral_7b.Q4_K_M.gguf"
 
 LLM = None
+_llm_lock = threading.Lock()  # Llama не потокобезопасен
+_llm_init_lock = threading.Lock()
+_llm_pool = None
+_llm_pool_lock = threading.Lock()
 
 def get_llm():
     global LLM
-    if LLM is None:
-        print("Инициализация LLM (Saiga)...")
-
-        use_cuda = torch.cuda.is_available()
-        n_gpu_layers = 12 if use_cuda else 0
-        print(f"Используем CUDA: {use_cuda}, n_gpu_layers={n_gpu_layers}")
-
-        LLM = Llama(
-            model_path="src/transneft_ai_consultant/backend/models/saiga_mistral_7b.Q4_K_M.gguf",
-            n_ctx=4096,
-            n_threads=8,           # CPU threads
-            n_gpu_layers=n_gpu_layers,
-            verbose=False
-        )
-        print("LLM инициализирована.")
+    with _llm_init_lock:
+        if LLM is None:
+            import torch
+            from llama_cpp import Llama
+
+            print("Инициализация LLM (Saiga)...")
+
+            use_cuda = torch.cuda.is_available()
+            n_gpu_layers = 12 if use_cuda else 0
+            print(f"Используем CUDA: {use_cuda}, n_gpu_layers={n_gpu_layers}")
+
+            LLM = Llama(
+                model_path=MODEL_PATH,
+                n_ctx=LLM_N_CTX,
+                n_threads=8,           # CPU threads
+                n_gpu_layers=n_gpu_layers,
+                verbose=False
+            )
+            print("LLM инициализирована.")
     return LLM
 
 
-def ask_llm(prompt: str, max_tokens: int = 512, temperature: float = 0.3) -> str:
+def get_llm_pool():
+    """
+    Пул процессов-реплик LLM (см. llm_pool.py) или None, если LLM_POOL_SIZE = 0.
+
+    Реплики работают на CPU: каждая держит свой контекст, а веса GGUF
+    разделяются через mmap/page cache.
+    """
+    global _llm_pool
+    if LLM_POOL_SIZE <= 0:
+        return None
+    with _llm_pool_lock:
+        if _llm_pool is None:
+            _llm_pool = LLMPool(
+                size=LLM_POOL_SIZE,
+                model_kwargs={
+                    "model_path": MODEL_PATH,
+                    "n_ctx": LLM_N_CTX,
+                    "n_threads": LLM_POOL_THREADS_PER_WORKER,
+                    "n_gpu_layers": 0,
+                },
+                request_timeout=LLM_POOL_REQUEST_TIMEOUT
+            )
+            _llm_pool.start()
+    return _llm_pool
+
+
+def warmup_llm():
+    """
+    Загружает модель (или запускает пул) и генерирует один токен.
+
+    В отличие от ask_llm, ошибки не подавляются — их видит фаза прогрева.
+    """
+    pool = get_llm_pool()
+    if pool is not None:
+        pool.generate(format_prompt("Привет"), max_tokens=1, stop=STOP_SEQUENCES)
+        return
     llm = get_llm()
+    with _llm_lock:
+        llm(format_prompt("Привет"), max_tokens=1, stop=STOP_SEQUENCES, echo=False)
+
+
+def get_llm_pool_stats() -> dict:
+    """Статистика пула без его запуска."""
+    if _llm_pool is None:
+        return {"size": LLM_POOL_SIZE, "started": False}
+    return _llm_pool.get_stats()
+
+
+SYSTEM_PROMPT = "Ты - официальный AI-консультант ПАО «Транснефть». Отвечай кратко и по делу."
+STOP_SEQUENCES = ["</s>", "<s>"]
+EMPTY_ANSWER_MESSAGE = "Извините, не могу найти информацию. Переформулируйте запрос."
+ERROR_ANSWER_MESSAGE = "Ошибка при генерации ответа."
+
 
-    # Правильное форматирование для Saiga
-    formatted_prompt = f"""<s>system
-Ты - официальный AI-консультант ПАО «Транснефть». Отвечай кратко и по делу.</s>
+def format_prompt(prompt: str) -> str:
+    """Правильное форматирование для Saiga."""
+    return f"""<s>system
+{SYSTEM_PROMPT}</s>
 <s>user
 {prompt}</s>
 <s>bot
 """
 
-    try:
-        response = llm(
-            formatted_prompt,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            stop=["</s>", "<s>"],
-            echo=False
-        )
 
-        answer = response['choices'][0]['text'].strip()
+def ask_llm(prompt: str, max_tokens: int = 512, temperature: float = 0.3, priority: int = 0) -> str:
+    """
+    Генерация ответа. При включённом пуле запрос уходит в планировщик
+    (priority: меньше — важнее), иначе — в локальную модель под блокировкой.
+    """
+    pool = get_llm_pool()
+
+    try:
+        if pool is not None:
+            answer = pool.generate(
+                format_prompt(prompt),
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stop=STOP_SEQUENCES,
+                priority=priority
+            ).strip()
+        else:
+            llm = get_llm()
+            with _llm_lock:
+                response = llm(
+                    format_prompt(prompt),
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stop=STOP_SEQUENCES,
+                    echo=False
+                )
+            answer = response['choices'][0]['text'].strip()
 
         # Проверка на пустой ответ
         if not answer or len(answer) < 10:
-            return "Извините, не могу найти информацию. Переформулируйте запрос."
+            return EMPTY_ANSWER_MESSAGE
 
         return answer
     except Exception as e:
-        return "Ошибка при генерации ответа."
-
-
+        print(f"⚠️ Ошибка генерации: {e}")
+        return ERROR_ANSWER_MESSAGE
 
 
+def _local_stream(prompt: str, max_tokens: int, temperature: float) -> Iterator[str]:
+    llm = get_llm()
+    with _llm_lock:
+        for chunk in llm(
+            format_prompt(prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stop=STOP_SEQUENCES,
+            echo=False,
+            stream=True
+        ):
+            yield chunk['choices'][0]['text']
+
+
+def ask_llm_stream(prompt: str, max_tokens: int = 512, temperature: float = 0.3,
+                   priority: int = 0) -> Iterator[str]:
+    """
+    Потоковая генерация: отдаёт фрагменты текста по мере декодирования токенов.
+
+    Проверка на пустой ответ делается вызывающей стороной по собранному тексту.
+    Ошибка до первого фрагмента превращается в ERROR_ANSWER_MESSAGE, после него
+    пробрасывается: иначе оборванный ответ не отличить от законченного.
+    """
+    pool = get_llm_pool()
+    if pool is not None:
+        chunks = pool.generate_stream(
+            format_prompt(prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stop=STOP_SEQUENCES,
+            priority=priority
+        )
+    else:
+        chunks = _local_stream(prompt, max_tokens, temperature)
 
+    started = False
+    try:
+        for text in chunks:
+            if not text:
+                continue
+            if not started:
+                # Как и ask_llm, отбрасываем ведущие пробелы ответа
+                text = text.lstrip()
+                if not text:
+                    continue
+                started = True
+            yield text
+    except Exception as e:
+        print(f"⚠️ Ошибка потоковой генерации: {e}")
+        if started:
+            raise
+        yield ERROR_ANSWER_MESSAGE
+    finally:
+        # Закрытие до конца ответа (клиент отключился) отменяет генерацию в пуле
+        chunks.close()
@@ -0,0 +1,485 @@
+"""
+Пул процессов-реплик LLM с планировщиком.
+
+Объект Llama не потокобезопасен, поэтому один процесс обслуживает одну
+генерацию за раз. Пул запускает N процессов, каждый со своим контекстом
+llama_cpp над одним и тем же GGUF файлом: файл открывается через mmap,
+поэтому веса разделяются между процессами через page cache ОС.
+
+Планировщик раздаёт запросы свободным воркерам в порядке приоритета
+(меньше — важнее), затем FIFO. У каждого запроса есть таймаут на всё
+время (очередь + генерация): зависший воркер перезапускается.
+
+Результаты каждый воркер пишет в собственный канал (Pipe): если процесс
+убит посреди записи, испорчен только его канал, который при перезапуске
+заменяется новым. Перезапуск (terminate + join + запуск процесса)
+выполняется в отдельном потоке: ни планировщик, ни раздача токенов
+остальных воркеров его не ждут.
+
+Потоковый запрос можно отменить (клиент отключился): воркер проверяет
+флаг отмены между токенами и освобождается, не декодируя до max_tokens.
+"""
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from multiprocessing.connection import wait as wait_connections
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_TOKENS_END = object()
+
+
+def _worker_main(worker_id: int, model_kwargs: dict, task_queue, result_conn, cancel):
+    """
+    Точка входа процесса-воркера: загружает модель и обрабатывает задачи.
+
+    cancel — общее с пулом число: ID запроса, генерацию которого надо прервать.
+    """
+    from llama_cpp import Llama
+
+    try:
+        llm = Llama(use_mmap=True, verbose=False, **model_kwargs)
+    except Exception as e:
+        result_conn.send(("failed", worker_id, None, str(e)))
+        return
+    result_conn.send(("ready", worker_id, None, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        request_id, prompt, max_tokens, temperature, stop, stream = task
+        parts = []
+        n_tokens = 0
+        cancelled = cancel.value == request_id
+        t0 = time.perf_counter()
+        try:
+            for chunk in ([] if cancelled else llm(
+                prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stop=stop,
+                echo=False,
+                stream=True
+            )):
+                if cancel.value == request_id:
+                    cancelled = True
+                    break
+                text = chunk['choices'][0]['text']
+                n_tokens += 1
+                if not text:
+                    continue
+                parts.append(text)
+                if stream:
+                    result_conn.send(("token", worker_id, request_id, text))
+            result_conn.send(("cancelled" if cancelled else "done", worker_id, request_id, {
+                "text": "".join(parts),
+                "tokens": n_tokens,
+                "elapsed": time.perf_counter() - t0,
+            }))
+        except Exception as e:
+            result_conn.send(("error", worker_id, request_id, str(e)))
+
+
+class _PoolRequest:
+    def __init__(self, request_id: int, prompt: str, max_tokens: int, temperature: float,
+                 stop: list, stream: bool, priority: int, timeout: Optional[float]):
+        self.request_id = request_id
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = stop
+        self.stream = stream
+        self.priority = priority
+        self.created_at = time.monotonic()
+        self.deadline = self.created_at + timeout if timeout else None
+        self.started_at = None
+
+        self.tokens: "queue.Queue" = queue.Queue()
+        self.done = threading.Event()
+        self.text = None
+        self.error: Optional[BaseException] = None
+
+    def finish(self, text: Optional[str] = None, error: Optional[BaseException] = None):
+        if self.done.is_set():
+            return
+        self.text = text
+        self.error = error
+        self.done.set()
+        self.tokens.put(_TOKENS_END)
+
+    def result(self) -> str:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+    def iter_tokens(self) -> Iterator[str]:
+        while True:
+            item = self.tokens.get()
+            if item is _TOKENS_END:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+class _Worker:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process = None
+        self.task_queue = None
+        self.conn = None  # читающий конец канала результатов
+        self.cancel = None  # общее с процессом число: ID отменённого запроса
+        self.ready = False
+        self.restarting = False
+        self.current: Optional[_PoolRequest] = None
+        self.restarts = 0
+        self.failed = False  # модель не загрузилась — не перезапускаем
+
+        # Статистика
+        self.requests = 0
+        self.tokens = 0
+        self.generation_time = 0.0
+
+
+class LLMPool:
+    """N процессов llama_cpp и планировщик с приоритетами и таймаутами."""
+
+    def __init__(self, size: int, model_kwargs: dict, request_timeout: Optional[float] = None):
+        """
+        Args:
+            size: Количество процессов-реплик
+            model_kwargs: Аргументы Llama (model_path, n_ctx, n_threads, n_gpu_layers)
+            request_timeout: Таймаут запроса по умолчанию (сек), None — без ограничения
+        """
+        self.size = size
+        self.model_kwargs = model_kwargs
+        self.request_timeout = request_timeout
+
+        self._ctx = mp.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(size)]
+        self._pending = []  # heap: (priority, seq, request)
+        self._requests = {}  # request_id -> _PoolRequest
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._restarts: "queue.Queue" = queue.Queue()
+        self._started = False
+        self._closed = False
+
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._cancelled = 0
+
+    # ─── Жизненный цикл ───
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for worker in self._workers:
+            self._spawn(worker)
+        threading.Thread(target=self._schedule_loop, name="llm-pool-scheduler", daemon=True).start()
+        threading.Thread(target=self._result_loop, name="llm-pool-results", daemon=True).start()
+        threading.Thread(target=self._restart_loop, name="llm-pool-restarts", daemon=True).start()
+        logger.info(f"[LLM_POOL] Запущено {self.size} воркеров ({self.model_kwargs.get('model_path')})")
+
+    def _spawn(self, worker: _Worker):
+        task_queue = self._ctx.Queue()
+        conn, child_conn = self._ctx.Pipe(duplex=False)
+        cancel = self._ctx.Value("q", -1, lock=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self.model_kwargs, task_queue, child_conn, cancel),
+            name=f"llm-worker-{worker.worker_id}",
+            daemon=True
+        )
+        process.start()
+        # Пишущий конец остаётся только у воркера: после его смерти recv() получит EOF
+        child_conn.close()
+        with self._cond:
+            worker.task_queue = task_queue
+            worker.conn = conn
+            worker.cancel = cancel
+            worker.process = process
+            worker.ready = False
+            worker.restarting = False
+            worker.current = None
+
+    def _restart(self, worker: _Worker, reason: str, process, conn):
+        """
+        Останавливает старый процесс воркера и запускает новый.
+
+        Вызывается из потока перезапусков без self._cond; воркер к этому
+        моменту уже снят с планирования (_check_workers).
+        """
+        logger.warning(f"[LLM_POOL] Перезапуск воркера {worker.worker_id}: {reason}")
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+                process.join(timeout=5)
+        if conn is not None:
+            conn.close()
+        with self._cond:
+            if self._closed:
+                return
+            worker.restarts += 1
+        self._spawn(worker)
+
+    def _restart_loop(self):
+        while True:
+            item = self._restarts.get()
+            if item is None:
+                return
+            try:
+                self._restart(*item)
+            except Exception as e:
+                logger.error(f"[LLM_POOL] Не удалось перезапустить воркер {item[0].worker_id}: {e}")
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for _, _, request in self._pending:
+                request.finish(error=RuntimeError("LLM пул остановлен"))
+            self._pending.clear()
+            self._cond.notify_all()
+        self._restarts.put(None)
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.task_queue.put(None)
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+
+    # ─── Планировщик ───
+
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3,
+               stop: Optional[list] = None, stream: bool = False,
+               priority: int = 0, timeout: Optional[float] = None) -> _PoolRequest:
+        """Ставит запрос в очередь планировщика."""
+        self.start()
+        timeout = timeout if timeout is not None else self.request_timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLM пул остановлен")
+            request = _PoolRequest(next(self._seq), prompt, max_tokens, temperature,
+                                   stop or [], stream, priority, timeout)
+            self._requests[request.request_id] = request
+            heapq.heappush(self._pending, (priority, request.request_id, request))
+            self._cond.notify_all()
+        return request
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Блокирующая генерация: возвращает весь текст ответа."""
+        return self.submit(prompt, stream=False, **kwargs).result()
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Потоковая генерация: фрагменты текста по мере декодирования.
+
+        Если генератор закрыт до конца ответа (клиент отключился), запрос
+        отменяется и воркер освобождается.
+        """
+        request = self.submit(prompt, stream=True, **kwargs)
+        try:
+            yield from request.iter_tokens()
+        finally:
+            if not request.done.is_set():
+                self.cancel(request)
+
+    def cancel(self, request: _PoolRequest):
+        """Снимает запрос из очереди или прерывает его генерацию на воркере."""
+        with self._cond:
+            if request.done.is_set():
+                return
+            self._cancelled += 1
+            pending = [item for item in self._pending if item[2] is not request]
+            if len(pending) != len(self._pending):
+                self._pending = pending
+                heapq.heapify(self._pending)
+                self._requests.pop(request.request_id, None)
+            else:
+                # Воркер освободится, когда пришлёт "cancelled"
+                for worker in self._workers:
+                    if worker.current is request and worker.cancel is not None:
+                        worker.cancel.value = request.request_id
+            request.finish(error=RuntimeError("Запрос к LLM отменён"))
+            self._cond.notify_all()
+
+    def _schedule_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    self._expire_pending()
+                    idle = [w for w in self._workers if w.ready and w.current is None]
+                    if self._pending and idle:
+                        break
+                    self._cond.wait(timeout=0.5)
+                if self._closed:
+                    return
+
+                _, _, request = heapq.heappop(self._pending)
+                worker = idle[0]
+                worker.current = request
+                request.started_at = time.monotonic()
+                worker.task_queue.put((
+                    request.request_id, request.prompt, request.max_tokens,
+                    request.temperature, request.stop, request.stream
+                ))
+
+    def _expire_pending(self):
+        """Снимает из очереди запросы с истёкшим таймаутом (под self._cond)."""
+        if self._pending and all(w.failed for w in self._workers):
+            for _, _, request in self._pending:
+                self._failed += 1
+                self._requests.pop(request.request_id, None)
+                request.finish(error=RuntimeError("Ни один воркер LLM не смог загрузить модель"))
+            self._pending.clear()
+            return
+
+        now = time.monotonic()
+        expired = [item for item in self._pending if item[2].deadline and item[2].deadline <= now]
+        if not expired:
+            return
+        self._pending = [item for item in self._pending if item not in expired]
+        heapq.heapify(self._pending)
+        for _, _, request in expired:
+            self._timed_out += 1
+            self._requests.pop(request.request_id, None)
+            request.finish(error=TimeoutError("Таймаут ожидания свободного воркера LLM"))
+
+    # ─── Результаты воркеров ───
+
+    def _result_loop(self):
+        while not self._closed:
+            with self._cond:
+                conns = {w.conn: w for w in self._workers if w.conn is not None}
+            if conns:
+                ready = wait_connections(list(conns), timeout=0.5)
+            else:
+                time.sleep(0.5)
+                ready = []
+
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    kind, worker_id, request_id, payload = conn.recv()
+                except (EOFError, OSError):
+                    # Процесс завершился; перезапуском займётся _check_workers
+                    with self._cond:
+                        if worker.conn is conn:
+                            worker.conn = None
+                    conn.close()
+                    continue
+                self._handle_result(worker, kind, request_id, payload)
+
+            self._check_workers()
+
+    def _handle_result(self, worker: _Worker, kind: str, request_id: Optional[int], payload):
+        with self._cond:
+            if kind == "ready":
+                worker.ready = True
+                logger.info(f"[LLM_POOL] Воркер {worker.worker_id} готов (pid={worker.process.pid})")
+            elif kind == "failed":
+                logger.error(f"[LLM_POOL] Воркер {worker.worker_id} не загрузил модель: {payload}")
+                worker.ready = False
+                worker.failed = True
+            else:
+                request = self._requests.get(request_id)
+                if kind == "token":
+                    if request is not None:
+                        request.tokens.put(payload)
+                else:
+                    if worker.current is not None and worker.current.request_id == request_id:
+                        worker.current = None
+                    self._requests.pop(request_id, None)
+                    if kind in ("done", "cancelled"):
+                        worker.requests += 1
+                        worker.tokens += payload["tokens"]
+                        worker.generation_time += payload["elapsed"]
+                    if kind == "done":
+                        self._completed += 1
+                        if request is not None:
+                            request.finish(text=payload["text"])
+                    elif kind == "error":
+                        self._failed += 1
+                        if request is not None:
+                            request.finish(error=RuntimeError(f"Ошибка генерации LLM: {payload}"))
+            self._cond.notify_all()
+
+    def _check_workers(self):
+        """Таймауты выполняющихся запросов и упавшие процессы."""
+        now = time.monotonic()
+        restarts = []
+        with self._cond:
+            for worker in self._workers:
+                if worker.failed or worker.restarting:
+                    continue
+                request = worker.current
+                if request is not None and request.deadline and request.deadline <= now:
+                    if not request.done.is_set():  # отменённый уже учтён в cancelled
+                        self._timed_out += 1
+                    self._requests.pop(request.request_id, None)
+                    request.finish(error=TimeoutError("Таймаут генерации LLM"))
+                    restarts.append((worker, "таймаут запроса"))
+                elif worker.process is not None and not worker.process.is_alive() and not self._closed:
+                    if not worker.ready:
+                        # Упал ещё при загрузке модели — перезапуск не поможет
+                        logger.error(
+                            f"[LLM_POOL] Воркер {worker.worker_id} завершился при запуске "
+                            f"(exitcode={worker.process.exitcode})"
+                        )
+                        worker.failed = True
+                        continue
+                    if request is not None:
+                        self._failed += 1
+                        self._requests.pop(request.request_id, None)
+                        request.finish(error=RuntimeError("Процесс LLM завершился аварийно"))
+                    restarts.append((worker, f"процесс завершился (exitcode={worker.process.exitcode})"))
+
+            # Снимаем с планирования под блокировкой, останавливает поток перезапусков
+            for worker, reason in restarts:
+                self._restarts.put((worker, reason, worker.process, worker.conn))
+                worker.ready = False
+                worker.restarting = True
+                worker.current = None
+                worker.conn = None
+            self._cond.notify_all()
+
+    # ─── Статистика ───
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            workers = []
+            for w in self._workers:
+                workers.append({
+                    "worker_id": w.worker_id,
+                    "pid": w.process.pid if w.process is not None else None,
+                    "ready": w.ready,
+                    "busy": w.current is not None,
+                    "requests": w.requests,
+                    "tokens": w.tokens,
+                    "tokens_per_sec": round(w.tokens / w.generation_time, 2) if w.generation_time else 0.0,
+                    "restarts": w.restarts,
+                })
+            return {
+                "size": self.size,
+                "busy_workers": sum(1 for w in self._workers if w.current is not None),
+                "ready_workers": sum(1 for w in self._workers if w.ready),
+                "queue_length": len(self._pending),
+                "completed": self._completed,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "cancelled": self._cancelled,
+                "workers": workers,
+            }
@@ -1,17 +1,20 @@
 import logging
 import json
-import hashlib
+import time
 
 from .vector_store import query_documents
-from .llm import ask_llm
+from .llm import ask_llm, ask_llm_stream, EMPTY_ANSWER_MESSAGE, ERROR_ANSWER_MESSAGE
+from .answer_cache import get_answer_cache
 from .prompts import get_rag_prompt
 from ..config import TOP_K_RETRIEVER
-from sentence_transformers import CrossEncoder
+from .reranker import score_pairs
 from .hybrid_search import hybrid_search
+from .query_context import QueryContext
+from ..data_processing.ids import make_chunk_id
+from ..data_processing.near_duplicates import cluster_id
 from .question_filter import is_question_relevant_advanced, get_rejection_message_advanced
 from datetime import datetime
-
-_reranker = None
+from typing import Iterator
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,28 +28,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_reranker():
-    """Ленивая загрузка reranker модели."""
-    global _reranker
-    if _reranker is None:
-        print("Загрузка reranker модели...")
-        _reranker = CrossEncoder('DiTy/cross-encoder-russian-msmarco')
-    return _reranker
-
-
 def rerank_contexts(question: str, contexts: list, top_k: int = 3):
     """Ре-ранжирование контекстов с помощью CrossEncoder."""
     if len(contexts) <= top_k:
         return contexts
 
-    reranker = get_reranker()
-
-
-    # Формируем пары (вопрос, контекст)
-    pairs = [[question, ctx["context"]] for ctx in contexts]
-
-    # Получаем скоры
-    scores = reranker.predict(pairs)
+    # Скоры пар (вопрос, контекст); пары параллельных запросов батчатся вместе
+    scores = score_pairs(question, [ctx["context"] for ctx in contexts])
 
     # Сортируем по скору
     for i, ctx in enumerate(contexts):
@@ -71,8 +59,8 @@ def answer_question(question: str) -> tuple[str, list]:
 
     context_docs = []
     for i, ctx in enumerate(result.get("retrieved_contexts", [])):
-        # ✅ Создаём постоянный ID на основе хэша контента
-        doc_id = "doc_" + hashlib.md5(ctx.encode('utf-8')).hexdigest()[:8]
+        # ✅ Тот же ID, под которым чанк хранится в ChromaDB
+        doc_id = make_chunk_id(ctx)
 
         context_docs.append({
             "context": ctx,
@@ -84,30 +72,21 @@ def answer_question(question: str) -> tuple[str, list]:
 
     return result["answer"], context_docs
 
-def deduplicate_contexts(contexts: list, similarity_threshold: float = 0.6):
-    """Удаляет дублирующиеся контексты."""
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-
-    if len(contexts) <= 1:
-        return contexts
-
-    texts = [ctx["context"] for ctx in contexts]
-
-    vectorizer = TfidfVectorizer().fit(texts)
-    tfidf_matrix = vectorizer.transform(texts)
-    cosine_sim = cosine_similarity(tfidf_matrix)
-
-    # Оставляем только уникальные
-    keep = [True] * len(contexts)
-    for i in range(len(contexts)):
-        if not keep[i]:
-            continue
-        for j in range(i + 1, len(contexts)):
-            if cosine_sim[i, j] > similarity_threshold:
-                keep[j] = False
+def deduplicate_contexts(contexts: list):
+    """
+    Удаляет дублирующиеся контексты.
 
-    return [ctx for i, ctx in enumerate(contexts) if keep[i]]
+    Почти-дубликаты размечены при индексации (near_duplicates): из каждого
+    кластера dup_cluster остаётся первый, самый релевантный документ.
+    """
+    seen = set()
+    unique = []
+    for ctx in contexts:
+        cluster = cluster_id(ctx)
+        if cluster not in seen:
+            seen.add(cluster)
+            unique.append(ctx)
+    return unique
 
 
 def adaptive_retrieval(question: str) -> int:
@@ -145,21 +124,34 @@ def decompose_query(question: str) -> list:
 
     return subquestions if subquestions else [question]
 
-def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True) -> dict:
-    """Улучшенный RAG pipeline с reranking и фильтрацией."""
+def _rejection_result(message: str) -> dict:
+    return {
+        "answer": message,
+        "retrieved_contexts": [],
+        "scores": [],
+        "confidence": 0.0,
+        "is_relevant": False
+    }
+
+
+def _prepare_answer(context: QueryContext, use_reranking: bool = True, log_demo: bool = True):
+    """
+    Общая часть rag_answer и rag_answer_stream: фильтр, поиск, reranking, промпт.
+
+    Фильтр, кэш ответов и поиск берут эмбеддинг и токены вопроса из context.
+
+    Returns:
+        (rejection, reranked_docs, prompt): если rejection не None — вопрос
+        отклонён и генерировать ответ не нужно.
+    """
+    question = context.question
 
     # 0. Фильтр релевантности
-    is_relevant, details = is_question_relevant_advanced(question, use_semantic=True)
+    is_relevant, details = is_question_relevant_advanced(question, use_semantic=True, context=context)
     if not is_relevant:
         rejection_msg = get_rejection_message_advanced(details)
         print(f"⚠️ Вопрос нерелевантен: {details}")
-        return {
-            "answer": rejection_msg,
-            "retrieved_contexts": [],
-            "scores": [],
-            "confidence": 0.0,
-            "is_relevant": False
-        }
+        return _rejection_result(rejection_msg), [], ""
 
     if log_demo:
         logger.info(f"{'=' * 80}")
@@ -174,14 +166,17 @@ def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True)
     else:
         initial_top_k = TOP_K_RETRIEVER
 
-    retrieved_docs = hybrid_search(question, top_k=initial_top_k, alpha=0.5)
+    retrieved_docs = hybrid_search(question, top_k=initial_top_k, alpha=0.5, context=context)
     print(f"[1/5] Получено документов из векторной БД: {len(retrieved_docs)}")
 
     # 2. Фильтрация
     filtered_docs = []
     for doc in retrieved_docs:
-        distance = doc.get("distance", 0)
-        similarity = 1 - distance
+        # У документов только из BM25 нет косинусного расстояния — порог к ним не применяется
+        if doc.get("distance") is None:
+            filtered_docs.append(doc)
+            continue
+        similarity = 1 - doc["distance"]
         if similarity >= 0.15:
             doc["similarity"] = similarity
             filtered_docs.append(doc)
@@ -202,13 +197,7 @@ def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True)
                     "severity": "medium"
                 })
                 print(f"⚠️ Все документы нерелевантны (лучший скор: {best_score:.4f})")
-                return {
-                    "answer": rejection_msg,
-                    "retrieved_contexts": [],
-                    "scores": [],
-                    "confidence": 0.0,
-                    "is_relevant": False
-                }
+                return _rejection_result(rejection_msg), [], ""
     else:
         reranked_docs = unique_docs[:TOP_K_RETRIEVER]
 
@@ -219,6 +208,68 @@ def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True)
     prompt = get_rag_prompt(contexts, question)
     print(f"[5/5] Промпт сформирован: {len(prompt)} символов")
 
+    return None, reranked_docs, prompt
+
+
+def _doc_scores(docs: list) -> list:
+    return [d.get("rerank_score", d.get("similarity", 0)) for d in docs]
+
+
+def _log_demo_result(question: str, contexts: list, answer: str):
+    demo_data = {
+        "timestamp": datetime.now().isoformat(),
+        "question": question,
+        "retrieved_docs": len(contexts),
+        "answer_length": len(answer),
+        "contexts_preview": [ctx[:100] + "..." for ctx in contexts]
+    }
+    logger.info(f"РЕЗУЛЬТАТ: {json.dumps(demo_data, ensure_ascii=False, indent=2)}")
+
+
+def _is_cacheable(answer: str) -> bool:
+    """В кэш попадают только сгенерированные ответы, не заглушки и ошибки."""
+    return bool(answer) and answer not in (EMPTY_ANSWER_MESSAGE, ERROR_ANSWER_MESSAGE)
+
+
+def _lookup_cached_answer(context: QueryContext):
+    """
+    Поиск ответа в кэше.
+
+    Returns:
+        (cached_result, probe): probe равен None, если кэш отключён
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    try:
+        return cache.lookup(context.question, context)
+    except Exception as e:
+        # Кэш не должен ломать ответ: без него просто медленнее
+        logger.warning(f"[ANSWER_CACHE] Ошибка поиска в кэше: {e}")
+        return None, None
+
+
+def _store_cached_answer(probe, result: dict):
+    if probe is None or not _is_cacheable(result["answer"]):
+        return
+    get_answer_cache().store(probe, result)
+
+
+def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True) -> dict:
+    """Улучшенный RAG pipeline с reranking и фильтрацией."""
+
+    context = QueryContext(question)
+    cached, probe = _lookup_cached_answer(context)
+    if cached is not None:
+        print(f"[ANSWER_CACHE] ✅ Ответ из кэша ({cached['cache_hit']})")
+        return cached
+
+    rejection, reranked_docs, prompt = _prepare_answer(context, use_reranking, log_demo)
+    if rejection is not None:
+        return rejection
+
+    contexts = [d["context"] for d in reranked_docs]
+
     # 6. Генерация ответа
     print(f"\nГенерация ответа LLM...")
     answer = ask_llm(prompt, max_tokens=350, temperature=0.3)
@@ -228,18 +279,122 @@ def rag_answer(question: str, use_reranking: bool = True, log_demo: bool = True)
     result = {
         "answer": answer,
         "retrieved_contexts": contexts,
-        "scores": [d.get("rerank_score", d.get("similarity", 0)) for d in reranked_docs]
+        "scores": _doc_scores(reranked_docs)
     }
 
+    _store_cached_answer(probe, result)
+
     # Логирование
     if log_demo:
-        demo_data = {
-            "timestamp": datetime.now().isoformat(),
-            "question": question,
-            "retrieved_docs": len(contexts),
-            "answer_length": len(answer),
-            "contexts_preview": [ctx[:100] + "..." for ctx in contexts]
-        }
-        logger.info(f"РЕЗУЛЬТАТ: {json.dumps(demo_data, ensure_ascii=False, indent=2)}")
-
-    return result
\ No newline at end of file
+        _log_demo_result(question, contexts, answer)
+
+    return result
+
+
+def rag_answer_stream(question: str, use_reranking: bool = True, log_demo: bool = False) -> Iterator[dict]:
+    """
+    Потоковый вариант rag_answer.
+
+    Отдаёт события в порядке:
+        {"event": "retrieval", "data": {"retrieved_contexts", "scores", "is_relevant"}}
+        {"event": "token", "data": {"text"}}  — по мере декодирования LLM
+        {"event": "done", "data": {"answer", "scores", "time_to_first_token", "total_time"}}
+    Если генерация оборвалась после первого токена, вместо done приходит
+    {"event": "error", "data": {"detail"}}, и ответ не кэшируется.
+    Время до первого токена считается от начала обработки запроса.
+    Ответ из кэша отдаётся одним событием token, в done добавляется cache_hit.
+    """
+    t0 = time.perf_counter()
+
+    context = QueryContext(question)
+    cached, probe = _lookup_cached_answer(context)
+    if cached is not None:
+        print(f"[ANSWER_CACHE] ✅ Ответ из кэша ({cached['cache_hit']})")
+        yield {"event": "retrieval", "data": {
+            "retrieved_contexts": cached["retrieved_contexts"],
+            "scores": cached["scores"],
+            "is_relevant": True,
+            "retrieval_time": round(time.perf_counter() - t0, 4)
+        }}
+        ttft = time.perf_counter() - t0
+        yield {"event": "token", "data": {"text": cached["answer"]}}
+        yield {"event": "done", "data": {
+            "answer": cached["answer"],
+            "scores": cached["scores"],
+            "is_relevant": True,
+            "cache_hit": cached["cache_hit"],
+            "time_to_first_token": round(ttft, 4),
+            "total_time": round(time.perf_counter() - t0, 4)
+        }}
+        return
+
+    rejection, reranked_docs, prompt = _prepare_answer(context, use_reranking, log_demo)
+    if rejection is not None:
+        yield {"event": "retrieval", "data": {
+            "retrieved_contexts": [],
+            "scores": [],
+            "is_relevant": False
+        }}
+        ttft = time.perf_counter() - t0
+        yield {"event": "token", "data": {"text": rejection["answer"]}}
+        yield {"event": "done", "data": {
+            "answer": rejection["answer"],
+            "scores": [],
+            "is_relevant": False,
+            "time_to_first_token": round(ttft, 4),
+            "total_time": round(time.perf_counter() - t0, 4)
+        }}
+        return
+
+    contexts = [d["context"] for d in reranked_docs]
+    scores = _doc_scores(reranked_docs)
+    yield {"event": "retrieval", "data": {
+        "retrieved_contexts": contexts,
+        "scores": scores,
+        "is_relevant": True,
+        "retrieval_time": round(time.perf_counter() - t0, 4)
+    }}
+
+    # 6. Потоковая генерация ответа
+    print(f"\nПотоковая генерация ответа LLM...")
+    ttft = None
+    parts = []
+    stream = ask_llm_stream(prompt, max_tokens=350, temperature=0.3)
+    try:
+        for text in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+                print(f"Первый токен через {ttft:.2f} сек")
+            parts.append(text)
+            yield {"event": "token", "data": {"text": text}}
+    except Exception as e:
+        # Оборванный ответ не кэшируется и не выдаётся за законченный
+        yield {"event": "error", "data": {"detail": f"Генерация ответа прервана: {e}"}}
+        return
+    finally:
+        stream.close()
+
+    answer = "".join(parts).strip()
+    if not answer or len(answer) < 10:
+        answer = EMPTY_ANSWER_MESSAGE
+
+    total_time = time.perf_counter() - t0
+    print(f"Ответ получен: {len(answer)} символов за {total_time:.2f} сек")
+    print(f"{'=' * 60}\n")
+
+    _store_cached_answer(probe, {
+        "answer": answer,
+        "retrieved_contexts": contexts,
+        "scores": scores
+    })
+
+    if log_demo:
+        _log_demo_result(question, contexts, answer)
+
+    yield {"event": "done", "data": {
+        "answer": answer,
+        "scores": scores,
+        "is_relevant": True,
+        "time_to_first_token": round(ttft, 4) if ttft is not None else None,
+        "total_time": round(total_time, 4)
+    }}
@@ -0,0 +1,71 @@
+"""
+Контекст одного вопроса, общий для всех этапов rag_answer.
+
+Фильтр релевантности, кэш ответов и гибридный поиск работают с одним и тем
+же вопросом. QueryContext считает его производные лениво и один раз:
+нормализованную строку (ключ кэша ответов), токены BM25 и эмбеддинги —
+по одному на модель. Так вопрос проходит через эмбеддер один раз за запрос.
+"""
+import re
+
+from typing import Callable, Dict, List, Optional
+from .bm25 import tokenize
+from .embedder import embed_query
+from ..config import EMBEDDER_MODEL_NAME
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Нижний регистр, ё → е, без пунктуации и лишних пробелов."""
+    text = question.lower().replace("ё", "е")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+class QueryContext:
+    """Вопрос пользователя и его производные, вычисляемые по требованию."""
+    __slots__ = ("question", "_normalized", "_tokens", "_embeddings")
+
+    def __init__(self, question: str):
+        self.question = question
+        self._normalized: Optional[str] = None
+        self._tokens: Optional[List[str]] = None
+        self._embeddings: Dict[str, List[float]] = {}
+
+    @property
+    def normalized(self) -> str:
+        if self._normalized is None:
+            self._normalized = normalize_question(self.question)
+        return self._normalized
+
+    @property
+    def tokens(self) -> List[str]:
+        """Токены BM25 (bm25.tokenize)."""
+        if self._tokens is None:
+            self._tokens = tokenize(self.question)
+        return self._tokens
+
+    @property
+    def embedding(self) -> List[float]:
+        """Эмбеддинг основного эмбеддера (EMBEDDER_MODEL_NAME)."""
+        return self.get_embedding()
+
+    def get_embedding(
+            self,
+            model_name: str = EMBEDDER_MODEL_NAME,
+            encode: Callable[[str], List[float]] = embed_query
+    ) -> List[float]:
+        """
+        Эмбеддинг вопроса моделью model_name; encode вызывается только при первом обращении.
+
+        Args:
+            model_name: Ключ эмбеддинга в контексте
+            encode: Функция text → нормированный вектор этой модели
+        """
+        embedding = self._embeddings.get(model_name)
+        if embedding is None:
+            embedding = encode(self.question)
+            self._embeddings[model_name] = embedding
+        return embedding
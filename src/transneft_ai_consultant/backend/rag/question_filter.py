@@ -1,116 +1,213 @@
 """
 Продвинутая система фильтрации нерелевантных вопросов.
 Многоуровневая защита от off-topic запросов.
+
+Словари, шаблоны и эталонные вопросы лежат в QUESTION_FILTER_RULES_PATH и
+компилируются один раз (get_filter_rules):
+  - все словари ключевых слов — в один автомат: регулярное выражение-бор,
+    которое за один проход по вопросу возвращает все найденные категории;
+  - шаблоны (irrelevant, toxic) — в одно объединённое выражение, которое
+    отсекает вопросы без совпадений одним поиском;
+  - эталонные вопросы — в нормированную матрицу эмбеддингов
+    (get_reference_matrix), близость считается одним умножением.
 """
+import json
 import re
-import numpy as np
 import logging
+import threading
 
-from typing import Tuple, Dict
-from sentence_transformers import SentenceTransformer
+import numpy as np
 
-# ═══════════════════════════════════════════════════════════════════════════
-# УРОВЕНЬ 1: Чёрные списки (моментальная блокировка)
-# ═══════════════════════════════════════════════════════════════════════════
+from pathlib import Path
+from typing import Tuple, Dict, List, Optional, Set
+from .embedder import get_query_batcher
+from .query_context import QueryContext
+from ..config import SEMANTIC_FILTER_MODEL, SEMANTIC_FILTER_THRESHOLD, QUESTION_FILTER_RULES_PATH
 
-# Категории явно запрещённых тем
-BLACKLIST_CATEGORIES = {
-    "погода": ["погода", "температура", "дождь", "снег", "солнечно", "облачно"],
-    "кулинария": ["рецепт", "готовить", "приготовить", "кулинар", "варить", "жарить"],
-    "кино": ["фильм", "кино", "сериал", "актер", "актриса", "режиссер"],
-    "спорт": ["футбол", "хоккей", "баскетбол", "спорт", "матч", "чемпионат"],
-    "технологии": ["iphone", "android", "смартфон", "телефон", "компьютер", "ноутбук"],
-    "транспорт_личный": ["автомобиль", "машина", "авто", "bmw", "mercedes", "toyota"],
-    "развлечения": ["игра", "играть", "геймер", "консоль", "playstation", "xbox"],
-    "здоровье": ["болезнь", "лекарство", "врач", "больница", "лечить"],
-    "политика": ["президент", "правительство", "министр", "выборы", "парламент"],
-}
-
-# Токсичные/атакующие паттерны
-TOXIC_PATTERNS = [
-    r"игнор[иу]й",
-    r"забудь",
-    r"ты (тупой|глупый|идиот)",
-    r"как (взломать|хакнуть)",
-    r"secret[_\s]?key",
-    r"пароль",
-]
+logger = logging.getLogger(__name__)
 
-# ═══════════════════════════════════════════════════════════════════════════
-# УРОВЕНЬ 2: Белый список (обязательные темы Транснефти)
-# ═══════════════════════════════════════════════════════════════════════════
+BUSINESS_CATEGORY = "business_keywords"
+
+
+def load_filter_rules(path: Path = QUESTION_FILTER_RULES_PATH) -> dict:
+    """
+    Правила фильтра из JSON:
+        irrelevant_patterns — философские вопросы, приветствия (регулярные выражения)
+        toxic_patterns      — атаки и prompt injection (регулярные выражения)
+        blacklist           — {категория: [подстроки]} запрещённых тем
+        business_keywords   — подстроки тем Транснефти
+        question_words      — вопросительные слова в начале вопроса
+        reference_queries   — эталонные вопросы для семантической проверки
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _trie_pattern(node: dict, labels: Dict[str, frozenset], path: frozenset = frozenset()) -> str:
+    """
+    Выражение для поддерева бора.
+
+    Конец слова отмечается пустой именованной группой, после которой бор
+    продолжается необязательно. Последняя заполненная группа совпадения
+    (lastgroup) — самое длинное найденное слово; её метка хранит категории
+    всех слов на пути к нему, поэтому слова-префиксы не теряются.
+    """
+    ends = node.get("", ())
+    if ends:
+        path = path | frozenset(ends)
+
+    parts = [
+        re.escape(char) + _trie_pattern(child, labels, path)
+        for char, child in node.items() if char != ""
+    ]
+    if not parts:
+        branches = ""
+    elif len(parts) == 1:
+        branches = parts[0]
+    else:
+        branches = "(?:" + "|".join(parts) + ")"
+
+    if not ends:
+        return branches
+    name = f"k{len(labels)}"
+    labels[name] = path
+    mark = f"(?P<{name}>)"
+    return mark + (f"(?:{branches})?" if branches else "")
+
+
+class KeywordAutomaton:
+    """Поиск подстрок всех словарей за один проход по тексту."""
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        """
+        Args:
+            categories: {категория: [подстроки]}; подстроки в нижнем регистре
+        """
+        trie: dict = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                node.setdefault("", set()).add(category)
+
+        # Имя группы-метки → категории слов на пути к ней
+        self._labels: Dict[str, frozenset] = {}
+        # Опережающая проверка нулевой ширины: совпадения ищутся с каждой позиции, в том числе перекрывающиеся
+        self._regex = re.compile("(?=" + _trie_pattern(trie, self._labels) + ")")
+
+    def categories(self, text: str) -> Set[str]:
+        """Все категории, подстроки которых встречаются в тексте."""
+        found = set()
+        for match in self._regex.finditer(text):
+            found |= self._labels[match.lastgroup]
+        return found
+
+
+class FilterRules:
+    """Правила фильтра, скомпилированные для проверки вопросов."""
+
+    def __init__(self, rules: dict):
+        # Порядок шаблонов и категорий задаёт приоритет причин отказа
+        self.irrelevant_patterns = [re.compile(p) for p in rules["irrelevant_patterns"]]
+        self.toxic_patterns = [re.compile(p) for p in rules["toxic_patterns"]]
+        self.any_pattern = re.compile(
+            "|".join(f"(?:{p.pattern})" for p in self.irrelevant_patterns + self.toxic_patterns)
+        )
+        self.blacklist = [f"blacklist_{category}" for category in rules["blacklist"]]
+        self.keywords = KeywordAutomaton({
+            **{f"blacklist_{category}": words for category, words in rules["blacklist"].items()},
+            BUSINESS_CATEGORY: rules["business_keywords"],
+        })
+        self.question_words = tuple(rules["question_words"])
+        self.reference_queries = list(rules["reference_queries"])
+
+
+_filter_rules = None
+_filter_rules_lock = threading.Lock()
+
+
+def get_filter_rules() -> FilterRules:
+    """Правила из QUESTION_FILTER_RULES_PATH, компилируются при первом обращении."""
+    global _filter_rules
+    with _filter_rules_lock:
+        if _filter_rules is None:
+            _filter_rules = FilterRules(load_filter_rules())
+    return _filter_rules
 
-WHITELIST_KEYWORDS = {
-    "компания": ["транснефть", "transneft", "пао", "организация", "предприятие", "компания"],
-    "деятельность": ["нефтепровод", "нефть", "трубопровод", "магистраль", 
-                     "транспортировка", "перекачка", "экспорт", "импорт"],
-    "география": ["россия", "месторождение", "регион", "область", "край"],
-    "бизнес": ["выручка", "прибыль", "инвестиции", "проект", "контракт"],
-}
 
 # ═══════════════════════════════════════════════════════════════════════════
-# УРОВЕНЬ 3: Семантический анализ
+# Семантический анализ
 # ═══════════════════════════════════════════════════════════════════════════
 
-# Эталонные фразы о Транснефти (для семантического сравнения)
-REFERENCE_QUERIES = [
-    "Чем занимается ПАО Транснефть?",
-    "Какая длина нефтепроводов Транснефти?",
-    "Где находятся объекты Транснефти?",
-    "Какая выручка компании Транснефть?",
-    "История создания Транснефти",
-    "Структура корпоративного управления в Транснефти",
-    "Сколько сотрудников работает в компании?",
-    "Какие инвестиционные проекты реализует Транснефть?",
-    "Финансовые показатели компании за последний год",
-    "Кто является акционерами ПАО Транснефть?",
-    "Основные направления деятельности Транснефти",
-    "Какая протяженность магистральных нефтепроводов?",
-]
-
 _semantic_model = None
+_semantic_model_lock = threading.Lock()
+_reference_matrix = None
+_reference_lock = threading.Lock()
 
 def get_semantic_model():
-    """Ленивая загрузка модели семантического анализа."""
+    """Ленивая загрузка отдельной модели семантического анализа (SEMANTIC_FILTER_MODEL)."""
     global _semantic_model
-    if _semantic_model is None:
-        print("Загрузка модели семантического анализа...")
-        _semantic_model = SentenceTransformer('intfloat/multilingual-e5-small')
-        print("✅ Модель загружена")
+    with _semantic_model_lock:
+        if _semantic_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            print("Загрузка модели семантического анализа...")
+            _semantic_model = SentenceTransformer(SEMANTIC_FILTER_MODEL)
+            print("✅ Модель загружена")
     return _semantic_model
 
 
+def _encode(texts: List[str]) -> List[List[float]]:
+    """Нормированные эмбеддинги модели фильтра."""
+    if SEMANTIC_FILTER_MODEL is None:
+        return get_query_batcher().submit(list(texts))
+    return get_semantic_model().encode(texts, normalize_embeddings=True).tolist()
+
+
+def get_reference_matrix() -> np.ndarray:
+    """Матрица эмбеддингов эталонных вопросов, считается один раз на процесс."""
+    global _reference_matrix
+    with _reference_lock:
+        if _reference_matrix is None:
+            _reference_matrix = np.asarray(_encode(get_filter_rules().reference_queries), dtype=np.float32)
+    return _reference_matrix
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # ПРОВЕРКИ
 # ═══════════════════════════════════════════════════════════════════════════
 
 
-def check_semantic_similarity(question: str, threshold: float = 0.4) -> Tuple[bool, float]:
+def semantic_similarity(question: str, context: Optional[QueryContext] = None) -> float:
+    """Максимальная близость вопроса к эталонным вопросам о Транснефти."""
+    context = context or QueryContext(question)
+    if SEMANTIC_FILTER_MODEL is None:
+        question_emb = context.embedding
+    else:
+        question_emb = context.get_embedding(SEMANTIC_FILTER_MODEL, lambda text: _encode([text])[0])
+
+    # Эмбеддинги нормированы — косинусное сходство равно скалярному произведению
+    similarities = get_reference_matrix() @ np.asarray(question_emb, dtype=np.float32)
+    return float(similarities.max())
+
+
+def check_semantic_similarity(question: str, threshold: float = SEMANTIC_FILTER_THRESHOLD,
+                              context: Optional[QueryContext] = None) -> Tuple[bool, float]:
     """
     Семантическое сравнение с эталонными вопросами о Транснефти.
 
     Args:
         question: Вопрос пользователя
-        threshold: Минимальный порог similarity (0.4 = 40%)
+        threshold: Минимальный порог similarity (см. SEMANTIC_FILTER_THRESHOLD)
+        context: Контекст запроса; при SEMANTIC_FILTER_MODEL = None его
+            эмбеддинг потом используется поиском и кэшем ответов
 
     Returns:
         (passed, max_similarity)
     """
     try:
-        model = get_semantic_model()
-
-        # Эмбеддинги
-        question_emb = model.encode([question])[0]
-        reference_embs = model.encode(REFERENCE_QUERIES)
-
-        # Косинусное сходство
-        similarities = [
-            np.dot(question_emb, ref_emb) / (np.linalg.norm(question_emb) * np.linalg.norm(ref_emb))
-            for ref_emb in reference_embs
-        ]
-
-        max_similarity = max(similarities)
-
+        max_similarity = semantic_similarity(question, context)
         passed = max_similarity >= threshold
         return passed, max_similarity
 
@@ -123,71 +220,63 @@ def check_semantic_similarity(question: str, threshold: float = 0.4) -> Tuple[bo
 # ГЛАВНАЯ ФУНКЦИЯ ПРОВЕРКИ
 # ═══════════════════════════════════════════════════════════════════════════
 
-def is_question_relevant_advanced(question: str, use_semantic: bool = True) -> Tuple[bool, Dict]:
-
-    logger = logging.getLogger(__name__)
+def is_question_relevant_advanced(question: str, use_semantic: bool = True,
+                                  context: Optional[QueryContext] = None,
+                                  rules: Optional[FilterRules] = None) -> Tuple[bool, Dict]:
+    """
+    Args:
+        question: Вопрос пользователя
+        use_semantic: Проверять близость к эталонам, если нет ключевых слов
+        context: Контекст запроса (эмбеддинг для семантической проверки)
+        rules: Скомпилированные правила, по умолчанию get_filter_rules()
 
+    Returns:
+        (is_relevant, details)
+    """
     logger.debug(f"🔍 Проверка вопроса: {question}")
 
+    rules = rules or get_filter_rules()
     question_lower = question.lower()
 
     # ═════════════════════════════════════════════════════════════
-    # УРОВЕНЬ 1: IRRELEVANT (философские вопросы, мнения)
+    # УРОВНИ 1–2: IRRELEVANT (философские вопросы, мнения) и
+    # TOXIC PATTERNS (атаки, prompt injection).
+    # Объединённое выражение отсекает обычные вопросы одним поиском,
+    # отдельные шаблоны проверяются только чтобы назвать причину
     # ═════════════════════════════════════════════════════════════
 
-    irrelevant_patterns = [
-        r'\b(европа|америка|азия)\s+(лучше|хуже)',  # "Европа лучше?"
-        r'\b(лучше|хуже)\s+чем\b',  # "Лучше чем..."
-        r'\bкак дела\b',  # "Как дела?"
-        r'\b(привет|здравствуй)\b',  # Приветствия
-        r'\bчто нового\b',  # "Что нового?"
-    ]
-
-    for pattern in irrelevant_patterns:
-        if re.search(pattern, question_lower):
-            return False, {
-                "reason": "irrelevant_topic",
-                "pattern": pattern,
-                "severity": "high"
-            }
+    if rules.any_pattern.search(question_lower):
+        for reason, severity, patterns in (
+                ("irrelevant_topic", "high", rules.irrelevant_patterns),
+                ("toxic_pattern", "critical", rules.toxic_patterns),
+        ):
+            for pattern in patterns:
+                if pattern.search(question_lower):
+                    return False, {
+                        "reason": reason,
+                        "pattern": pattern.pattern,
+                        "severity": severity
+                    }
+
+    # Все словари — за один проход автомата
+    categories = rules.keywords.categories(question_lower)
 
     # ═════════════════════════════════════════════════════════════
-    # УРОВЕНЬ 2: TOXIC PATTERNS (атаки, prompt injection)
+    # УРОВЕНЬ 3: BLACKLIST (погода, кино, спорт)
     # ═════════════════════════════════════════════════════════════
 
-    for pattern in TOXIC_PATTERNS:
-        if re.search(pattern, question_lower):
+    for category in rules.blacklist:
+        if category in categories:
             return False, {
-                "reason": "toxic_pattern",
-                "pattern": pattern,
-                "severity": "critical"
+                "reason": category,
+                "severity": "high"
             }
 
-    # ═════════════════════════════════════════════════════════════
-    # УРОВЕНЬ 3: BLACKLIST (погода, кино, спорт)
-    # ═════════════════════════════════════════════════════════════
-
-    for category, keywords in BLACKLIST_CATEGORIES.items():
-        for keyword in keywords:
-            if keyword in question_lower:
-                return False, {
-                    "reason": f"blacklist_{category}",
-                    "severity": "high"
-                }
-
     # ═════════════════════════════════════════════════════════════
     # УРОВЕНЬ 4: WHITELIST (бизнес-ключевые слова)
     # ═════════════════════════════════════════════════════════════
 
-    business_keywords = [
-        'корпоративн', 'управлени', 'структур', 'совет', 'директор',
-        'акционер', 'выручк', 'прибыл', 'доход', 'финанс', 'отчёт',
-        'деятельност', 'бизнес', 'компани', 'предприяти', 'транснефт',
-        'нефтепровод', 'нефт', 'персонал', 'сотрудник', 'инвестици',
-        'трубопровод', 'магистраль', 'перекачк', 'транспорт'
-    ]
-
-    if any(kw in question_lower for kw in business_keywords):
+    if BUSINESS_CATEGORY in categories:
         return True, {
             "reason": "business_keywords",
             "severity": "low",
@@ -198,14 +287,11 @@ def is_question_relevant_advanced(question: str, use_semantic: bool = True) -> T
     # УРОВЕНЬ 5: QUESTION WORDS (вопросительные слова)
     # ═════════════════════════════════════════════════════════════
 
-    question_words = ['что', 'как', 'где', 'когда', 'почему', 'сколько',
-                      'какой', 'какая', 'какие', 'кто', 'чем', 'зачем']
-
-    if any(question_lower.startswith(qw) for qw in question_words):
+    if question_lower.startswith(rules.question_words):
         # Есть вопросительное слово, но нет бизнес-терминов
         # Проверяем семантику
         if use_semantic:
-            passed_semantic, semantic_score = check_semantic_similarity(question, threshold=0.4)
+            passed_semantic, semantic_score = check_semantic_similarity(question, context=context)
 
             if passed_semantic:
                 return True, {
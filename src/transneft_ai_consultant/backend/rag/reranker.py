@@ -0,0 +1,130 @@
+"""
+Сервис reranking: объединяет пары (вопрос, чанк) от параллельных запросов.
+
+Пары всех запросов, пришедших в окне ожидания, сортируются по длине и
+скорятся одним вызовом CrossEncoder.predict — мини-батчи внутри predict
+дополняются (padding) до самой длинной пары, поэтому сортировка убирает
+большую часть лишнего padding. Скоры раздаются обратно по запросам.
+
+Бэкенд задаётся RERANKER_BACKEND: "torch" — CrossEncoder из
+sentence-transformers, "onnx" — int8-экспорт той же модели на ONNX Runtime
+(reranker_onnx.OnnxReranker). Оба обрезают пары до RERANKER_MAX_LENGTH токенов.
+
+Перед батчингом пары ищутся в кэше скоров по (хэш текста вопроса, ID чанка,
+модель): в модель уходят только новые пары. ID чанка выводится из
+его текста (ids.make_chunk_id), поэтому изменённый чанк получает новый ключ,
+а записи удалённых чанков вытесняются по LRU.
+"""
+import hashlib
+import threading
+
+from typing import List, Optional
+from .batching import MicroBatcher
+from .cache import LRUCache
+from ..data_processing.ids import make_chunk_id
+from ..config import (
+    RERANKER_BACKEND,
+    RERANKER_MAX_LENGTH,
+    RERANKER_MODEL_NAME,
+    RERANK_BATCH_MAX_PAIRS,
+    RERANK_BATCH_MAX_WAIT_MS,
+    RERANK_PREDICT_BATCH_SIZE,
+    RERANK_CACHE_ENABLED,
+    RERANK_CACHE_MAX_ENTRIES,
+    RERANK_CACHE_TTL,
+)
+
+_reranker = None
+_reranker_lock = threading.Lock()
+_rerank_batcher = None
+_rerank_batcher_lock = threading.Lock()
+
+_score_cache = LRUCache(max_entries=RERANK_CACHE_MAX_ENTRIES, ttl=RERANK_CACHE_TTL, name="rerank_scores")
+# Скор зависит от модели, бэкенда (int8 даёт немного другие числа) и обрезки пар
+_MODEL_KEY = f"{RERANKER_MODEL_NAME}:{RERANKER_BACKEND}:{RERANKER_MAX_LENGTH}"
+
+
+def load_reranker(backend: str = RERANKER_BACKEND):
+    """Новый экземпляр reranker с методом predict(pairs, batch_size, show_progress_bar)."""
+    if backend == "onnx":
+        from .reranker_onnx import OnnxReranker
+
+        print("Загрузка reranker модели (ONNX int8)...")
+        return OnnxReranker.load()
+    if backend == "torch":
+        from sentence_transformers import CrossEncoder
+
+        print("Загрузка reranker модели...")
+        return CrossEncoder(RERANKER_MODEL_NAME, max_length=RERANKER_MAX_LENGTH)
+    raise ValueError(f"Неизвестный бэкенд reranker: {backend} (доступны: torch, onnx)")
+
+
+def get_reranker():
+    """Ленивая загрузка reranker модели."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = load_reranker()
+    return _reranker
+
+
+def _predict_pairs(pairs: List[list]) -> List[float]:
+    """Скоры для пар, отсортированных по длине; возвращает в исходном порядке."""
+    reranker = get_reranker()
+
+    order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+    sorted_pairs = [pairs[i] for i in order]
+
+    sorted_scores = reranker.predict(
+        sorted_pairs,
+        batch_size=RERANK_PREDICT_BATCH_SIZE,
+        show_progress_bar=False
+    )
+
+    scores = [0.0] * len(pairs)
+    for position, i in enumerate(order):
+        scores[i] = float(sorted_scores[position])
+    return scores
+
+
+def get_rerank_batcher() -> MicroBatcher:
+    """Общий батчер reranking для всех потоков API."""
+    global _rerank_batcher
+    if _rerank_batcher is None:
+        # Иначе параллельные первые запросы создадут по батчеру со своим потоком
+        with _rerank_batcher_lock:
+            if _rerank_batcher is None:
+                _rerank_batcher = MicroBatcher(
+                    _predict_pairs,
+                    max_batch_size=RERANK_BATCH_MAX_PAIRS,
+                    max_wait_ms=RERANK_BATCH_MAX_WAIT_MS,
+                    name="rerank_pairs"
+                )
+    return _rerank_batcher
+
+
+def score_pairs(question: str, contexts: List[str]) -> List[float]:
+    """Скоры CrossEncoder для пар (question, context) в порядке contexts."""
+    if not RERANK_CACHE_ENABLED:
+        return get_rerank_batcher().submit([[question, ctx] for ctx in contexts])
+
+    question_hash = hashlib.md5(question.encode("utf-8")).hexdigest()
+    keys = [(question_hash, make_chunk_id(ctx), _MODEL_KEY) for ctx in contexts]
+    scores: List[Optional[float]] = [_score_cache.get(key) for key in keys]
+
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        computed = get_rerank_batcher().submit([[question, contexts[i]] for i in missing])
+        for i, score in zip(missing, computed):
+            scores[i] = score
+            _score_cache.set(keys[i], score)
+    return scores
+
+
+def clear_rerank_cache():
+    _score_cache.clear()
+
+
+def get_rerank_cache_stats() -> dict:
+    """Счётчики кэша скоров reranking (попадания и промахи считаются по парам)."""
+    return dict(_score_cache.get_stats(), enabled=RERANK_CACHE_ENABLED)
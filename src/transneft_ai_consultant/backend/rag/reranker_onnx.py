@@ -0,0 +1,172 @@
+"""
+Reranker на ONNX Runtime с динамическим int8-квантованием.
+
+export_onnx_reranker выгружает cross-encoder RERANKER_MODEL_NAME из
+локального кэша HuggingFace (без сети) в ONNX с динамическими осями
+(батч, длина), квантует веса линейных слоёв в int8 и сохраняет рядом
+токенизатор и reranker.json.
+
+OnnxReranker повторяет интерфейс CrossEncoder.predict: пары токенизируются
+один раз с обрезкой до RERANKER_MAX_LENGTH, сортируются по числу токенов и
+режутся на батчи — каждый батч дополняется только до своей самой длинной
+пары. К логитам применяется та же активация, что у CrossEncoder.
+"""
+import json
+import shutil
+
+import numpy as np
+
+from pathlib import Path
+from typing import List, Sequence
+from ..config import RERANKER_MODEL_NAME, RERANKER_MAX_LENGTH, RERANKER_ONNX_DIR, RERANK_PREDICT_BATCH_SIZE
+
+_META_FILE = "reranker.json"
+_MODEL_FILE = "model_int8.onnx"
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def _activation(config) -> str:
+    """Активация, которую CrossEncoder применяет к логитам этой модели."""
+    name = getattr(config, "sbert_ce_default_activation_function", None)
+    if name:
+        return "sigmoid" if name.endswith("Sigmoid") else "identity"
+    return "sigmoid" if config.num_labels == 1 else "identity"
+
+
+def export_onnx_reranker(
+        model_name: str = RERANKER_MODEL_NAME,
+        out_dir: Path = RERANKER_ONNX_DIR,
+        quantize: bool = True,
+        opset: int = 14
+) -> Path:
+    """
+    Экспортирует cross-encoder в ONNX (int8) из локального кэша моделей.
+
+    Модель должна быть уже скачана (первый запуск torch-бэкенда или
+    scripts/download_models.py) — сеть не используется.
+
+    Returns:
+        Папка с моделью, токенизатором и reranker.json
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    print(f"[RERANKER] Экспорт {model_name} в ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, local_files_only=True).eval()
+
+    sample = tokenizer(["вопрос"], ["текст чанка"], return_tensors="pt")
+    input_names = [name for name in _INPUT_NAMES if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    fp32_path = tmp_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    model_file = fp32_path.name
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(tmp_dir / _MODEL_FILE), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+        model_file = _MODEL_FILE
+
+    tokenizer.save_pretrained(str(tmp_dir))
+    with open(tmp_dir / _META_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "model_file": model_file,
+            "input_names": input_names,
+            "activation": _activation(model.config),
+        }, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp_dir.rename(out_dir)
+    print(f"[RERANKER] ✅ ONNX-модель сохранена в {out_dir}")
+    return out_dir
+
+
+class OnnxReranker:
+    """Cross-encoder на ONNX Runtime (CPU) с батчами по длине."""
+
+    def __init__(self, model_dir: Path = RERANKER_ONNX_DIR, max_length: int = RERANKER_MAX_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / _META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.model_name = meta["model_name"]
+        self.max_length = max_length
+        self.input_names = meta["input_names"]
+        self.activation = meta["activation"]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_dir / meta["model_file"]), options, providers=["CPUExecutionProvider"]
+        )
+
+    @classmethod
+    def load(cls, model_dir: Path = RERANKER_ONNX_DIR, model_name: str = RERANKER_MODEL_NAME) -> "OnnxReranker":
+        """Открывает экспорт; если его нет или он от другой модели — экспортирует заново."""
+        meta_path = Path(model_dir) / _META_FILE
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("model_name") == model_name:
+                    return cls(model_dir)
+        export_onnx_reranker(model_name, model_dir)
+        return cls(model_dir)
+
+    def _run(self, features: dict, rows: Sequence[int]) -> np.ndarray:
+        """Логиты для строк rows, дополненных до самой длинной из них."""
+        length = max(len(features["input_ids"][i]) for i in rows)
+        feeds = {}
+        for name in self.input_names:
+            pad = self.pad_token_id if name == "input_ids" else 0
+            batch = np.full((len(rows), length), pad, dtype=np.int64)
+            for row, i in enumerate(rows):
+                values = features[name][i]
+                batch[row, :len(values)] = values
+            feeds[name] = batch
+        return self.session.run(["logits"], feeds)[0]
+
+    def predict(self, pairs: List[list], batch_size: int = RERANK_PREDICT_BATCH_SIZE,
+                show_progress_bar: bool = False) -> np.ndarray:
+        """Скоры пар (вопрос, чанк) в исходном порядке, как CrossEncoder.predict."""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+
+        features = self.tokenizer(
+            [pair[0] for pair in pairs],
+            [pair[1] for pair in pairs],
+            truncation=True,
+            max_length=self.max_length,
+        )
+        order = np.argsort([len(ids) for ids in features["input_ids"]], kind="stable")
+
+        scores = np.empty(len(pairs), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            scores[rows] = self._run(features, rows)[:, 0]
+
+        if self.activation == "sigmoid":
+            scores = 1 / (1 + np.exp(-scores))
+        return scores
@@ -1,82 +1,634 @@
-import chromadb
-import hashlib
+"""
+Векторное хранилище: ChromaDB и точный поиск в памяти.
+
+Записью (upsert/update/delete) всегда владеет ChromaDB. Поиск выполняет
+бэкенд из config.VECTOR_BACKEND:
+
+    chroma — HNSW-индекс ChromaDB;
+    numpy  — NumpyVectorIndex: непрерывная матрица нормированных эмбеддингов
+             (float32 или float16), одно матричное умножение на батч запросов
+             и argpartition. Точный результат; для десятков тысяч чанков
+             быстрее HNSW с обращением к SQLite за метаданными.
+
+Матрица NumpyVectorIndex выгружается из коллекции в VECTOR_INDEX_DIR и
+открывается через mmap. Выгрузка повторяется, только когда меняются тексты
+или эмбеддинги (get_content_version); после обновления одних метаданных
+перечитываются только они. Пока идёт обновление, запросы обслуживает
+загруженный индекс (index_store.IndexRefresher).
+
+При VECTOR_DTYPE = "int8" или "binary" в памяти процесса лежит только
+квантованная копия (в 4 и 32 раза меньше float32): по ней выбираются
+k × VECTOR_RESCORE_FACTOR кандидатов, которые затем пересчитываются по
+полным float32-векторам из memory map — читаются только их строки.
+"""
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
 
 from pathlib import Path
-from typing import List
-from src.transneft_ai_consultant.backend.rag.embedder import embed_texts
-from tqdm import tqdm
-from functools import lru_cache
-
-@lru_cache(maxsize=1000)
-def query_documents_cached(question_hash: str, top_k: int):
-    """Кэшированная версия поиска."""
-    # Восстанавливаем вопрос из хэша невозможно,
-    # поэтому лучше использовать другой подход
-    pass
-
-# Лучше использовать простой dict-кэш
-_query_cache = {}
-
-# Клиент будет сохранять данные в папку db/chroma
-BASE_DIR = Path(__file__).parent.parent
-client = chromadb.PersistentClient(path=str(BASE_DIR / "db" / "chroma"))
-
-# Получаем или создаем коллекцию. Имя соответствует вашему плану.
-collection = client.get_or_create_collection(
-    name="transneft_docs",
-    metadata={"hnsw:space": "cosine"}  # Указываем косинусное расстояние
+from typing import Dict, List, Optional
+from .cache import LRUCache
+from .embedder import embed_query, get_query_batcher
+from .embedding_cache import compact_embedding_cache, embed_texts_cached
+from .index_store import IndexRefresher, index_lock, new_generation, publish_generation, read_current
+from ..data_processing.ids import make_chunk_id
+from ..config import (
+    CHROMA_DIR,
+    COLLECTION_NAME,
+    EMBEDDER_MODEL_NAME,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_MAX_BYTES,
+    RETRIEVAL_CACHE_TTL,
+    VECTOR_BACKEND,
+    VECTOR_DTYPE,
+    VECTOR_INDEX_DIR,
+    VECTOR_RESCORE_FACTOR,
+    VECTOR_SEARCH_BLOCK_ROWS,
+)
+
+# Результаты векторного поиска; версия коллекции в ключе отсекает устаревшие записи
+_retrieval_cache = LRUCache(
+    max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+    max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+    ttl=RETRIEVAL_CACHE_TTL,
+    name="retrieval"
 )
 
+_CONTENT_VERSION_FILE = "content_version"
+
+_client = None
+_collection = None
+_collection_lock = threading.Lock()
+_write_counter = 0  # записи в коллекцию из этого процесса
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+def get_client():
+    """Клиент ChromaDB создаётся при первом обращении, а не при импорте."""
+    global _client
+    with _collection_lock:
+        if _client is None:
+            import chromadb
+
+            # Клиент будет сохранять данные в папку db/chroma
+            _client = chromadb.PersistentClient(path=str(CHROMA_DIR))
+    return _client
+
+
+def get_collection():
+    """Получаем или создаем коллекцию документов."""
+    global _collection
+    if _collection is None:
+        client = get_client()
+        with _collection_lock:
+            if _collection is None:
+                _collection = client.get_or_create_collection(
+                    name=COLLECTION_NAME,
+                    metadata={"hnsw:space": "cosine"}  # Указываем косинусное расстояние
+                )
+    return _collection
+
 
 def add_documents(chunks: List[dict]):
-    """Добавляет документы в ChromaDB батчами."""
-    batch_size = 100
-    print(f"Добавление {len(chunks)} чанков в ChromaDB...")
-    for i in tqdm(range(0, len(chunks), batch_size)):
-        batch_chunks = chunks[i:i + batch_size]
+    """
+    Добавляет (upsert) документы в ChromaDB батчами.
+
+    ID чанка выводится из текста (make_chunk_id), поэтому повторная загрузка
+    тех же чанков не создаёт дубликатов.
+    """
+    from tqdm import tqdm
+
+    # Одинаковый текст — один ID: оставляем первое вхождение
+    unique = {}
+    for c in chunks:
+        unique.setdefault(make_chunk_id(c["context"]), c)
+    ids_all = list(unique)
 
-        ids = [f"doc_{i + j}" for j in range(len(batch_chunks))]
+    batch_size = 100
+    print(f"Добавление {len(ids_all)} чанков в ChromaDB...")
+    for i in tqdm(range(0, len(ids_all), batch_size)):
+        ids = ids_all[i:i + batch_size]
+        batch_chunks = [unique[chunk_id] for chunk_id in ids]
         contexts = [c["context"] for c in batch_chunks]
 
-        # Создаем эмбеддинги только для текущего батча
-        embeddings = embed_texts(contexts)
+        # Эмбеддинги текущего батча; неизменившиеся чанки берутся из дискового кэша
+        embeddings = embed_texts_cached(contexts)
         metadatas = [c["metadata"] for c in batch_chunks]
 
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=contexts,
-            metadatas=metadatas
-        )
+        upsert_documents(ids, embeddings, contexts, metadatas)
+    compact_embedding_cache()
     print("Документы успешно добавлены в векторную базу.")
 
 
-def query_documents(query: str, top_k=3) -> list:
-    """Поиск с кэшированием."""
+def upsert_documents(ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+    """Записывает готовые чанки с эмбеддингами (стадия записи конвейера индексации)."""
+    get_collection().upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=documents,
+        metadatas=metadatas
+    )
+    _mark_collection_changed(content=True)
+
+
+def get_indexed_metadatas(where: dict = None) -> dict:
+    """Метаданные проиндексированных чанков: {id: metadata} (без текстов и эмбеддингов)."""
+    results = get_collection().get(where=where, include=["metadatas"])
+    return {
+        chunk_id: meta or {}
+        for chunk_id, meta in zip(results["ids"], results["metadatas"])
+    }
+
+
+def update_metadatas(ids: List[str], metadatas: List[dict]):
+    """Обновляет только метаданные чанков (текст и эмбеддинги не меняются)."""
+    if not ids:
+        return
+    collection = get_collection()
+    for i in range(0, len(ids), 500):
+        collection.update(ids=ids[i:i + 500], metadatas=metadatas[i:i + 500])
+    _mark_collection_changed()
+
+
+def delete_documents(ids: List[str]):
+    """Удаляет чанки по ID."""
+    if not ids:
+        return
+    collection = get_collection()
+    for i in range(0, len(ids), 500):
+        collection.delete(ids=ids[i:i + 500])
+    _mark_collection_changed(content=True)
 
-    cache_key = hashlib.md5(f"{query}_{top_k}".encode()).hexdigest()
 
-    if cache_key in _query_cache:
+def _copy_results(results: list) -> list:
+    # pipeline дописывает в документы similarity/rerank_score — кэш отдаёт копии
+    return [{**doc, "metadata": dict(doc["metadata"] or {})} for doc in results]
+
+
+def _where_key(where: Optional[dict]) -> Optional[str]:
+    return json.dumps(where, sort_keys=True, ensure_ascii=False) if where else None
+
+
+def query_documents(query: str, top_k=3, where: dict = None, embedding: Optional[List[float]] = None) -> list:
+    """
+    Поиск с кэшированием.
+
+    Args:
+        embedding: Готовый эмбеддинг запроса (QueryContext.embedding); без него
+            запрос кодируется здесь
+    """
+
+    cache_key = (get_collection_version(), EMBEDDER_MODEL_NAME, VECTOR_BACKEND, query, top_k, _where_key(where))
+    cached = _retrieval_cache.get(cache_key)
+    if cached is not None:
         print(f"[CACHE HIT] Результат из кэша")
-        return _query_cache[cache_key]
+        return _copy_results(cached)
+
+    output = _search([embedding if embedding is not None else embed_query(query)], top_k, where)[0]
+
+    _retrieval_cache.set(cache_key, _copy_results(output))
+    return output
+
+
+def query_documents_batch(queries: List[str], top_k=3, where: dict = None) -> List[list]:
+    """Поиск для нескольких запросов: один вызов эмбеддера и один проход по индексу."""
+    if not queries:
+        return []
+    return _search(get_query_batcher().submit(list(queries)), top_k, where)
+
+
+def _search(query_embeddings: list, top_k: int, where: Optional[dict]) -> List[list]:
+    """Результаты поиска {"id", "context", "metadata", "distance", "similarity"} для каждого запроса."""
+    if VECTOR_BACKEND == "numpy":
+        return get_vector_index().query(query_embeddings, top_k, where)
+    return query_collection(query_embeddings, top_k, where)
 
-    # Оригинальный код поиска...
-    query_emb = embed_texts([query])[0]
-    results = collection.query(
-        query_embeddings=[query_emb],
-        n_results=top_k
+
+def query_collection(query_embeddings: list, top_k: int, where: Optional[dict] = None) -> List[list]:
+    """
+    Поиск по HNSW-индексу ChromaDB независимо от VECTOR_BACKEND.
+
+    Индексация ищет соседей новых чанков здесь: коллекция видит только что
+    записанные батчи, а матрицу numpy-бэкенда пришлось бы выгружать заново.
+    """
+    results = get_collection().query(
+        query_embeddings=[list(map(float, emb)) for emb in query_embeddings],
+        n_results=top_k,
+        where=where or None,
+        include=["documents", "metadatas", "distances"]
     )
 
-    output = [
-        {"context": doc, "metadata": meta}
-        for doc, meta in zip(results["documents"][0], results["metadatas"][0])
+    # Косинусное расстояние коллекции: similarity = 1 - distance
+    return [
+        [
+            {"id": doc_id, "context": doc, "metadata": meta, "distance": distance, "similarity": 1 - distance}
+            for doc_id, doc, meta, distance in zip(ids, documents, metadatas, distances)
+        ]
+        for ids, documents, metadatas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"]
+        )
     ]
 
-    _query_cache[cache_key] = output
-    return output
+
+class NumpyVectorIndex:
+    """Точный поиск по матрице нормированных эмбеддингов в памяти."""
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, documents: List[str], metadatas: List[dict],
+                 version: Optional[str] = None, quantization: str = "none",
+                 scales: Optional[np.ndarray] = None, full_matrix: Optional[np.ndarray] = None,
+                 dim: Optional[int] = None, metadata_version: Optional[str] = None):
+        """
+        Args:
+            ids: ID чанков (строки матрицы)
+            matrix: Матрица первого этапа N × D: нормированные float32/float16,
+                int8-коды или упакованные знаки (binary), можно memmap
+            documents: Тексты чанков
+            metadatas: Метаданные чанков
+            version: Версия содержимого коллекции, из которой выгружена матрица
+            quantization: "none", "int8" или "binary"
+            scales: Масштабы измерений для int8 (x ≈ code · scale)
+            full_matrix: float32-векторы для пересчёта кандидатов (memmap)
+            dim: Размерность векторов (для binary не выводится из matrix)
+            metadata_version: Версия коллекции на диске, с которой прочитаны метаданные
+        """
+        self.ids = list(ids)
+        self.matrix = matrix
+        self.documents = documents
+        self.metadatas = metadatas
+        self.version = version
+        self.metadata_version = metadata_version
+        self.quantization = quantization
+        self.scales = scales
+        self.full_matrix = full_matrix
+        self.dim = dim if dim is not None else (matrix.shape[1] if matrix.ndim == 2 else 0)
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection, dtype: str = VECTOR_DTYPE, version: Optional[str] = None,
+                        metadata_version: Optional[str] = None) -> "NumpyVectorIndex":
+        """
+        Args:
+            collection: Коллекция ChromaDB
+            dtype: "float32", "float16", "int8" или "binary"
+            version: Версия содержимого коллекции
+            metadata_version: Версия коллекции на диске
+        """
+        results = collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = results.get("embeddings")
+        full = np.asarray(embeddings if embeddings is not None else [], dtype=np.float32)
+        if full.ndim != 2:
+            full = full.reshape(0, 0)
+        full /= np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+        metadatas = [meta or {} for meta in (results.get("metadatas") or [None] * len(results["ids"]))]
+
+        if dtype == "int8":
+            scales = np.maximum(np.abs(full).max(axis=0), 1e-12) / 127 if len(full) else np.ones(full.shape[1], np.float32)
+            codes = np.clip(np.rint(full / scales), -127, 127).astype(np.int8)
+            return cls(results["ids"], codes, results["documents"], metadatas, version,
+                       quantization="int8", scales=scales.astype(np.float32), full_matrix=full,
+                       metadata_version=metadata_version)
+        if dtype == "binary":
+            return cls(results["ids"], np.packbits(full > 0, axis=1), results["documents"], metadatas, version,
+                       quantization="binary", full_matrix=full, dim=full.shape[1], metadata_version=metadata_version)
+        return cls(results["ids"], full.astype(dtype), results["documents"], metadatas, version,
+                   metadata_version=metadata_version)
+
+    def with_metadatas(self, collection, metadata_version: Optional[str] = None) -> "NumpyVectorIndex":
+        """
+        Тот же индекс с метаданными, перечитанными из коллекции.
+
+        Матрицы и тексты общие с исходным индексом: после update_metadatas
+        эмбеддинги не выгружаются заново.
+        """
+        results = collection.get(include=["metadatas"])
+        by_id = dict(zip(results["ids"], results.get("metadatas") or [None] * len(results["ids"])))
+        return NumpyVectorIndex(
+            self.ids, self.matrix, self.documents, [by_id.get(doc_id) or {} for doc_id in self.ids],
+            self.version, quantization=self.quantization, scales=self.scales, full_matrix=self.full_matrix,
+            dim=self.dim, metadata_version=metadata_version
+        )
+
+    def save(self, index_dir: Path):
+        """Новое поколение файлов и атомарное переключение current.json."""
+        with index_lock(index_dir):
+            target = new_generation(index_dir)
+            np.save(target / "vectors.npy", np.asarray(self.matrix))
+            if self.quantization != "none":
+                np.save(target / "vectors_f32.npy", np.asarray(self.full_matrix))
+            if self.scales is not None:
+                np.save(target / "scales.npy", self.scales)
+            with open(target / "documents.json", "w", encoding="utf-8") as f:
+                json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f,
+                          ensure_ascii=False)
+
+            publish_generation(index_dir, {
+                "generation": target.name,
+                "version": self.version,
+                "metadata_version": self.metadata_version,
+                "quantization": self.quantization,
+                "dim": self.dim,
+            })
+
+    @classmethod
+    def load(cls, index_dir: Path, dtype: str = VECTOR_DTYPE) -> Optional["NumpyVectorIndex"]:
+        """
+        Открывает выгрузку; None, если её нет или она в другом формате.
+
+        Квантованная матрица читается в память процесса, float32-векторы
+        для пересчёта остаются в memory map.
+        """
+        index_dir = Path(index_dir)
+        try:
+            meta = read_current(index_dir)
+            target = index_dir / meta["generation"]
+            quantization = meta.get("quantization", "none")
+            if quantization != (dtype if dtype in ("int8", "binary") else "none"):
+                return None
+            if quantization == "none":
+                matrix = np.load(target / "vectors.npy", mmap_mode="r")
+                if matrix.dtype != np.dtype(dtype):
+                    return None
+                full_matrix = scales = None
+            else:
+                matrix = np.load(target / "vectors.npy")
+                full_matrix = np.load(target / "vectors_f32.npy", mmap_mode="r")
+                scales = np.load(target / "scales.npy") if quantization == "int8" else None
+            with open(target / "documents.json", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(data["ids"], matrix, data["documents"], data["metadatas"], meta["version"],
+                   quantization=quantization, scales=scales, full_matrix=full_matrix, dim=meta.get("dim"),
+                   metadata_version=meta.get("metadata_version"))
+
+    def mask(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        """
+        Маска строк по фильтру метаданных (равенство полей и $and), с кэшем.
+
+        Примеры: {"source_file": "a.docx"}, {"$and": [{"source_file": "a.docx"}, {"chunk_index": 0}]}
+        """
+        if not where:
+            return None
+        key = _where_key(where)
+        mask = self._masks.get(key)
+        if mask is None:
+            conditions = _equality_conditions(where)
+            mask = np.fromiter(
+                (all(meta.get(field) == value for field, value in conditions) for meta in self.metadatas),
+                dtype=bool,
+                count=len(self.metadatas)
+            )
+            self._masks[key] = mask
+        return mask
+
+    def _first_stage_scores(self, queries: np.ndarray) -> np.ndarray:
+        """Близость запросов ко всем строкам по матрице первого этапа (Q × N)."""
+        n = len(self.ids)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        if self.quantization == "int8":
+            # q · (code · scale) = (q · scale) · code
+            queries = queries * self.scales
+        elif self.quantization == "binary":
+            query_bits = np.packbits(queries > 0, axis=1)
+
+        # Блоками: BLAS не умеет float16/int8, а копия всей матрицы в float32 не нужна
+        for start in range(0, n, VECTOR_SEARCH_BLOCK_ROWS):
+            block = self.matrix[start:start + VECTOR_SEARCH_BLOCK_ROWS]
+            if self.quantization == "binary":
+                # Число совпавших знаков: dim − расстояние Хэмминга
+                for qi, bits in enumerate(query_bits):
+                    hamming = _POPCOUNT[np.bitwise_xor(block, bits)].sum(axis=1)
+                    scores[qi, start:start + len(block)] = self.dim - 2 * hamming.astype(np.float32)
+            else:
+                scores[:, start:start + len(block)] = queries @ np.asarray(block, dtype=np.float32).T
+        return scores
+
+    def search(self, query_vectors, top_k: int, mask: Optional[np.ndarray] = None):
+        """
+        Top-k по косинусной близости для батча запросов.
+
+        Returns:
+            (indices, scores) — массивы Q × k по убыванию близости
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        n = len(self.ids)
+        k = min(top_k, n if mask is None else int(mask.sum()))
+        if k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        scores = self._first_stage_scores(queries)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+
+        if self.quantization == "none":
+            return _top_k_rows(scores, k)
+
+        # Второй этап: кандидаты пересчитываются по полным векторам (читаются только их строки)
+        n_candidates = min(k * VECTOR_RESCORE_FACTOR, n if mask is None else int(mask.sum()))
+        candidates, _ = _top_k_rows(scores, n_candidates)
+        exact = np.stack([
+            np.asarray(self.full_matrix[np.sort(row)], dtype=np.float32) @ query
+            for row, query in zip(candidates, queries)
+        ])
+        candidates = np.sort(candidates, axis=1)
+        top, top_scores = _top_k_rows(exact, k)
+        return np.take_along_axis(candidates, top, axis=1), top_scores
+
+    def query(self, query_embeddings: list, top_k: int, where: Optional[dict] = None) -> List[list]:
+        """То же, что query_documents для ChromaDB: списки документов со similarity и distance."""
+        indices, scores = self.search(query_embeddings, top_k, self.mask(where))
+        return [
+            [
+                {
+                    "id": self.ids[i],
+                    "context": self.documents[i],
+                    "metadata": self.metadatas[i],
+                    "distance": 1.0 - float(score),
+                    "similarity": float(score),
+                }
+                for i, score in zip(row_indices, row_scores)
+            ]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _top_k_rows(scores: np.ndarray, k: int):
+    """Индексы и значения k наибольших в каждой строке, по убыванию."""
+    n = scores.shape[1]
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (len(scores), 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _equality_conditions(where: dict) -> list:
+    conditions = []
+    for field, value in where.items():
+        if field == "$and":
+            for clause in value:
+                conditions.extend(_equality_conditions(clause))
+        elif isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise ValueError(f"numpy-бэкенд поддерживает только фильтры на равенство: {where}")
+            conditions.append((field, value["$eq"]))
+        else:
+            conditions.append((field, value))
+    return conditions
+
+
+def get_vector_index() -> NumpyVectorIndex:
+    """
+    Индекс numpy-бэкенда; не ждёт обновления.
+
+    Устаревший индекс отдаётся как есть, а обновление запускается в фоне.
+    Синхронно индекс загружается (или выгружается) только при первом обращении.
+    """
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                _refresh_vector_index()
+
+    index = _vector_index
+    if _vector_index_stale(index):
+        _vector_refresher.request()
+    return index
+
+
+def _vector_index_stale(index: Optional[NumpyVectorIndex]) -> bool:
+    return index is not None and (
+        index.version != get_content_version() or index.metadata_version != get_storage_version()
+    )
+
+
+def _refresh_vector_index():
+    """
+    Приводит индекс к текущей версии коллекции (под _vector_index_lock).
+
+    Эмбеддинги выгружаются заново, только если изменилось содержимое и на
+    диске нет выгрузки для него; иначе перечитываются одни метаданные.
+    """
+    global _vector_index
+    version = get_content_version()
+    metadata_version = get_storage_version()
+
+    index = _vector_index
+    if index is None or index.version != version:
+        index = NumpyVectorIndex.load(VECTOR_INDEX_DIR)
+        if index is None or index.version != version:
+            with index_lock(VECTOR_INDEX_DIR):
+                # Пока ждали блокировку, выгрузку мог обновить другой процесс
+                index = NumpyVectorIndex.load(VECTOR_INDEX_DIR)
+                if index is None or index.version != version:
+                    print("[VECTORS] Выгрузка эмбеддингов из ChromaDB...")
+                    index = NumpyVectorIndex.from_collection(get_collection(), version=version,
+                                                             metadata_version=metadata_version)
+                    index.save(VECTOR_INDEX_DIR)
+                    # Повторное открытие: float32-векторы для пересчёта — memmap, а не копия в памяти
+                    index = NumpyVectorIndex.load(VECTOR_INDEX_DIR) or index
+        print(f"[VECTORS] ✅ Матрица {len(index)} × {index.dim} ({index.quantization if index.quantization != 'none' else index.matrix.dtype})")
+
+    if index.metadata_version != metadata_version:
+        index = index.with_metadatas(get_collection(), metadata_version)
+    _vector_index = index
+
+
+def _refresh_in_background():
+    with _vector_index_lock:
+        _refresh_vector_index()
+
+
+_vector_refresher = IndexRefresher(
+    "VECTORS",
+    refresh=_refresh_in_background,
+    is_stale=lambda: _vector_index_stale(_vector_index),
+    version=lambda: get_storage_version(),
+)
+
+
+def get_documents(ids: List[str]) -> dict:
+    """Тексты и метаданные чанков одним запросом: {id: {"id", "context", "metadata"}}."""
+    if not ids:
+        return {}
+    results = get_collection().get(ids=list(ids), include=["documents", "metadatas"])
+    metadatas = results.get("metadatas") or [None] * len(results["ids"])
+    return {
+        doc_id: {"id": doc_id, "context": doc, "metadata": meta or {}}
+        for doc_id, doc, meta in zip(results["ids"], results["documents"], metadatas)
+    }
+
+
+def clear_retrieval_cache():
+    _retrieval_cache.clear()
+
+
+def get_retrieval_cache_stats() -> dict:
+    """Счётчики кэша результатов поиска (попадания, промахи, вытеснения, объём)."""
+    return _retrieval_cache.get_stats()
+
+
+def _mark_collection_changed(content: bool = False):
+    """
+    Отмечает запись в коллекцию: кэши, зависящие от версии, будут сброшены.
+
+    Args:
+        content: Изменились тексты или эмбеддинги (upsert/delete), а не только
+            метаданные — меняет версию содержимого (get_content_version)
+    """
+    global _write_counter
+    with _collection_lock:
+        _write_counter += 1
+    if content:
+        tmp_path = CHROMA_DIR / f"{_CONTENT_VERSION_FILE}.{uuid.uuid4().hex}.tmp"
+        tmp_path.write_text(uuid.uuid4().hex, encoding="utf-8")
+        os.replace(tmp_path, CHROMA_DIR / _CONTENT_VERSION_FILE)
+    _retrieval_cache.clear()
+
+
+def get_collection_version() -> str:
+    """
+    Версия содержимого коллекции для инвалидации кэшей.
+
+    Складывается из версии файлов ChromaDB (переиндексация другим
+    процессом, например scripts/prepare_data.py) и счётчика записей
+    текущего процесса. Клиент ChromaDB при этом не создаётся.
+    """
+    return f"{get_storage_version()}:{_write_counter}"
+
+
+def get_content_version() -> str:
+    """
+    Версия текстов и эмбеддингов коллекции, общая для всех процессов.
+
+    Меняется при upsert/delete, но не при обновлении метаданных — по ней
+    BM25-индекс и матрица numpy-бэкенда решают, нужна ли перестройка.
+    """
+    try:
+        return (CHROMA_DIR / _CONTENT_VERSION_FILE).read_text(encoding="utf-8").strip() or "0"
+    except OSError:
+        return "0"
+
+
+def get_storage_version() -> str:
+    """Версия коллекции на диске (mtime файла SQLite ChromaDB), общая для всех процессов."""
+    try:
+        return str(os.stat(CHROMA_DIR / "chroma.sqlite3").st_mtime_ns)
+    except OSError:
+        return "0"
 
 
 def get_collection_size() -> int:
     """Возвращает количество документов в коллекции."""
-    return collection.count()
+    return get_collection().count()
 
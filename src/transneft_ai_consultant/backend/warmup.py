@@ -0,0 +1,133 @@
+"""
+Фаза прогрева: параллельная загрузка моделей и индексов при старте API.
+
+Без прогрева первый запрос платит за загрузку эмбеддера, эталонов
+семантического фильтра, reranker, BM25 индекса и LLM (десятки секунд).
+Здесь все компоненты загружаются одновременно в потоках, каждый
+выполняет одну пробную операцию, а время загрузки записывается.
+/api/ready отдаёт 200 только когда все компоненты готовы. Если прогрев
+отключён (WARMUP_ON_STARTUP = False), компоненты помечаются "skipped" и
+загружаются первым запросом — сервис при этом считается готовым.
+"""
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def _warmup_embedder():
+    from .rag.embedder import embed_query
+    embed_query("Когда основана компания Транснефть?")
+
+
+def _warmup_semantic_filter():
+    # Правила фильтра компилируются, эталонные вопросы кодируются основным эмбеддером или SEMANTIC_FILTER_MODEL
+    from .rag.question_filter import get_filter_rules, get_reference_matrix
+    get_filter_rules()
+    get_reference_matrix()
+
+
+def _warmup_reranker():
+    from .rag.reranker import score_pairs
+    score_pairs("Когда основана компания Транснефть?", ["ПАО «Транснефть» основано в 1993 году."])
+
+
+def _warmup_bm25():
+    from .rag.hybrid_search import init_hybrid_search
+    init_hybrid_search()
+
+
+def _warmup_llm():
+    from .rag.llm import warmup_llm
+    warmup_llm()
+
+
+WARMUP_COMPONENTS: Dict[str, Callable[[], None]] = {
+    "embedder": _warmup_embedder,
+    "semantic_filter": _warmup_semantic_filter,
+    "reranker": _warmup_reranker,
+    "bm25": _warmup_bm25,
+    "llm": _warmup_llm,
+}
+
+_lock = threading.Lock()
+_state = {
+    name: {"status": "pending", "load_time": None, "error": None}
+    for name in WARMUP_COMPONENTS
+}
+_started_at = None
+_finished_at = None
+_thread = None
+
+# Статусы, при которых компонент не мешает готовности сервиса
+_READY_STATUSES = ("ready", "skipped")
+
+
+def _run_component(name: str, func: Callable[[], None]):
+    with _lock:
+        _state[name]["status"] = "loading"
+    t0 = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        elapsed = time.perf_counter() - t0
+        logger.error(f"[WARMUP] {name}: ошибка за {elapsed:.2f} сек: {e}", exc_info=True)
+        with _lock:
+            _state[name].update(status="failed", load_time=round(elapsed, 3), error=str(e))
+        return
+    elapsed = time.perf_counter() - t0
+    logger.info(f"[WARMUP] {name}: готов за {elapsed:.2f} сек")
+    with _lock:
+        _state[name].update(status="ready", load_time=round(elapsed, 3), error=None)
+
+
+def run_warmup():
+    """Загружает все компоненты параллельно и ждёт завершения."""
+    global _started_at, _finished_at
+    _started_at = time.perf_counter()
+    logger.info(f"[WARMUP] Прогрев компонентов: {', '.join(WARMUP_COMPONENTS)}")
+
+    with ThreadPoolExecutor(max_workers=len(WARMUP_COMPONENTS), thread_name_prefix="warmup") as pool:
+        for name, func in WARMUP_COMPONENTS.items():
+            pool.submit(_run_component, name, func)
+
+    _finished_at = time.perf_counter()
+    logger.info(f"[WARMUP] Прогрев завершён за {_finished_at - _started_at:.2f} сек")
+
+
+def start_warmup():
+    """Запускает прогрев в фоновом потоке (не блокирует старт сервера)."""
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    _thread.start()
+
+
+def skip_warmup():
+    """Прогрев отключён: компоненты загрузятся лениво, /api/ready не ждёт их."""
+    with _lock:
+        for info in _state.values():
+            if info["status"] == "pending":
+                info["status"] = "skipped"
+    logger.info("[WARMUP] Прогрев отключён, компоненты загрузятся при первом запросе")
+
+
+def get_readiness() -> dict:
+    """Готовность компонентов и время их загрузки."""
+    with _lock:
+        components = {name: dict(info) for name, info in _state.items()}
+    ready = all(info["status"] in _READY_STATUSES for info in components.values())
+    total_time = None
+    if _started_at is not None:
+        end = _finished_at if _finished_at is not None else time.perf_counter()
+        total_time = round(end - _started_at, 3)
+    return {
+        "ready": ready,
+        "components": components,
+        "warmup_time": total_time,
+    }
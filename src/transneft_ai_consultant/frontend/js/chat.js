@@ -50,34 +50,44 @@ export class ChatService {
         this.addMessageToChat('user', message);
         this.showTypingIndicator();
         try {
-            const response = await this.callChatAPI(message);
+            let response = null;
+            try {
+                response = await this.callChatStreamAPI(message);
+            } catch (streamError) {
+                // Если ни одного токена не пришло — пробуем обычный endpoint
+                if (streamError.partial) throw streamError;
+                console.warn('[sendMessage] Потоковый режим недоступен, используем /api/chat:', streamError);
+                response = await this.callChatAPI(message);
+            }
             this.removeTypingIndicator();
 
             const answer = response?.answer || response?.text || 'Нет ответа';
-const audioUrl = response?.audio_url || null;
-
-// Получаем источники из ответа API
-const sources = response?.retrieved_contexts?.map((ctx, idx) => ({
-    context: ctx,
-    similarity: response?.scores?.[idx] || 0
-})) || [];
-
-// Передаем источники
-const messageData = {
-    audioUrl: audioUrl,
-    sources: sources
-};
+            const audioUrl = response?.audio_url || null;
+
+            // Получаем источники из ответа API
+            const sources = response?.retrieved_contexts?.map((ctx, idx) => ({
+                context: ctx,
+                similarity: response?.scores?.[idx] || 0
+            })) || [];
+
+            // Передаем источники
+            const messageData = {
+                audioUrl: audioUrl,
+                sources: sources
+            };
 
-this.addMessageToChat('assistant', answer, messageData);
+            this.addMessageToChat('assistant', answer, messageData);
 
             console.log('[sendMessage] Получен ответ:', answer.substring(0, 50));
             console.log('[sendMessage] audioUrl:', audioUrl);
-
-            //this.addMessageToChat('assistant', answer, audioUrl);
+            if (response?.time_to_first_token != null) {
+                console.log('[sendMessage] Время до первого токена:', response.time_to_first_token, 'сек');
+            }
 
         } catch (error) {
             console.error('ChatService.sendMessage ошибка:', error);
             this.removeTypingIndicator();
+            this.removeStreamingMessage();
             this.addMessageToChat('system', 'Произошла ошибка при обращении к серверу.');
         } finally {
             this.isProcessing = false;
@@ -86,6 +96,101 @@ this.addMessageToChat('assistant', answer, messageData);
         }
     }
 
+    async callChatStreamAPI(message) {
+        const url = `${this.apiUrl}/api/chat/stream`;
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+            body: JSON.stringify({ question: message })
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        const result = { answer: '', retrieved_contexts: [], scores: [] };
+        let buffer = '';
+        let received = false;
+
+        const handleEvent = (eventName, data) => {
+            if (eventName === 'retrieval') {
+                result.retrieved_contexts = data.retrieved_contexts || [];
+                result.scores = data.scores || [];
+            } else if (eventName === 'token') {
+                if (!received) {
+                    this.removeTypingIndicator();
+                    received = true;
+                }
+                result.answer += data.text;
+                this.updateStreamingMessage(result.answer);
+            } else if (eventName === 'done') {
+                result.answer = data.answer || result.answer;
+                result.scores = data.scores || result.scores;
+                result.time_to_first_token = data.time_to_first_token;
+            } else if (eventName === 'error') {
+                const error = new Error(data.detail || 'Ошибка потоковой генерации');
+                error.partial = received;
+                throw error;
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // События SSE разделены пустой строкой
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let dataLines = [];
+                rawEvent.split('\n').forEach((line) => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                });
+                if (dataLines.length > 0) {
+                    handleEvent(eventName, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+
+        this.removeStreamingMessage();
+        return result;
+    }
+
+    updateStreamingMessage(text) {
+        let messageDiv = document.getElementById('streaming-message');
+        if (!messageDiv) {
+            messageDiv = document.createElement('div');
+            messageDiv.id = 'streaming-message';
+            messageDiv.className = 'message assistant';
+
+            const avatar = document.createElement('div');
+            avatar.className = 'message-avatar';
+            avatar.textContent = '🤖';
+
+            const messageContent = document.createElement('div');
+            messageContent.className = 'message-content';
+            messageContent.appendChild(document.createElement('p'));
+
+            messageDiv.appendChild(avatar);
+            messageDiv.appendChild(messageContent);
+            this.messagesContainer.appendChild(messageDiv);
+        }
+        messageDiv.querySelector('.message-content p').textContent = text;
+        this.scrollToBottom();
+    }
+
+    removeStreamingMessage() {
+        const messageDiv = document.getElementById('streaming-message');
+        if (messageDiv) messageDiv.remove();
+    }
+
     async callChatAPI(message) {
         const url = `${this.apiUrl}/api/chat`;
         const response = await fetch(url, {